@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class ChecklistConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'checklist'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .cache import check_shared_cache
+
+        check_shared_cache()
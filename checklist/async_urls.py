@@ -0,0 +1,18 @@
+from django.urls import path, re_path
+
+from .async_views import ChecklistListView, ChecklistDetailView, SharedChecklistView, SharedChecklistEventsView
+from .urls import urlpatterns as sync_urlpatterns
+
+# ─────────────────────────────────────────────────────────────
+# URLconf used under ASGI (ASYNC_READ_VIEWS): the hot read endpoints are
+# served by async views, everything else by the regular routes below them.
+# ─────────────────────────────────────────────────────────────
+
+urlpatterns = [
+    path('api/checklists/', ChecklistListView.as_view(), name='checklist-list'),
+    re_path(r'^api/checklists/(?P<pk>[0-9]+)/$', ChecklistDetailView.as_view(), name='checklist-detail'),
+    re_path(r'^api/share/(?P<token>[^/.]+)/$', SharedChecklistView.as_view(), name='shared-checklist-detail'),
+    # Server-sent events, ASGI only: a stream holds no thread here
+    re_path(r'^api/share/(?P<token>[^/.]+)/events/$', SharedChecklistEventsView.as_view(),
+            name='shared-checklist-events'),
+] + sync_urlpatterns
@@ -0,0 +1,231 @@
+import asyncio
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .auth0backend import Auth0JSONWebTokenAuthentication
+from .cache import aget_shared_payload, etag_matches, representation_etag
+from .events import hub
+from .fieldsets import Fieldset
+from .models import Checklist
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer, json_dumps
+from .serializer import ChecklistSerializer
+from .sharing import acheck_share_token, aresolve_share_token
+from .tree import abuild_checklist_trees
+from .views import ChecklistViewSet, SharedChecklistViewSet
+
+
+class AsyncReadView(View):
+    """
+    Serves GET/HEAD on the event loop with the async ORM and async JWT
+    authentication. Every other method, and anything `handles()` declines
+    (e.g. the browsable API), goes to the sync DRF view in `fallback`.
+    Responses match the DRF views byte for byte, and the same throttles apply.
+    """
+    fallback = None
+    authenticated = True
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    # URL kwarg holding the token of a share link, for ShareTokenThrottle
+    share_kwarg = None
+    renderer = FastJSONRenderer()
+    authentication = Auth0JSONWebTokenAuthentication()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def handles(self, request):
+        # JSON only: the browsable API and other formats need DRF's content negotiation
+        return (request.method in ('GET', 'HEAD') and request.GET.get('format', 'json') == 'json' and
+                not any(media in request.headers.get('Accept', '') for media in ('text/html', 'msgpack')))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not self.handles(request):
+            return await sync_to_async(self.fallback)(request, *args, **kwargs)
+        request = Request(request)
+        try:
+            if self.authenticated:
+                await self.authenticate(request)
+            await self.check_throttles(request)
+            return await self.get(request, *args, **kwargs)
+        except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as e:
+            # No WWW-Authenticate challenge, so DRF answers these with 403 as well
+            return self.render({'detail': e.detail}, status=status.HTTP_403_FORBIDDEN)
+        except exceptions.APIException as e:
+            # As DRF's exception handler: validation errors are rendered as they are
+            data = e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail}
+            headers = {'Retry-After': '%d' % e.wait} if getattr(e, 'wait', None) else None
+            return self.render(data, status=e.status_code, headers=headers)
+        except Http404 as e:
+            return self.render({'detail': str(e) or 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    async def authenticate(self, request):
+        result = await self.authentication.aauthenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+        request.user, request.auth = result
+
+    @property
+    def share_token(self):
+        return self.kwargs.get(self.share_kwarg) if self.share_kwarg else None
+
+    async def check_throttles(self, request):
+        waits = []
+        for throttle in (throttle_class() for throttle_class in self.throttle_classes):
+            allow_request = getattr(throttle, 'aallow_request', None) or sync_to_async(throttle.allow_request)
+            if not await allow_request(request, self):
+                waits.append(throttle.wait())
+        if waits:
+            raise exceptions.Throttled(max((wait for wait in waits if wait is not None), default=None))
+
+    async def get(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def render(self, data, status=status.HTTP_200_OK, headers=None):
+        return HttpResponse(
+            self.renderer.render(data), status=status, headers=headers,
+            content_type=self.renderer.media_type,
+        )
+
+
+def _context(request):
+    return {'request': request, 'fieldset': Fieldset.from_request(request, ChecklistSerializer)}
+
+
+class ChecklistListView(AsyncReadView):
+    """
+    GET /api/checklists/ (keyset paginated trees). ?view=summary stays on the sync view.
+    """
+    fallback = staticmethod(ChecklistViewSet.as_view(
+        {'get': 'list', 'post': 'create'}, basename='checklist', detail=False,
+    ))
+
+    def handles(self, request):
+        return super().handles(request) and request.GET.get('view') != 'summary'
+
+    async def get(self, request):
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(Checklist.objects.filter(owner=request.user), request)
+        results = await abuild_checklist_trees(page, _context(request))
+        return self.render(OrderedDict([('next', paginator.get_next_link()), ('results', results)]))
+
+
+class ChecklistDetailView(AsyncReadView):
+    """
+    GET /api/checklists/{pk}/
+    """
+    fallback = staticmethod(ChecklistViewSet.as_view(
+        {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'},
+        basename='checklist', detail=True,
+    ))
+
+    async def get(self, request, pk):
+        try:
+            checklists = Checklist.objects.filter(owner=request.user, pk=pk)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        trees = await abuild_checklist_trees(checklists, _context(request))
+        if not trees:
+            raise Http404("No Checklist matches the given query.")
+        return self.render(trees[0])
+
+
+class SharedChecklistView(AsyncReadView):
+    """
+    GET /api/share/{token}/ from the shared cache, with ETag/304. No authentication.
+    """
+    fallback = staticmethod(SharedChecklistViewSet.as_view(
+        {'get': 'retrieve'}, basename='shared-checklist', detail=True,
+    ))
+    authenticated = False
+    share_kwarg = 'token'
+
+    async def get(self, request, token):
+        checklist_id = await aresolve_share_token(request, token)
+
+        async def build():
+            trees = await abuild_checklist_trees(Checklist.objects.filter(pk=checklist_id), {'request': request})
+            return trees[0]
+
+        data, etag = await aget_shared_payload(checklist_id, build)
+        fieldset = Fieldset.from_request(request, ChecklistSerializer)
+        if fieldset is not None:
+            return self.render(fieldset.prune(data))
+        # The DRF view's tag for the same JSON rendering
+        headers = {'ETag': representation_etag(etag, self.renderer.media_type), 'Vary': 'Accept'}
+        if etag_matches(request, headers['ETag']):
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return self.render(data, headers=headers)
+
+
+class SharedChecklistEventsView(AsyncReadView):
+    """
+    GET /api/share/{token}/events/: server-sent events with the shared
+    checklist's changes. Each `changes` event is a delta as returned by
+    /changes/, with the new version as its id. A stream starts from
+    Last-Event-ID (or `?since=`, 0 for a full snapshot), so a reconnecting
+    EventSource resumes where it left off. Ends with a `gone` event once
+    the checklist is deleted or the link revoked or expired.
+    """
+    fallback = staticmethod(lambda request, *args, **kwargs: HttpResponseNotAllowed(['GET']))
+    authenticated = False
+    share_kwarg = 'token'
+    # Milliseconds an EventSource waits before reconnecting
+    retry = 3000
+
+    def handles(self, request):
+        return request.method == 'GET'
+
+    async def get(self, request, token):
+        checklist_id = await aresolve_share_token(request, token)
+        since = request.headers.get('Last-Event-ID') or request.GET.get('since') or 0
+        try:
+            since = int(since)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            raise exceptions.ValidationError({"since": "Must be a non-negative checklist version."})
+        return StreamingHttpResponse(
+            self.stream(checklist_id, since, request, token), content_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    async def stream(self, checklist_id, since, request, token):
+        heartbeat = getattr(settings, 'EVENT_STREAM_HEARTBEAT', 15)
+        # Subscribed once streaming starts, so the finally below always runs
+        subscription = hub().subscribe(checklist_id, since, {'request': request})
+        try:
+            yield b"retry: %d\n\n" % self.retry
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Idle: keep proxies from closing the connection, and notice revoked links
+                    try:
+                        await acheck_share_token(token)
+                    except Http404 as e:
+                        yield _event('gone', {'detail': str(e)})
+                        return
+                    yield b": ping\n\n"
+                    continue
+                for version, data in subscription.take():
+                    yield b"id: %d\nevent: changes\ndata: %s\n\n" % (version, data)
+                if subscription.gone:
+                    yield _event('gone', {'detail': "No Checklist matches the given query."})
+                    return
+        finally:
+            hub().unsubscribe(subscription)
+
+
+def _event(name, data):
+    return b"event: %s\ndata: %s\n\n" % (name.encode(), json_dumps(data))
@@ -1,31 +1,170 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from rest_framework import authentication, exceptions
 from django.contrib.auth.models import User
-from checklist.utils import jwt_decode_token
+from checklist.metrics import timed
+from checklist.utils import ajwt_decode_token, jwt_decode_token
+
+
+class TokenCache:
+    """
+    LRU cache of verified bearer tokens, keyed by the token's SHA-256.
+    Holds the decoded claims and the user's primary key until the token's `exp`,
+    or for at most `ttl` seconds. Saving or deleting the user drops its entries.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size if max_size is not None else getattr(settings, 'AUTH0_TOKEN_CACHE_SIZE', 10000)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AUTH0_TOKEN_CACHE_TTL', 300)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, payload, user_pk):
+        exp = payload.get('exp')
+        if not exp or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (min(exp, time.time() + self.ttl), payload, user_pk)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard_user(self, user_pk):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[2] == user_pk]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _discard_cached_tokens(sender, instance, **kwargs):
+    # A deactivated or deleted user must not keep authenticating from the cache
+    token_cache.discard_user(instance.pk)
+
 
 class Auth0JSONWebTokenAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
-        auth = request.headers.get('Authorization', None)
-        if not auth:
-            return None
+        with timed('auth'):
+            return self._authenticate(request)
 
-        parts = auth.split()
-        if parts[0].lower() != 'bearer' or len(parts) != 2:
-            raise exceptions.AuthenticationFailed('Invalid Authorization header')
+    async def aauthenticate(self, request):
+        """
+        Async variant of authenticate for the async views: JWKS is fetched
+        with an async client and the user is loaded through the async ORM.
+        """
+        with timed('auth'):
+            token = self._bearer_token(request)
+            if token is None:
+                return None
+            cache_key = token_cache.key_for(token)
+            cached = self._cached_user(cache_key, token)
+            if cached is not None:
+                return cached
+
+            try:
+                payload = await ajwt_decode_token(token)
+            except Exception as e:
+                raise exceptions.AuthenticationFailed(f'JWT decode failed: {str(e)}')
 
-        token = parts[1]
+            user, created = await User.objects.aget_or_create(username=self._subject(payload))
+            if created or not user.is_active:
+                user.is_active = True
+                await user.asave()
+            token_cache.set(cache_key, payload, user.pk)
+            return (user, token)
+
+    def _authenticate(self, request):
+        token = self._bearer_token(request)
+        if token is None:
+            return None
+        cache_key = token_cache.key_for(token)
+        cached = self._cached_user(cache_key, token)
+        if cached is not None:
+            return cached
 
         try:
             payload = jwt_decode_token(token)
         except Exception as e:
             raise exceptions.AuthenticationFailed(f'JWT decode failed: {str(e)}')
 
-        user_id = payload.get('sub')
-        if not user_id:
-            raise exceptions.AuthenticationFailed('Missing subject (sub) claim in JWT')
-
-        user, created = User.objects.get_or_create(username=user_id)
+        user, created = User.objects.get_or_create(username=self._subject(payload))
         if created or not user.is_active:
             user.is_active = True
             user.save()
+        token_cache.set(cache_key, payload, user.pk)
         # print(f"Authenticated user: {user.username} ")
         return (user, token)
+
+    @staticmethod
+    def _bearer_token(request):
+        auth = request.headers.get('Authorization', None)
+        if not auth:
+            return None
+
+        parts = auth.split()
+        if parts[0].lower() != 'bearer' or len(parts) != 2:
+            raise exceptions.AuthenticationFailed('Invalid Authorization header')
+        return parts[1]
+
+    @staticmethod
+    def _cached_user(cache_key, token):
+        cached = token_cache.get(cache_key)
+        if cached is None:
+            return None
+        payload, user_pk = cached
+        # Rebuild the principal without a query; other fields load lazily if touched.
+        user = User.from_db(None, ['id', 'username', 'is_active'], [user_pk, payload['sub'], True])
+        return (user, token)
+
+    @staticmethod
+    def _subject(payload):
+        user_id = payload.get('sub')
+        if not user_id:
+            raise exceptions.AuthenticationFailed('Missing subject (sub) claim in JWT')
+        return user_id
@@ -0,0 +1,168 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from rest_framework import status
+
+from .counters import add_item_delta, apply_deltas, signal_counters_suspended
+from .models import Category, Item
+from .ordering import key_between
+from .serializer import ItemSerializer
+from .signals import invalidate_checklist
+from .sync import change_set
+
+OPERATIONS = ('create', 'update', 'delete')
+ITEM_FIELDS = ('name', 'is_completed')
+
+
+def max_batch_size():
+    return getattr(settings, 'ITEM_BATCH_MAX_SIZE', 500)
+
+
+def apply_item_batch(operations, checklist, category=None):
+    """
+    Apply a list of item create/update/delete operations in one transaction.
+
+    Each operation is `{"op": "create", "data": {...}}`, `{"op": "update", "id": 1, "data": {...}}`
+    or `{"op": "delete", "id": 1}`. Creates go into `category` when given, otherwise into
+    `data["category"]`, which may also be used on updates to move an item.
+    Created and moved items go to the end of their category.
+    Everything is validated first; if any operation fails nothing is written.
+    Returns `(results, ok)` with one result per operation, in order.
+    """
+    category_ids = set(Category.objects.filter(checklist=checklist).values_list('id', flat=True))
+    results = []
+    parsed = []
+    seen_ids = set()
+
+    for op in operations:
+        result, entry = _parse(op, category, category_ids, seen_ids)
+        results.append(result)
+        parsed.append(entry)
+
+    target_ids = [entry['id'] for entry in parsed if entry and entry['op'] != 'create']
+    scope = Item.objects.filter(category__checklist=checklist)
+    if category is not None:
+        scope = scope.filter(category=category)
+    existing = {
+        pk: (category_id, is_completed)
+        for pk, category_id, is_completed in scope.filter(id__in=target_ids).values_list('id', 'category_id', 'is_completed')
+    }
+    for result, entry in zip(results, parsed):
+        if entry and entry['op'] != 'create' and entry['id'] not in existing:
+            result.update(status=status.HTTP_404_NOT_FOUND, errors={'id': 'Item not found.'})
+
+    if any(result['status'] >= 400 for result in results):
+        return results, False
+
+    creates = [entry for entry in parsed if entry['op'] == 'create']
+    updates = {entry['id']: entry for entry in parsed if entry['op'] == 'update'}
+    deletes = [entry['id'] for entry in parsed if entry['op'] == 'delete']
+
+    deltas = {}
+    with transaction.atomic(), signal_counters_suspended(), change_set(checklist.pk) as version:
+        # Created and moved items go last in their category, in operation order
+        positions = dict(
+            Item.objects.filter(category_id__in={entry['category_id'] for entry in parsed if entry['category_id']})
+            .order_by().values('category_id').annotate(last=Max('position')).values_list('category_id', 'last')
+        )
+
+        def next_position(category_id):
+            positions[category_id] = key_between(positions.get(category_id) or None, None)
+            return positions[category_id]
+
+        created = Item.objects.bulk_create([
+            Item(category_id=entry['category_id'], changed_at_version=version,
+                 position=next_position(entry['category_id']), **entry['data'])
+            for entry in creates
+        ])
+        for entry, item in zip(creates, created):
+            entry['item'] = item
+            add_item_delta(deltas, item.category_id, item.is_completed, 1)
+
+        if updates:
+            items = Item.objects.in_bulk(list(updates))
+            fields = set()
+            for pk, entry in updates.items():
+                item = items[pk]
+                add_item_delta(deltas, item.category_id, item.is_completed, -1)
+                for name, value in entry['data'].items():
+                    setattr(item, name, value)
+                    fields.add(name)
+                if entry['category_id'] is not None and entry['category_id'] != item.category_id:
+                    item.category_id = entry['category_id']
+                    item.position = next_position(item.category_id)
+                    fields.update(('category_id', 'position'))
+                entry['item'] = item
+                add_item_delta(deltas, item.category_id, item.is_completed, 1)
+            for item in items.values():
+                item.changed_at_version = version
+            Item.objects.bulk_update(items.values(), sorted(fields) + ['changed_at_version'])
+
+        if deletes:
+            Item.objects.filter(id__in=deletes).delete()
+            for pk in deletes:
+                add_item_delta(deltas, *existing[pk], -1)
+
+        apply_deltas(deltas)
+        # Their counters changed; deletes were tombstoned by the signals
+        Category.objects.filter(id__in=deltas).update(changed_at_version=version)
+
+        # bulk_create/bulk_update skip model signals
+        invalidate_checklist(checklist.pk)
+
+    for result, entry in zip(results, parsed):
+        if entry['op'] != 'delete':
+            item = entry['item']
+            result['id'] = item.pk
+            result['data'] = {'id': item.pk, 'name': item.name, 'is_completed': item.is_completed}
+    return results, True
+
+
+def _parse(op, category, category_ids, seen_ids):
+    if not isinstance(op, dict) or op.get('op') not in OPERATIONS:
+        return {'op': None, 'status': status.HTTP_400_BAD_REQUEST,
+                'errors': {'op': f"Must be one of {', '.join(OPERATIONS)}."}}, None
+
+    kind = op['op']
+    result = {'op': kind, 'status': status.HTTP_201_CREATED if kind == 'create' else status.HTTP_200_OK}
+    if kind == 'delete':
+        result['status'] = status.HTTP_204_NO_CONTENT
+    entry = {'op': kind, 'id': None, 'data': {}, 'category_id': None}
+
+    if kind != 'create':
+        try:
+            entry['id'] = int(op.get('id'))
+        except (TypeError, ValueError):
+            result.update(status=status.HTTP_400_BAD_REQUEST, errors={'id': 'A valid item id is required.'})
+            return result, None
+        if entry['id'] in seen_ids:
+            result.update(status=status.HTTP_400_BAD_REQUEST, errors={'id': 'Item appears in more than one operation.'})
+            return result, None
+        seen_ids.add(entry['id'])
+        result['id'] = entry['id']
+        if kind == 'delete':
+            return result, entry
+
+    data = op.get('data') or {}
+    serializer = ItemSerializer(data=data, partial=kind == 'update')
+    if not isinstance(data, dict) or not serializer.is_valid():
+        result.update(status=status.HTTP_400_BAD_REQUEST,
+                      errors=serializer.errors if isinstance(data, dict) else {'data': 'Must be an object.'})
+        return result, None
+    entry['data'] = {name: serializer.validated_data[name] for name in ITEM_FIELDS if name in serializer.validated_data}
+
+    target_category = data.get('category')
+    if kind == 'create' and category is not None and target_category is None:
+        target_category = category.pk
+    if target_category is not None:
+        try:
+            entry['category_id'] = int(target_category)
+        except (TypeError, ValueError):
+            entry['category_id'] = None
+        if entry['category_id'] not in category_ids:
+            result.update(status=status.HTTP_400_BAD_REQUEST, errors={'category': 'Category not found in this checklist.'})
+            return result, None
+    elif kind == 'create':
+        result.update(status=status.HTTP_400_BAD_REQUEST, errors={'category': 'This field is required.'})
+        return result, None
+    return result, entry
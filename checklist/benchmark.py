@@ -0,0 +1,541 @@
+import asyncio
+import io
+import json
+import math
+import random
+import tempfile
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .clone import clone_checklist
+from .models import Checklist, Category, Item, CategoryFile, ItemFile, ShareLink
+from .ordering import keys_between
+
+BATCH_SIZE = 5000
+
+# (checklists per user, categories per checklist, items per category)
+SIZES = {
+    'small': (1, 2, 5),        # 10 items per user
+    'medium': (10, 10, 10),    # 1k items per user
+    'large': (100, 20, 50),    # 100k items per user
+}
+
+
+def generate_dataset(users=1, checklists=1, categories=2, items=5, files=1, completed_ratio=0.5, seed=0):
+    """
+    Bulk-insert synthetic users, checklists, categories, items and file rows.
+    `files` is the number of file rows per category and per item. Counters
+    are written with the rows. Returns the created users.
+    """
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    with transaction.atomic():
+        owners = User.objects.bulk_create([
+            User(username=f"bench|{run}-{n}", is_active=True) for n in range(users)
+        ])
+        for owner in owners:
+            for n in range(checklists):
+                _generate_checklist(owner, n, categories, items, files, completed_ratio, rng)
+            ShareLink.objects.create(checklist=owner.checklists.order_by('id').first())
+    return owners
+
+
+def _generate_checklist(owner, n, categories, items, files, completed_ratio, rng):
+    completed = [[rng.random() < completed_ratio for _ in range(items)] for _ in range(categories)]
+    total_done = sum(sum(row) for row in completed)
+    checklist = Checklist.objects.create(
+        title=f"Checklist {n}", description="Synthetic benchmark data", owner=owner,
+        item_count=categories * items, completed_count=total_done,
+    )
+    category_positions = keys_between(None, None, categories)
+    item_positions = keys_between(None, None, items)
+    new_categories = Category.objects.bulk_create([
+        Category(checklist=checklist, name=f"Category {c}", item_count=items, completed_count=sum(completed[c]),
+                 position=category_positions[c])
+        for c in range(categories)
+    ], batch_size=BATCH_SIZE)
+    CategoryFile.objects.bulk_create([
+        CategoryFile(category=category, file=f"category_files/bench/{category.pk}-{f}.pdf")
+        for category in new_categories for f in range(files)
+    ], batch_size=BATCH_SIZE)
+
+    for c, category in enumerate(new_categories):
+        new_items = Item.objects.bulk_create([
+            Item(category=category, name=f"Item {i}", is_completed=completed[c][i], position=item_positions[i])
+            for i in range(items)
+        ], batch_size=BATCH_SIZE)
+        ItemFile.objects.bulk_create([
+            ItemFile(item=item, file=f"item_files/bench/{item.pk}-{f}.pdf")
+            for item in new_items for f in range(files)
+        ], batch_size=BATCH_SIZE)
+    return checklist
+
+
+@contextmanager
+def stub_auth():
+    """
+    Point the JWKS store at an in-process key pair and yield a token factory.
+    """
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    import jwt
+    from jwt.algorithms import RSAAlgorithm
+
+    from . import utils
+    from .auth0backend import token_cache
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(key.public_key()))
+    jwk['kid'] = 'benchmark'
+
+    def mint(sub):
+        claims = {'sub': sub, 'aud': utils.API_IDENTIFIER, 'iss': utils.ISSUER, 'exp': int(time.time()) + 3600}
+        return jwt.encode(claims, key, algorithm='RS256', headers={'kid': 'benchmark'})
+
+    original = utils.jwks_store.fetcher, utils.jwks_store.async_fetcher
+
+    async def async_fetcher(url):
+        return {'keys': [jwk]}, None
+
+    utils.jwks_store.fetcher = lambda url: ({'keys': [jwk]}, None)
+    utils.jwks_store.async_fetcher = async_fetcher
+    utils.jwks_store.clear()
+    token_cache.clear()
+    try:
+        yield mint
+    finally:
+        utils.jwks_store.fetcher, utils.jwks_store.async_fetcher = original
+        utils.jwks_store.clear()
+        token_cache.clear()
+
+
+def unthrottled():
+    """
+    Settings overrides with every throttle bucket too large to empty, counted
+    in this process: benchmarks pay for the throttle checks but are never
+    answered 429 and need no THROTTLE_CACHE server.
+    """
+    rates = dict.fromkeys(settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {}), f"{2 ** 62}/s")
+    return {
+        'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates},
+        'THROTTLE_COUNTERS': 'checklist.throttling.LocMemCounters',
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _consume(response):
+    # Streaming responses are only produced while being read
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(call, iterations, warmup, after=None, before=None):
+    """
+    Time `call` (including reading a streamed body) and record its queries and
+    response size, plus the peak Python memory of one extra untimed call.
+    `before()` and `after(response)` run outside the measurement, e.g. to
+    prepare what the request consumes or undo what it created.
+    """
+    for _ in range(warmup):
+        if before:
+            before()
+        response = call()
+        _consume(response)
+        if after:
+            after(response)
+    timings, queries, sizes = [], [], []
+    for _ in range(iterations):
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = call()
+            size = _consume(response)
+            elapsed = time.perf_counter() - start
+        if after:
+            after(response)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.status_code} from benchmark request: {response.content[:200]!r}")
+        timings.append(elapsed * 1000)
+        queries.append(len(captured))
+        sizes.append(size)
+    if before:
+        before()
+    tracemalloc.start()
+    try:
+        response = call()
+        _consume(response)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if after:
+        after(response)
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': round(sum(queries) / len(queries), 2),
+        'bytes': round(sum(sizes) / len(sizes)),
+        'peak_kb': round(peak / 1024),
+    }
+
+
+def scenarios(client, owner):
+    """
+    Named `(call, after[, before])` tuples covering the main endpoints for
+    `owner`. `item_crud` is one create/update/delete cycle on a single item,
+    `item_move` moves an item to the end of its category, `import_ndjson` re-imports the checklist's own ndjson export, and
+    `delete` deletes a fresh clone of the checklist.
+    """
+    checklist = owner.checklists.order_by('id').first()
+    category = checklist.categories.order_by('id').first()
+    item = category.items.order_by('id').first()
+    token = ShareLink.objects.filter(checklist=checklist).values_list('token', flat=True).first()
+    base = f"/api/checklists/{checklist.pk}"
+    items_url = f"{base}/categories/{category.pk}/items/"
+
+    def item_crud():
+        created = client.post(items_url, {'name': 'Benchmark item'}, content_type='application/json')
+        url = f"{items_url}{created.json()['id']}/"
+        client.patch(url, {'is_completed': True}, content_type='application/json')
+        return client.delete(url)
+
+    def drop_clone(response):
+        # Keep the dataset stable between iterations
+        Checklist.objects.filter(pk=response.json()['id']).delete()
+
+    exported = []
+    copies = []
+
+    def clone_for_delete():
+        copies.append(clone_checklist(checklist, owner).pk)
+
+    def import_ndjson():
+        if not exported:
+            exported.append(b''.join(client.get(f"{base}/export/?format=ndjson").streaming_content))
+        return client.post('/api/checklists/import/', exported[0], content_type='application/x-ndjson')
+
+    return {
+        'list': (lambda: client.get('/api/checklists/'), None),
+        'list_summary': (lambda: client.get('/api/checklists/?view=summary'), None),
+        'retrieve': (lambda: client.get(f"{base}/"), None),
+        'retrieve_sparse': (lambda: client.get(f"{base}/?fields=id,title,categories.items.is_completed"), None),
+        'clone': (lambda: client.post(f"{base}/clone/", {}, content_type='application/json'), drop_clone),
+        'share': (lambda: client.get(f"/api/share/{token}/"), None),
+        'search': (lambda: client.get('/api/search/?q=item+4'), None),
+        'export_ndjson': (lambda: client.get(f"{base}/export/?format=ndjson"), None),
+        'export_csv': (lambda: client.get(f"{base}/export/?format=csv"), None),
+        'export_json': (lambda: client.get(f"{base}/export/?format=json"), None),
+        'import_ndjson': (import_ndjson, drop_clone),
+        'delete': (lambda: client.delete(f"/api/checklists/{copies.pop()}/"), None, clone_for_delete),
+        'item_crud': (item_crud, None),
+        'item_move': (lambda: client.post(f"{items_url}{item.pk}/move/", {}, content_type='application/json'), None),
+        'item_list': (lambda: client.get(items_url), None),
+        'category_files': (lambda: client.get(f"{base}/categories/{category.pk}/files/"), None),
+        'item_files': (lambda: client.get(f"{items_url}{item.pk}/files/"), None),
+    }
+
+
+def run_benchmark(size='small', iterations=20, warmup=3, only=None, seed=0, **overrides):
+    """
+    Generate a dataset of the given size in the current database and measure
+    each scenario in-process. Returns a JSON-serializable report.
+    """
+    checklists, categories, items = SIZES[size]
+    checklists = overrides.get('checklists') or checklists
+    categories = overrides.get('categories') or categories
+    items = overrides.get('items') or items
+
+    media = tempfile.mkdtemp(prefix='checklist-bench-')
+    storages = {
+        'default': {'BACKEND': 'checklist.storage.FileSystemStorage', 'OPTIONS': {'location': media}},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+    with override_settings(STORAGES=storages, UPLOAD_BACKEND='checklist.uploads.FileSystemUploadBackend',
+                           **unthrottled()), stub_auth() as mint:
+        [owner] = generate_dataset(1, checklists, categories, items, seed=seed)
+        client = Client(HTTP_AUTHORIZATION=f"Bearer {mint(owner.username)}")
+        results = {
+            name: measure(call, iterations, warmup, *hooks)
+            for name, (call, *hooks) in scenarios(client, owner).items()
+            if not only or name in only
+        }
+    return {
+        'dataset': {'size': size, 'checklists': checklists, 'categories': categories, 'items': items,
+                    'items_per_user': checklists * categories * items},
+        'iterations': iterations,
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=1.2):
+    """
+    Compare p95 latency and queries against a saved report. Returns a list of
+    regressions, each `(scenario, metric, baseline, current)`.
+    """
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * threshold:
+            regressions.append((name, 'p95_ms', previous['p95_ms'], current['p95_ms']))
+        if current['queries'] > previous['queries']:
+            regressions.append((name, 'queries', previous['queries'], current['queries']))
+    return regressions
+
+
+def _wsgi_get(app, path, headers):
+    """
+    One GET through a WSGI application. Returns the status code.
+    """
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    environ.update({'HTTP_' + name.upper().replace('-', '_'): value for name, value in headers.items()})
+    status = []
+    result = app(environ, lambda line, response_headers, exc_info=None: status.append(line))
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(status[0].split()[0])
+
+
+def _asgi_scope(path, headers):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver')] + [
+            (name.lower().encode(), value.encode()) for name, value in headers.items()
+        ],
+    }
+
+
+async def _asgi_get(app, path, headers):
+    """
+    One GET through an ASGI application. Returns the status code.
+    """
+    received = False
+    status = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected until the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(_asgi_scope(path, headers), receive, send)
+    return status[0]
+
+
+async def _asgi_stream(app, path, headers, on_body, disconnect):
+    """
+    One GET through an ASGI application, held open until `disconnect` is
+    set. `on_body` is called with each chunk of the response body.
+    """
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and message.get('body'):
+            on_body(message['body'])
+
+    await app(_asgi_scope(path, headers), receive, send)
+
+
+def _load_summary(timings, elapsed, errors):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+    }
+
+
+def load_wsgi(path, headers, requests, concurrency):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    app = WSGIHandler()
+
+    def one(_):
+        start = time.perf_counter()
+        status = _wsgi_get(app, path, headers)
+        return (time.perf_counter() - start) * 1000, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    return _load_summary([t for t, _ in results], elapsed, sum(1 for _, s in results if s >= 400))
+
+
+def load_asgi(path, headers, requests, concurrency):
+    from django.core.handlers.asgi import ASGIHandler
+
+    app = ASGIHandler()
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                status = await _asgi_get(app, path, headers)
+                return (time.perf_counter() - start) * 1000, status
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+    return _load_summary([t for t, _ in results], elapsed, sum(1 for _, s in results if s >= 400))
+
+
+def run_load_test(size='small', requests=500, concurrency=50, only=None, seed=0):
+    """
+    Drive the hot read endpoints with `concurrency` concurrent clients, first
+    through the WSGI handler with the sync views (a thread per client), then
+    through the ASGI handler with the async views, and report throughput and
+    latency for both.
+    """
+    checklists, categories, items = SIZES[size]
+    media = tempfile.mkdtemp(prefix='checklist-bench-')
+    storages = {
+        'default': {'BACKEND': 'checklist.storage.FileSystemStorage', 'OPTIONS': {'location': media}},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+    with override_settings(STORAGES=storages, ALLOWED_HOSTS=['testserver'], **unthrottled()), \
+            stub_auth() as mint:
+        [owner] = generate_dataset(1, checklists, categories, items, seed=seed)
+        checklist = owner.checklists.order_by('id').first()
+        token = ShareLink.objects.filter(checklist=checklist).values_list('token', flat=True).first()
+        auth = {'Authorization': f"Bearer {mint(owner.username)}"}
+        targets = {
+            'list': ('/api/checklists/', auth),
+            'retrieve': (f"/api/checklists/{checklist.pk}/", auth),
+            'share': (f"/api/share/{token}/", {}),
+        }
+        results = {}
+        for name, (path, headers) in targets.items():
+            if only and name not in only:
+                continue
+            with override_settings(ROOT_URLCONF='checklist.urls'):
+                wsgi = load_wsgi(path, headers, requests, concurrency)
+            with override_settings(ROOT_URLCONF='checklist.async_urls'):
+                asgi = load_asgi(path, headers, requests, concurrency)
+            results[name] = {
+                'wsgi': wsgi,
+                'asgi': asgi,
+                'speedup': round(asgi['rps'] / wsgi['rps'], 2) if wsgi['rps'] else None,
+            }
+    return {
+        'dataset': {'size': size, 'checklists': checklists, 'categories': categories, 'items': items},
+        'requests': requests,
+        'concurrency': concurrency,
+        'results': results,
+    }
+
+
+def run_stream_test(streams=1000, changes=10, seed=0):
+    """
+    Hold `streams` idle event streams of one shared checklist open through
+    the ASGI handler, then toggle items one at a time and time how long each
+    change takes to reach every stream. Also reports the Python memory held
+    per open stream.
+    """
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIHandler
+
+    app = ASGIHandler()
+    with override_settings(ROOT_URLCONF='checklist.async_urls', ALLOWED_HOSTS=['testserver'],
+                           **unthrottled()):
+        [owner] = generate_dataset(1, 1, 2, 5, files=0, seed=seed)
+        checklist = owner.checklists.get()
+        token = ShareLink.objects.filter(checklist=checklist).values_list('token', flat=True).first()
+        path = f"/api/share/{token}/events/?since={Checklist.objects.get(pk=checklist.pk).version}"
+        items = list(Item.objects.filter(category__checklist=checklist))
+
+        def toggle(n):
+            item = items[n % len(items)]
+            item.is_completed = not item.is_completed
+            item.save()
+
+        async def run():
+            disconnect = asyncio.Event()
+            connected, delivered = [0], [0]
+            all_connected, all_delivered = asyncio.Event(), asyncio.Event()
+
+            def on_body(body):
+                counter, done = (delivered, all_delivered) if body.startswith(b'id:') else (connected, all_connected)
+                counter[0] += 1
+                if counter[0] == streams:
+                    done.set()
+
+            tracemalloc.start()
+            tasks = [asyncio.create_task(_asgi_stream(app, path, {}, on_body, disconnect)) for _ in range(streams)]
+            await all_connected.wait()
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            timings = []
+            for n in range(changes):
+                delivered[0] = 0
+                all_delivered.clear()
+                start = time.perf_counter()
+                await sync_to_async(toggle)(n)
+                await all_delivered.wait()
+                timings.append((time.perf_counter() - start) * 1000)
+            disconnect.set()
+            await asyncio.gather(*tasks)
+            return memory, timings
+
+        memory, timings = asyncio.run(run())
+    return {
+        'streams': streams,
+        'kb_per_stream': round(memory / streams / 1024, 1),
+        'changes': changes,
+        'fanout_p50_ms': round(percentile(timings, 50), 3),
+        'fanout_p95_ms': round(percentile(timings, 95), 3),
+        'fanout_max_ms': round(max(timings), 3),
+    }
@@ -0,0 +1,125 @@
+import hashlib
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Blob, OrphanedFile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spools uploads to a temporary file and computes their SHA-256 as the
+    chunks arrive, so the content is never held in memory or read twice.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+def file_sha256(f):
+    """
+    SHA-256 of a file, taken from the upload handler when available,
+    otherwise computed chunk by chunk.
+    """
+    digest = getattr(f, 'sha256', None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    for chunk in f.chunks(CHUNK_SIZE):
+        sha.update(chunk)
+    f.seek(0)
+    return sha.hexdigest()
+
+
+def blob_key(digest, filename):
+    prefix = getattr(settings, 'BLOB_PREFIX', 'blobs/')
+    ext = os.path.splitext(filename or '')[1].lower()[:16]
+    return f"{prefix}{digest[:2]}/{digest}{ext}"
+
+
+def store_blob(f, storage=None):
+    """
+    Store an uploaded file under its content-addressed key and take a reference.
+    Identical content reuses the existing object. Returns the storage key.
+    """
+    storage = storage or default_storage
+    digest = file_sha256(f)
+    if _retain_by_hash(digest):
+        return Blob.objects.values_list('key', flat=True).get(sha256=digest)
+
+    key = storage.save(blob_key(digest, f.name), f)
+    try:
+        with transaction.atomic():
+            Blob.objects.create(key=key, sha256=digest, size=f.size, ref_count=1)
+    except IntegrityError:
+        # A concurrent upload of the same content won; share its object
+        if not _retain_by_hash(digest):
+            raise
+        existing = Blob.objects.values_list('key', flat=True).get(sha256=digest)
+        if existing != key:
+            storage.delete(key)
+        return existing
+    return key
+
+
+def register_blob(key, size):
+    """
+    Track an object written directly to storage (e.g. a presigned upload).
+    """
+    Blob.objects.create(key=key, size=size, ref_count=1)
+
+
+def retain_blobs(keys):
+    """
+    Add one reference per occurrence of each key, e.g. for rows copied by clone.
+    Keys that are not tracked blobs are ignored.
+    """
+    for count, group in _grouped_by_count(keys):
+        Blob.objects.filter(key__in=group).update(ref_count=F('ref_count') + count)
+
+
+def release_blobs(keys):
+    """
+    Drop one reference per occurrence of each key. Blobs left without
+    references, and files stored before blobs, go to the OrphanedFile outbox
+    in the same transaction; `manage.py reap_files` deletes them from storage.
+    """
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+    with transaction.atomic():
+        for count, group in _grouped_by_count(keys):
+            Blob.objects.filter(key__in=group).update(ref_count=F('ref_count') - count)
+        ref_counts = dict(Blob.objects.filter(key__in=set(keys)).values_list('key', 'ref_count'))
+        orphan_keys = [key for key in set(keys) if ref_counts.get(key, 0) <= 0]
+        Blob.objects.filter(key__in=orphan_keys).delete()
+        OrphanedFile.objects.bulk_create([OrphanedFile(key=key) for key in orphan_keys])
+
+
+def _grouped_by_count(keys):
+    # One UPDATE per distinct reference count rather than one per key
+    by_count = {}
+    for key, count in Counter(keys).items():
+        by_count.setdefault(count, []).append(key)
+    return by_count.items()
+
+
+def _retain_by_hash(digest):
+    return Blob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1) > 0
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.http import parse_etags
+
+from .fileurls import file_urls
+
+
+def shared_cache():
+    """
+    Cache holding rendered shared checklists, configured under CACHES
+    (locmem by default, a shared backend such as Redis in production).
+    """
+    return caches[getattr(settings, 'SHARED_CHECKLIST_CACHE', 'shared_checklists')]
+
+
+def check_shared_cache():
+    """
+    Refuse a per-process shared cache outside development: another worker
+    would keep serving the renderings and ETags a write retired.
+    """
+    if isinstance(shared_cache(), LocMemCache) and not getattr(settings, 'SHARED_CACHE_ALLOW_LOCMEM', False):
+        raise ImproperlyConfigured(
+            "The shared cache must be shared by every worker; point SHARED_CACHE_BACKEND at Redis "
+            "or Memcached, or set SHARED_CACHE_ALLOW_LOCMEM for a single development worker."
+        )
+
+
+async def acache(cache, method, *args):
+    """
+    Call a cache method from async code. In-process backends answer without
+    I/O, so they are called directly instead of paying a hop to the sync thread.
+    """
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        return getattr(cache, method)(*args)
+    return await getattr(cache, f"a{method}")(*args)
+
+
+def _version_key(checklist_id):
+    return f"checklist:{checklist_id}:version"
+
+
+def checklist_version(checklist_id):
+    cache = shared_cache()
+    version = cache.get(_version_key(checklist_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another worker may have set it first; keep whichever landed.
+        if not cache.add(_version_key(checklist_id), version, None):
+            version = cache.get(_version_key(checklist_id), version)
+    return version
+
+
+async def achecklist_version(checklist_id):
+    cache = shared_cache()
+    version = await acache(cache, 'get', _version_key(checklist_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not await acache(cache, 'add', _version_key(checklist_id), version, None):
+            version = await acache(cache, 'get', _version_key(checklist_id), version)
+    return version
+
+
+def bump_checklist_version(checklist_id):
+    """
+    Retire every cached rendering of the checklist. Old entries are never
+    looked up again and age out on their own.
+    """
+    shared_cache().set(_version_key(checklist_id), uuid.uuid4().hex, None)
+
+
+def get_shared_payload(checklist_id, build):
+    """
+    Return `(data, etag)` for the checklist's current version, calling
+    `build()` to render it on a miss.
+    """
+    cache = shared_cache()
+    key = _payload_key(checklist_id, checklist_version(checklist_id))
+    entry = cache.get(key)
+    if entry is None:
+        entry = _payload_entry(build())
+        cache.set(key, entry, payload_timeout())
+    return entry
+
+
+async def aget_shared_payload(checklist_id, build):
+    """
+    Async variant of get_shared_payload; `build` is a coroutine function.
+    """
+    cache = shared_cache()
+    key = _payload_key(checklist_id, await achecklist_version(checklist_id))
+    entry = await acache(cache, 'get', key)
+    if entry is None:
+        entry = _payload_entry(await build())
+        await acache(cache, 'set', key, entry, payload_timeout())
+    return entry
+
+
+def payload_timeout():
+    # Renderings hold signed file URLs, so they must not outlive them
+    timeout = getattr(settings, 'SHARED_CHECKLIST_CACHE_TIMEOUT', 3600)
+    lifetime = file_urls().lifetime
+    return timeout if lifetime is None else min(timeout, lifetime)
+
+
+def _payload_key(checklist_id, version):
+    return f"checklist:{checklist_id}:payload:{version}"
+
+
+def _payload_entry(data):
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+    return data, f'"{hashlib.sha256(body).hexdigest()}"'
+
+
+def representation_etag(etag, media_type):
+    """
+    The ETag of a payload rendered as `media_type`. JSON, indented JSON,
+    MessagePack and the browsable API differ byte for byte, so each gets its
+    own tag and a conditional request never matches another rendering's.
+    """
+    return f'{etag[:-1]}-{hashlib.sha256(media_type.encode()).hexdigest()[:8]}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
@@ -0,0 +1,82 @@
+from django.db import transaction
+
+from .blobs import retain_blobs
+from .counters import add_item_delta
+from .models import Checklist, Category, Item, CategoryFile, ItemFile
+
+BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def clone_checklist(original, owner, title=None, reset_completion=False):
+    """
+    Clone a checklist with its categories, items and files.
+    Copies level by level with bulk_create, so the number of queries does
+    not depend on the size of the tree. File rows share the original objects
+    and take a reference on their blobs.
+    """
+    categories = list(
+        Category.objects.filter(checklist=original).order_by('id').values_list('id', 'name', 'position')
+    )
+    items = list(
+        Item.objects.filter(category__checklist=original).order_by('id')
+        .values_list('id', 'category_id', 'name', 'is_completed', 'position')
+    )
+
+    # Counters are known up front, so they are written with the rows
+    counts = {}
+    for _, category_id, _, is_completed, _ in items:
+        add_item_delta(counts, category_id, is_completed and not reset_completion, 1)
+    new_checklist = Checklist.objects.create(
+        title=title or f"Copy of {original.title}",
+        description=original.description,
+        owner=owner,
+        item_count=len(items),
+        completed_count=sum(done for _, done in counts.values()),
+    )
+    new_categories = Category.objects.bulk_create(
+        [
+            Category(
+                checklist=new_checklist,
+                name=name,
+                position=position,
+                item_count=counts.get(old_id, (0, 0))[0],
+                completed_count=counts.get(old_id, (0, 0))[1],
+            )
+            for old_id, name, position in categories
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    category_map = {old_id: new.pk for (old_id, *_), new in zip(categories, new_categories)}
+
+    new_items = Item.objects.bulk_create(
+        [
+            Item(
+                category_id=category_map[category_id],
+                name=name,
+                is_completed=False if reset_completion else is_completed,
+                position=position,
+            )
+            for _, category_id, name, is_completed, position in items
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    item_map = {old_id: new.pk for (old_id, *_), new in zip(items, new_items)}
+
+    category_files = list(
+        CategoryFile.objects.filter(category__checklist=original).order_by('id').values_list('category_id', 'file')
+    )
+    CategoryFile.objects.bulk_create(
+        [CategoryFile(category_id=category_map[category_id], file=file) for category_id, file in category_files],
+        batch_size=BATCH_SIZE,
+    )
+    item_files = list(
+        ItemFile.objects.filter(item__category__checklist=original).order_by('id').values_list('item_id', 'file')
+    )
+    ItemFile.objects.bulk_create(
+        [ItemFile(item_id=item_map[item_id], file=file) for item_id, file in item_files],
+        batch_size=BATCH_SIZE,
+    )
+    # The copies share the original objects, so each one holds a reference
+    retain_blobs([file for _, file in category_files] + [file for _, file in item_files])
+    return new_checklist
@@ -0,0 +1,113 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Checklist, Category, Item
+
+_state = threading.local()
+
+
+@contextmanager
+def signal_counters_suspended():
+    """
+    Stop the Item signals from touching counters, for bulk paths that
+    compute their deltas themselves and call `apply_deltas` once.
+    """
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def signal_counters_active():
+    return not getattr(_state, 'suspended', False)
+
+
+def add_item_delta(deltas, category_id, is_completed, sign):
+    """
+    Record an item entering (sign=1) or leaving (sign=-1) a category.
+    """
+    entry = deltas.setdefault(category_id, [0, 0])
+    entry[0] += sign
+    if is_completed:
+        entry[1] += sign
+
+
+def apply_deltas(deltas):
+    """
+    Apply `{category_id: [item_delta, completed_delta]}` to the categories
+    and their checklists with F() updates, one statement per distinct delta.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and any(delta)}
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        [(category_id, delta)] = deltas.items()
+        _update(Category.objects.filter(pk=category_id), delta)
+        _update(Checklist.objects.filter(categories__id=category_id), delta)
+        return
+
+    checklist_deltas = defaultdict(lambda: [0, 0])
+    for category_id, checklist_id in Category.objects.filter(pk__in=deltas).values_list('id', 'checklist_id'):
+        checklist_deltas[checklist_id][0] += deltas[category_id][0]
+        checklist_deltas[checklist_id][1] += deltas[category_id][1]
+    _apply_grouped(Category, deltas)
+    _apply_grouped(Checklist, checklist_deltas)
+
+
+def _apply_grouped(model, deltas):
+    groups = defaultdict(list)
+    for pk, delta in deltas.items():
+        if any(delta):
+            groups[tuple(delta)].append(pk)
+    for delta, pks in groups.items():
+        _update(model.objects.filter(pk__in=pks), delta)
+
+
+def _update(queryset, delta):
+    queryset.update(
+        item_count=F('item_count') + delta[0],
+        completed_count=F('completed_count') + delta[1],
+    )
+
+
+def _count(queryset, outer_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{outer_field: OuterRef('pk')}).order_by()
+            .values(outer_field).annotate(n=Count('pk')).values('n')
+        ),
+        Value(0),
+    )
+
+
+def recount(checklist_ids=None, dry_run=False):
+    """
+    Recompute counters from the Item table and fix rows that drifted.
+    Returns `(categories_fixed, checklists_fixed)`.
+    """
+    categories = Category.objects.all()
+    checklists = Checklist.objects.all()
+    if checklist_ids:
+        categories = categories.filter(checklist_id__in=checklist_ids)
+        checklists = checklists.filter(pk__in=checklist_ids)
+
+    fixed = []
+    for queryset, outer_field in ((categories, 'category'), (checklists, 'category__checklist')):
+        actual_items = _count(Item.objects.all(), outer_field)
+        actual_completed = _count(Item.objects.filter(is_completed=True), outer_field)
+        drifted = queryset.annotate(actual_items=actual_items, actual_completed=actual_completed).filter(
+            ~Q(item_count=F('actual_items')) | ~Q(completed_count=F('actual_completed'))
+        )
+        drifted_ids = list(drifted.values_list('pk', flat=True))
+        if drifted_ids and not dry_run:
+            queryset.model.objects.filter(pk__in=drifted_ids).update(
+                item_count=actual_items, completed_count=actual_completed
+            )
+        fixed.append(len(drifted_ids))
+    return tuple(fixed)
@@ -0,0 +1,172 @@
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.functional import LazyObject
+
+from .cache import acache, shared_cache
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = ContextVar('checklist_db_routing', default=None)
+
+# Replica alias -> time.monotonic() until which it is skipped after a failed connect
+_down_until = {}
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    """
+    Sends reads from safe-method requests to the checklist views to a replica
+    from DATABASE_REPLICAS. Everything else reads from the primary. This covers
+    writes, requests by a user who wrote within READ_YOUR_WRITES_SECONDS, and
+    code running outside a request (commands, signals on commit).
+    The replica is chosen once per request.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None:
+            return DEFAULT_DB_ALIAS
+        if state.alias is None:
+            alias = read_alias(state.request)
+            if state.request.resolver_match is None:
+                # Queries before URL resolution (middleware) stay on the primary
+                return alias
+            state.alias = alias
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        # Also for instances that were loaded from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class RoutingState:
+    def __init__(self, request):
+        self.request = request
+        self.alias = None
+
+
+def read_alias(request):
+    if not replicas() or request.method not in SAFE_METHODS:
+        return DEFAULT_DB_ALIAS
+    match = request.resolver_match
+    if match is None or not getattr(match.func, '__module__', '').startswith('checklist.'):
+        return DEFAULT_DB_ALIAS
+    if is_pinned(request):
+        return DEFAULT_DB_ALIAS
+    return healthy_replica() or DEFAULT_DB_ALIAS
+
+
+def healthy_replica():
+    """
+    A random replica that accepts connections, skipping any that failed
+    within DB_REPLICA_RETRY_SECONDS. None when all are down.
+    """
+    now = time.monotonic()
+    candidates = [alias for alias in replicas() if _down_until.get(alias, 0) <= now]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as e:
+            logger.warning("Replica %s unavailable, reading from the primary: %s", alias, e)
+            _down_until[alias] = now + getattr(settings, 'DB_REPLICA_RETRY_SECONDS', 30)
+            continue
+        _down_until.pop(alias, None)
+        return alias
+    return None
+
+
+def _pin_key(request):
+    # Keyed by the user the API authenticated. Until it has, request.user is
+    # AuthenticationMiddleware's lazy session user, which is left unevaluated.
+    user = getattr(request, 'user', None)
+    if user is None or isinstance(user, LazyObject) or not user.is_authenticated:
+        return None
+    return f"db-pin:{user.pk}"
+
+
+def is_pinned(request):
+    key = _pin_key(request)
+    return key is not None and shared_cache().get(key) is not None
+
+
+def pin_to_primary(request):
+    """
+    Read from the primary for this user's requests during the next
+    READ_YOUR_WRITES_SECONDS, so they see their own writes despite replica lag.
+    """
+    key = _pin_key(request)
+    if key is not None:
+        shared_cache().set(key, True, getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5))
+
+
+async def apin_to_primary(request):
+    key = _pin_key(request)
+    if key is not None:
+        await acache(shared_cache(), 'set', key, True, getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Makes the current request visible to ReplicaRouter and pins the user to
+    the primary after any successful unsafe-method request. Pins are kept in
+    the shared cache, which must be shared by all workers when replicas are
+    configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if replicas() and isinstance(shared_cache(), LocMemCache):
+            raise ImproperlyConfigured(
+                "DATABASE_REPLICAS needs a shared cache for read-your-writes pins; "
+                "point SHARED_CACHE_BACKEND at Redis or Memcached."
+            )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        reset = _routing.set(RoutingState(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(reset)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        reset = _routing.set(RoutingState(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(reset)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            await apin_to_primary(request)
+        return response
@@ -0,0 +1,114 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+from django.db.models import Count, DateTimeField, F, Value
+from django.utils import timezone
+
+from .models import Blob, Checklist, Category, Item, CategoryFile, ItemFile, OrphanedFile, ShareLink, Tombstone
+from .sharing import invalidate_share_token
+from .signals import invalidate_checklist
+from .storage import delete_many
+
+
+def reap_batch_size():
+    return getattr(settings, 'REAP_BATCH_SIZE', 1000)
+
+
+def delete_checklist(checklist):
+    """
+    Delete a checklist and everything in it bottom up, with one set-based
+    DELETE per table and no model instances, so it takes the same handful
+    of statements for any size. post_delete signals do not run; their work
+    is done here instead: file keys go to the OrphanedFile outbox together
+    with the blob references they held, and cached renderings and share
+    tokens are invalidated on commit.
+    """
+    using = router.db_for_write(Checklist, instance=checklist)
+    pk = checklist.pk
+    category_files = CategoryFile.objects.filter(category__checklist_id=pk)
+    item_files = ItemFile.objects.filter(item__category__checklist_id=pk)
+    with transaction.atomic(using=using):
+        tokens = list(ShareLink.objects.using(using).filter(checklist_id=pk).values_list('token', flat=True))
+        _queue_files(category_files, using)
+        _queue_files(item_files, using)
+        for queryset in (
+            item_files, category_files,
+            Item.objects.filter(category__checklist_id=pk), Category.objects.filter(checklist_id=pk),
+            Tombstone.objects.filter(checklist_id=pk), ShareLink.objects.filter(checklist_id=pk),
+            Checklist.objects.filter(pk=pk),
+        ):
+            _delete_rows(queryset, using)
+        invalidate_checklist(pk)
+        transaction.on_commit(lambda: [invalidate_share_token(token) for token in tokens], using=using)
+
+
+def _delete_rows(queryset, using):
+    # DELETE ... WHERE pk IN (SELECT ...): one statement, no instances, signals or cascades
+    model = queryset.model
+    connection = connections[using]
+    sql, params = queryset.order_by().values('pk').query.get_compiler(using).as_sql()
+    table, pk = (connection.ops.quote_name(name) for name in (model._meta.db_table, model._meta.pk.column))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({sql})", params)
+
+
+def _queue_files(files, using):
+    # INSERT ... SELECT: one statement however many files there are
+    rows = files.exclude(file='').order_by().values('file').annotate(
+        refs=Count('id'), created_at=Value(timezone.now(), output_field=DateTimeField()),
+    ).values_list('file', 'refs', 'created_at')
+    connection = connections[using]
+    sql, params = rows.query.get_compiler(using).as_sql()
+    columns = ', '.join(connection.ops.quote_name(column) for column in ('key', 'refs', 'created_at'))
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {connection.ops.quote_name(OrphanedFile._meta.db_table)} ({columns}) {sql}", params)
+
+
+def reap_orphaned_files(batch_size=None, storage=None):
+    """
+    Work through the OrphanedFile outbox in batches: subtract the released
+    references from their blobs, then delete the objects that no blob or
+    file row references any more, many per storage call. A batch leaves the
+    outbox only once its objects are gone, so a failure is retried by the
+    next run. Returns `(deleted, kept)` key counts.
+    """
+    batch_size = batch_size or reap_batch_size()
+    storage = storage or default_storage
+    deleted = kept = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                OrphanedFile.objects.select_for_update(skip_locked=True).order_by('id')
+                .values_list('id', 'key', 'refs')[:batch_size]
+            )
+            if not rows:
+                break
+            released = Counter()
+            for _, key, refs in rows:
+                released[key] += refs
+            doomed = _unreferenced(released)
+            if doomed:
+                Blob.objects.filter(key__in=doomed).delete()
+                delete_many(storage, doomed)
+            OrphanedFile.objects.filter(id__in=[pk for pk, _, _ in rows]).delete()
+        deleted += len(doomed)
+        kept += len(released) - len(doomed)
+    return deleted, kept
+
+
+def _unreferenced(released):
+    # Keys whose blob ran out of references, or that are not blobs (files
+    # stored before content-addressed storage) and no file row uses
+    by_count = {}
+    for key, count in released.items():
+        if count:
+            by_count.setdefault(count, []).append(key)
+    for count, group in by_count.items():
+        Blob.objects.filter(key__in=group).update(ref_count=F('ref_count') - count)
+    keys = list(released)
+    ref_counts = dict(Blob.objects.filter(key__in=keys).values_list('key', 'ref_count'))
+    in_use = set(CategoryFile.objects.filter(file__in=keys).values_list('file', flat=True))
+    in_use.update(ItemFile.objects.filter(file__in=keys).values_list('file', flat=True))
+    return [key for key in keys if ref_counts.get(key, 0) <= 0 and key not in in_use]
@@ -0,0 +1,272 @@
+import asyncio
+import contextvars
+import logging
+import select
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils.module_loading import import_string
+
+from .models import Checklist
+from .renderers import json_dumps
+from .sync import changes_since
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_hubs = {}  # event loop -> Hub
+
+
+def event_broker():
+    """
+    The process-wide broker from EVENT_BROKER.
+    """
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'EVENT_BROKER', 'checklist.events.LocalBroker'))()
+    return _broker
+
+
+def publish_change(checklist_id):
+    """
+    Tell event streams that the checklist changed. Call once the change is
+    committed; the streams read what changed themselves.
+    """
+    event_broker().publish(checklist_id)
+
+
+class Broker:
+    """
+    Carries "checklist N changed" notices from writers to the processes
+    serving event streams. Listeners are called with the checklist id, from
+    any thread, or with None when notices may have been missed (e.g. after
+    a reconnect) and every stream should catch up.
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def publish(self, checklist_id):
+        raise NotImplementedError
+
+    def subscribe(self, listener):
+        with self._lock:
+            self.listeners = self.listeners + [listener]
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self.listeners = [other for other in self.listeners if other is not listener]
+
+    def dispatch(self, checklist_id):
+        for listener in self.listeners:
+            listener(checklist_id)
+
+
+class LocalBroker(Broker):
+    """
+    In-process broker: streams only see writes made by the same process.
+    Enough for a single ASGI worker, and for tests.
+    """
+
+    def publish(self, checklist_id):
+        self.dispatch(checklist_id)
+
+
+class PostgresBroker(Broker):
+    """
+    Broker over PostgreSQL LISTEN/NOTIFY on the default database, for
+    several workers or nodes: each write sends one NOTIFY and each process
+    with streams keeps one listening connection, read by a thread.
+    """
+    channel = 'checklist_events'
+
+    def __init__(self):
+        super().__init__()
+        self._thread = None
+
+    def publish(self, checklist_id):
+        with connections['default'].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, str(checklist_id)])
+
+    def subscribe(self, listener):
+        super().subscribe(listener)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='checklist-events', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        retry = 1
+        while True:
+            connection = connections.create_connection('default')
+            try:
+                connection.ensure_connection()
+                connection.set_autocommit(True)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # Anything published while (re)connecting was missed
+                self.dispatch(None)
+                retry = 1
+                raw = connection.connection
+                while True:
+                    select.select([raw], [], [], 60)
+                    raw.poll()
+                    while raw.notifies:
+                        payload = raw.notifies.pop(0).payload
+                        self.dispatch(int(payload))
+            except Exception:
+                logger.exception("Lost the %s listener connection, reconnecting in %ss", self.channel, retry)
+            finally:
+                connection.close()
+            threading.Event().wait(retry)
+            retry = min(retry * 2, 30)
+
+
+def hub():
+    """
+    The Hub of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    instance = _hubs.get(loop)
+    if instance is None:
+        instance = _hubs[loop] = Hub(loop, event_broker())
+    return instance
+
+
+class Subscription:
+    """
+    One stream's place in a checklist's events: `since` is the version its
+    queued events reach. Events wait in `pending` until the stream takes
+    them; a stream that falls `max_pending` events behind gets one merged
+    event instead.
+    """
+    max_pending = 16
+
+    def __init__(self, checklist_id, since, context):
+        self.checklist_id = checklist_id
+        self.since = since
+        self.sent = since
+        self.context = context
+        request = context.get('request')
+        # File URLs are absolute for the request's host
+        self.origin = request.build_absolute_uri('/') if request is not None else None
+        self.pending = []
+        self.gone = False
+        self.ready = asyncio.Event()
+
+    def push(self, version, data):
+        if len(self.pending) >= self.max_pending:
+            # Lagging: drop the backlog, the next delta covers it from `sent`
+            self.pending.clear()
+            self.since = self.sent
+            return False
+        self.pending.append((version, data))
+        self.since = version
+        self.ready.set()
+        return True
+
+    def take(self):
+        events, self.pending = self.pending, []
+        self.ready.clear()
+        if events:
+            self.sent = events[-1][0]
+        return events
+
+    def close(self):
+        self.gone = True
+        self.ready.set()
+
+
+class Hub:
+    """
+    Fans checklist changes out to the event streams of one event loop. A
+    notice from the broker is turned into deltas (changes_since) once per
+    group of streams at the same version, however many streams there are;
+    notices arriving meanwhile are merged into one more round.
+    """
+
+    def __init__(self, loop, broker):
+        self.loop = loop
+        self.subscriptions = {}  # checklist id -> set of Subscription
+        self._running = {}
+        self._dirty = set()
+        self._broker = broker
+        broker.subscribe(self._notice)
+
+    def _notice(self, checklist_id):
+        # Called by the broker from any thread
+        try:
+            self.loop.call_soon_threadsafe(self.notify, checklist_id)
+        except RuntimeError:
+            # The loop is closed
+            self._broker.unsubscribe(self._notice)
+            _hubs.pop(self.loop, None)
+
+    def subscribe(self, checklist_id, since, context):
+        subscription = Subscription(checklist_id, since, context)
+        self.subscriptions.setdefault(checklist_id, set()).add(subscription)
+        # Catch up from `since`, through the same path as live changes
+        self.notify(checklist_id)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscriptions.get(subscription.checklist_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.checklist_id]
+
+    def notify(self, checklist_id):
+        if checklist_id is None:
+            for checklist_id in list(self.subscriptions):
+                self.notify(checklist_id)
+            return
+        if checklist_id not in self.subscriptions:
+            return
+        if checklist_id in self._running:
+            self._dirty.add(checklist_id)
+            return
+        # In a context of its own, not that of the request or thread that noticed the change
+        self._running[checklist_id] = contextvars.Context().run(self.loop.create_task, self._fan_out(checklist_id))
+
+    async def _fan_out(self, checklist_id):
+        try:
+            while True:
+                self._dirty.discard(checklist_id)
+                await self._deliver(checklist_id)
+                if checklist_id not in self._dirty:
+                    break
+        except Exception:
+            logger.exception("Delivering events of checklist %s failed", checklist_id)
+        finally:
+            del self._running[checklist_id]
+
+    async def _deliver(self, checklist_id):
+        groups = {}
+        for subscription in self.subscriptions.get(checklist_id, ()):
+            groups.setdefault((subscription.since, subscription.origin), []).append(subscription)
+        for (since, _), group in groups.items():
+            changes = await sync_to_async(_changes)(checklist_id, since, group[0].context)
+            if changes is None:
+                for subscription in group:
+                    subscription.close()
+                continue
+            if changes['version'] == since and not changes['reset']:
+                continue
+            data = json_dumps(changes)
+            lagging = False
+            for subscription in group:
+                lagging = not subscription.push(changes['version'], data) or lagging
+            if lagging:
+                self._dirty.add(checklist_id)
+
+
+def _changes(checklist_id, since, context):
+    try:
+        return changes_since(Checklist.objects.filter(pk=checklist_id), since, context)
+    finally:
+        # Outside any request, so nothing else recycles this thread's connection
+        close_old_connections()
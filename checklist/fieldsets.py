@@ -0,0 +1,171 @@
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import BaseSerializer
+
+
+def _parse(value, param):
+    # "id,categories.items.name" -> {'id': {}, 'categories': {'items': {'name': {}}}}
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(','))):
+        node = tree
+        for name in path.split('.'):
+            if not name:
+                raise ValidationError({param: f"Invalid field path {path!r}."})
+            node = node.setdefault(name, {})
+    return tree
+
+
+@lru_cache(maxsize=None)
+def _shape(serializer_class):
+    return _fields_shape(serializer_class())
+
+
+def _fields_shape(serializer):
+    # field name -> shape of the nested serializer, or None for plain fields
+    shape = {}
+    for name, field in serializer.fields.items():
+        field = getattr(field, 'child', field)
+        shape[name] = _fields_shape(field) if isinstance(field, BaseSerializer) else None
+    return shape
+
+
+def _validate(tree, shape, param, prefix=''):
+    for name, subtree in tree.items():
+        if name not in shape:
+            raise ValidationError({param: f"Unknown field {prefix + name!r}."})
+        if subtree:
+            if shape[name] is None:
+                raise ValidationError({param: f"Field {prefix + name!r} has no subfields."})
+            _validate(subtree, shape[name], param, f"{prefix}{name}.")
+
+
+class Fieldset:
+    """
+    Sparse fieldset of a serializer from `?fields=` and `?exclude=`: comma
+    separated field paths, with dots into nested serializers, e.g.
+    `?fields=id,title,categories.items.is_completed`. A nested field listed
+    without subfields is included (or excluded) whole.
+    """
+
+    def __init__(self, include=None, exclude=None):
+        self.include = include  # None: every field
+        self.exclude = exclude or {}
+        self._children = {}
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        """
+        The fieldset the request asks for, validated against
+        `serializer_class`, or None when it asks for every field.
+        """
+        params = getattr(request, 'query_params', request.GET)
+        fields, exclude = params.get('fields'), params.get('exclude')
+        if not fields and not exclude:
+            return None
+        fieldset = cls(_parse(fields, 'fields') if fields else None, _parse(exclude, 'exclude') if exclude else None)
+        shape = _shape(serializer_class)
+        if fieldset.include is not None:
+            _validate(fieldset.include, shape, 'fields')
+        _validate(fieldset.exclude, shape, 'exclude')
+        return fieldset
+
+    def child(self, name):
+        """
+        The fieldset of field `name`, or None when the field is left out.
+        """
+        try:
+            return self._children[name]
+        except KeyError:
+            pass
+        include, exclude = None, self.exclude.get(name)
+        if self.include is not None:
+            include = self.include.get(name)
+        if (self.include is not None and include is None) or exclude == {}:
+            child = None
+        elif not include and not exclude:
+            child = FULL
+        else:
+            child = Fieldset(include or None, exclude)
+        self._children[name] = child
+        return child
+
+    def at(self, path):
+        """
+        The fieldset of the nested field at `path` (field names from the
+        root), or None when it or one of its parents is left out.
+        """
+        fieldset = self
+        for name in path:
+            fieldset = fieldset.child(name)
+            if fieldset is None:
+                return None
+        return fieldset
+
+    def names(self, names):
+        return [name for name in names if self.child(name) is not None]
+
+    def prune(self, data):
+        """
+        Drop the left out fields from an already rendered object or list.
+        """
+        if isinstance(data, list):
+            return [self.prune(value) for value in data]
+        if not isinstance(data, dict):
+            return data
+        pruned = {}
+        for name, value in data.items():
+            fieldset = self.child(name)
+            if fieldset is not None:
+                pruned[name] = value if fieldset is FULL else fieldset.prune(value)
+        return pruned
+
+
+# Every field
+FULL = Fieldset()
+
+
+def prefetch_lookups(fieldset, *lookups):
+    """
+    The `prefetch_related()` lookups cut down to the relations that are part
+    of the output. Lookups are paths of serializer field names, e.g.
+    'categories__items__files'.
+    """
+    if fieldset is None:
+        return lookups
+    kept = []
+    for lookup in lookups:
+        path = []
+        for name in lookup.split('__'):
+            if fieldset.at(path + [name]) is None:
+                break
+            path.append(name)
+        if path:
+            kept.append('__'.join(path))
+    return kept
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin leaving out the fields pruned by the `fieldset` in the
+    serializer context. Nested serializers find their part of the fieldset
+    by their field path from the root serializer.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None:
+            return fields
+        fieldset = fieldset.at(self._field_path())
+        if fieldset is None:
+            return fields
+        return {name: field for name, field in fields.items() if fieldset.child(name) is not None}
+
+    def _field_path(self):
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return reversed(path)
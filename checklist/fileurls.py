@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.encoding import filepath_to_uri
+
+_urls = None
+
+
+def file_urls():
+    """
+    The process-wide FileURLs for the default storage.
+    """
+    global _urls
+    if _urls is None:
+        _urls = FileURLs(
+            max_size=getattr(settings, 'FILE_URL_CACHE_SIZE', 10000),
+            refresh=getattr(settings, 'FILE_URL_REFRESH', 300),
+            cdn_domain=getattr(settings, 'FILE_URL_CDN_DOMAIN', ''),
+        )
+    return _urls
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _urls
+    if setting in ('STORAGES', 'FILE_URL_CACHE_SIZE', 'FILE_URL_REFRESH', 'FILE_URL_CDN_DOMAIN') \
+            or setting.startswith('AWS_'):
+        _urls = None
+
+
+class FileURLs:
+    """
+    URLs of stored files by key, signed in batches and cached (LRU of
+    `max_size` keys). A signed URL is reused for its `lifetime`, so the same
+    file keeps the same URL between polls and responses stay cacheable.
+    With `cdn_domain`, URLs point at that domain (a CDN in front of the
+    storage) and are not signed.
+    """
+
+    def __init__(self, storage=None, max_size=10000, refresh=300, cdn_domain=''):
+        self.storage = storage or default_storage
+        self.max_size = max_size
+        self.refresh = refresh
+        self.cdn_domain = cdn_domain
+        self._cache = OrderedDict()  # key -> (url, reuse until)
+        self._lock = threading.Lock()
+
+    @property
+    def lifetime(self):
+        """
+        Seconds a signed URL is handed out for, or None for URLs that do not
+        expire. Half of the time until `refresh` seconds before expiry, so
+        a response cached for up to as long (see cache.payload_timeout)
+        never serves an expired URL.
+        """
+        expiry = getattr(self.storage, 'url_expiry', None) if not self.cdn_domain else None
+        if expiry is None:
+            return None
+        return max(expiry - self.refresh, 0) // 2
+
+    def url(self, name):
+        return self.urls([name])[name]
+
+    def urls(self, names):
+        """
+        `{name: url}` for `names`; the ones not cached are signed in one batch.
+        """
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for name in names:
+                if name in found:
+                    continue
+                cached = self._cache.get(name)
+                if cached is not None and (cached[1] is None or cached[1] > now):
+                    self._cache.move_to_end(name)
+                    found[name] = cached[0]
+                else:
+                    missing.append(name)
+        if not missing:
+            return found
+        signed = self._sign(missing)
+        lifetime = self.lifetime
+        reuse_until = now + lifetime if lifetime is not None else None
+        with self._lock:
+            for name, url in signed.items():
+                self._cache[name] = (url, reuse_until)
+                self._cache.move_to_end(name)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        found.update(signed)
+        return found
+
+    def _sign(self, names):
+        if self.cdn_domain:
+            return {name: f"https://{self.cdn_domain}/{filepath_to_uri(name)}" for name in names}
+        if hasattr(self.storage, 'urls'):
+            return self.storage.urls(names)
+        return {name: self.storage.url(name) for name in names}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
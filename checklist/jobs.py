@@ -0,0 +1,293 @@
+import logging
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .blobs import store_blob
+from .clone import clone_checklist
+from .deletion import delete_checklist
+from .models import Blob, Checklist, CategoryFile, ItemFile, Job
+from .reorder import rebalance_checklist
+from .sync import prune_tombstones
+from .transfer import EXPORT_FORMATS, Export
+
+logger = logging.getLogger(__name__)
+
+# kind -> handler(job) returning the JSON result
+HANDLERS = {}
+
+
+class JobFailed(Exception):
+    """
+    Raised by a handler for a failure that retrying cannot fix.
+    """
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, owner=None, **params):
+    """
+    Queue a job for the next free worker.
+    """
+    return Job.objects.create(
+        kind=kind, owner=owner, params=params, max_attempts=getattr(settings, 'JOB_MAX_ATTEMPTS', 3),
+    )
+
+
+def enqueue_once(kind, owner=None, **params):
+    """
+    Queue a job unless the same one is already queued and not yet started.
+    """
+    queued = Job.objects.filter(kind=kind, owner=owner, params=params, status=Job.QUEUED).first()
+    return queued or enqueue(kind, owner=owner, **params)
+
+
+def report(job, done, total=None):
+    """
+    Record progress, which doubles as the worker's heartbeat. Call it outside
+    of transactions, or readers only see it once the transaction commits.
+    """
+    job.done = done
+    fields = {'done': done, 'heartbeat_at': timezone.now()}
+    if total is not None:
+        job.total = fields['total'] = total
+    Job.objects.filter(pk=job.pk).update(**fields)
+
+
+class Worker:
+    """
+    Runs queued jobs. Any number of workers can share the job table: a job is
+    claimed with a compare-and-set UPDATE on its status, so no broker or row
+    locks are needed, and the same code runs on PostgreSQL and SQLite.
+    """
+
+    def __init__(self, name=None, kinds=None):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds
+        self.stopping = False
+        self.prune_at = 0
+
+    def run(self, burst=False, poll=1.0):
+        """
+        Process jobs until stopped (SIGINT/SIGTERM finish the current job
+        first) or, with `burst`, until the queue is empty. Returns the number
+        of jobs run.
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        processed = 0
+        while not self.stopping:
+            close_old_connections()
+            self.requeue_stale()
+            self.prune()
+            job = self.claim()
+            if job is None:
+                if burst:
+                    break
+                time.sleep(poll)
+                continue
+            self.run_job(job)
+            processed += 1
+        return processed
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def claim(self):
+        now = timezone.now()
+        queue = Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        if self.kinds:
+            queue = queue.filter(kind__in=self.kinds)
+        for pk in queue.order_by('run_at').values_list('pk', flat=True)[:10]:
+            claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, locked_by=self.name, heartbeat_at=now, started_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Job.objects.get(pk=pk)
+        return None
+
+    def requeue_stale(self):
+        """
+        Jobs whose worker stopped reporting for JOB_TIMEOUT seconds count as a
+        failed attempt.
+        """
+        cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_TIMEOUT', 600))
+        stale = Job.objects.filter(heartbeat_at__lt=cutoff)
+        for job in stale.filter(status=Job.RUNNING):
+            self.retry_or_fail(job, "The worker stopped responding.", running=stale)
+
+    def prune(self):
+        """
+        Prune old delta sync tombstones, at most every TOMBSTONE_PRUNE_INTERVAL
+        seconds. Workers pruning at the same time do no harm.
+        """
+        now = time.monotonic()
+        if now < self.prune_at:
+            return
+        self.prune_at = now + getattr(settings, 'TOMBSTONE_PRUNE_INTERVAL', 3600)
+        pruned = prune_tombstones()
+        if pruned:
+            logger.info("Pruned %d tombstones", pruned)
+
+    def run_job(self, job):
+        logger.info("Running %s job %s (attempt %d)", job.kind, job.pk, job.attempts)
+        func = HANDLERS.get(job.kind)
+        try:
+            if func is None:
+                raise JobFailed(f"Unknown job kind {job.kind!r}.")
+            result = func(job)
+        except JobFailed as e:
+            self.finish(job, Job.FAILED, error=str(e))
+        except Exception as e:
+            logger.exception("%s job %s failed", job.kind, job.pk)
+            self.retry_or_fail(job, f"{type(e).__name__}: {e}")
+        else:
+            self.finish(job, Job.SUCCEEDED, result=result, error='',
+                        done=job.total if job.total is not None else job.done)
+
+    def retry_or_fail(self, job, error, running=None):
+        if job.attempts >= job.max_attempts:
+            return self.finish(job, Job.FAILED, error=error, running=running)
+        delay = getattr(settings, 'JOB_RETRY_DELAY', 10) * 2 ** (job.attempts - 1)
+        return self._update(job, running, status=Job.QUEUED, error=error, locked_by='',
+                            run_at=timezone.now() + timedelta(seconds=delay))
+
+    def finish(self, job, status, running=None, **fields):
+        return self._update(job, running, status=status, finished_at=timezone.now(), locked_by='', **fields)
+
+    def _update(self, job, running, **fields):
+        # Only while the job is still ours; a stale job may have been requeued meanwhile
+        running = running if running is not None else Job.objects.filter(locked_by=self.name)
+        return running.filter(pk=job.pk, status=Job.RUNNING).update(**fields)
+
+
+def _checklist(job):
+    checklists = Checklist.objects.filter(pk=job.params.get('checklist_id'))
+    if job.owner_id is not None:
+        checklists = checklists.filter(owner_id=job.owner_id)
+    checklist = checklists.first()
+    if checklist is None:
+        raise JobFailed("Checklist not found.")
+    return checklist
+
+
+@handler('clone')
+def clone_job(job):
+    """
+    Clone the checklist in one transaction, which also saves the new id on
+    the job under a lock on its row. An attempt started while an earlier
+    one still runs (requeued after JOB_TIMEOUT) waits for it and returns
+    its clone instead of making a second one.
+    """
+    original = _checklist(job)
+    report(job, 0, 1)
+    with transaction.atomic():
+        cloned = Job.objects.select_for_update().values_list('result', flat=True).get(pk=job.pk)
+        if cloned and Checklist.objects.filter(pk=cloned.get('checklist_id')).exists():
+            return cloned
+        new_checklist = clone_checklist(
+            original, owner=job.owner or original.owner, title=job.params.get('title'),
+            reset_completion=job.params.get('reset_completion', False),
+        )
+        result = {'checklist_id': new_checklist.pk}
+        Job.objects.filter(pk=job.pk).update(result=result)
+    return result
+
+
+@handler('copy_files')
+def copy_files_job(job):
+    """
+    Copy files the checklist references outside the blob store (uploaded
+    before content-addressed storage) into reference-counted blobs, so the
+    checklist owns its copies. Files already in the store are shared by
+    design and left alone. Safe to retry: copied files are skipped. Rows
+    whose object is missing from storage are reported, not copied.
+    """
+    checklist = _checklist(job)
+    rows = [
+        (model, pk, key)
+        for model, queryset in (
+            (CategoryFile, CategoryFile.objects.filter(category__checklist=checklist)),
+            (ItemFile, ItemFile.objects.filter(item__category__checklist=checklist)),
+        )
+        for pk, key in queryset.exclude(file__in=Blob.objects.values('key')).order_by('id').values_list('id', 'file')
+    ]
+    report(job, 0, len(rows))
+    missing = []
+    for done, (model, pk, key) in enumerate(rows, 1):
+        if not default_storage.exists(key):
+            missing.append(key)
+            continue
+        with default_storage.open(key, 'rb') as f:
+            new_key = store_blob(f)
+        with transaction.atomic():
+            instance = model.objects.select_for_update().filter(pk=pk, file=key).first()
+            if instance is not None:
+                instance.file = new_key
+                instance.save(update_fields=['file'])
+        report(job, done)
+    return {'copied': len(rows) - len(missing), 'missing': missing}
+
+
+@handler('export')
+def export_job(job):
+    """
+    Write an export to storage under exports/; progress is in bytes.
+    """
+    format = job.params.get('format', 'ndjson')
+    if format not in EXPORT_FORMATS:
+        raise JobFailed(f"Unknown export format {format!r}.")
+    checklist = _checklist(job)
+    export = Export.for_checklists(Checklist.objects.filter(pk=checklist.pk))
+    written = 0
+    with tempfile.TemporaryFile() as tmp:
+        for n, chunk in enumerate(export.stream(format), 1):
+            tmp.write(chunk)
+            written += len(chunk)
+            if n % 16 == 0:
+                report(job, written)
+        tmp.seek(0)
+        key = default_storage.save(f"exports/{job.pk}/checklist-{checklist.pk}.{format}", File(tmp))
+    report(job, written, written)
+    return {'file': key, 'url': default_storage.url(key)}
+
+
+@handler('delete')
+def delete_job(job):
+    """
+    Delete the checklist with delete_checklist; storage is cleaned up later
+    by `manage.py reap_files`.
+    """
+    checklist = _checklist(job)
+    report(job, 0, 1)
+    delete_checklist(checklist)
+    return {'checklist_id': job.params['checklist_id']}
+
+
+@handler('rebalance')
+def rebalance_job(job):
+    """
+    Rewrite the order keys of the checklist's categories or items where
+    repeated moves made them long (see checklist.reorder).
+    """
+    checklist = _checklist(job)
+    report(job, 0, 1)
+    return {'rewritten': rebalance_checklist(checklist.pk)}
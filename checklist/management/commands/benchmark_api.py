@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from checklist.benchmark import SIZES, compare, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API endpoints in-process against a throwaway test database, "
+        "with a stubbed JWKS and local file storage. Prints p50/p95/p99 latency, queries "
+        "and bytes per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(SIZES), default='small')
+        parser.add_argument('--checklists', type=int)
+        parser.add_argument('--categories', type=int)
+        parser.add_argument('--items', type=int)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='*', help="Run only these scenarios.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Also write the report to this file.")
+        parser.add_argument('--baseline', help="Compare against a saved report and fail on regressions.")
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help="Allowed p95 slowdown factor against the baseline.")
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = run_benchmark(
+                size=options['size'], iterations=options['iterations'], warmup=options['warmup'],
+                only=options['only'], seed=options['seed'], checklists=options['checklists'],
+                categories=options['categories'], items=options['items'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = compare(report, json.load(f), options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stderr.write(f"{name}: {metric} {before} -> {after}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from checklist.benchmark import SIZES, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, checklists, categories, items and file rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(SIZES), default='small',
+                            help="Preset: small (10), medium (1k) or large (100k) items per user.")
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--checklists', type=int, help="Checklists per user (overrides --size).")
+        parser.add_argument('--categories', type=int, help="Categories per checklist (overrides --size).")
+        parser.add_argument('--items', type=int, help="Items per category (overrides --size).")
+        parser.add_argument('--files', type=int, default=1, help="File rows per category and per item.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        checklists, categories, items = SIZES[options['size']]
+        owners = generate_dataset(
+            users=options['users'],
+            checklists=options['checklists'] or checklists,
+            categories=options['categories'] or categories,
+            items=options['items'] or items,
+            files=options['files'],
+            seed=options['seed'],
+        )
+        for owner in owners:
+            self.stdout.write(f"Created data for {owner.username}")
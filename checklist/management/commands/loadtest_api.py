@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from checklist.benchmark import SIZES, run_load_test, run_stream_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test checklist list/retrieve and the shared checklist with concurrent clients, "
+        "comparing the WSGI path (sync views) with the ASGI path (async views). Runs in-process "
+        "against a throwaway test database with a stubbed JWKS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(SIZES), default='small')
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and server.")
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--only', nargs='*', choices=['list', 'retrieve', 'share'])
+        parser.add_argument('--streams', type=int, help=(
+            "Instead hold this many event streams of a shared checklist open and time how fast "
+            "changes reach all of them."
+        ))
+        parser.add_argument('--changes', type=int, default=10, help="Changes to time with --streams.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            if options['streams']:
+                report = run_stream_test(
+                    streams=options['streams'], changes=options['changes'], seed=options['seed'],
+                )
+            else:
+                report = run_load_test(
+                    size=options['size'], requests=options['requests'], concurrency=options['concurrency'],
+                    only=options['only'], seed=options['seed'],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from checklist.deletion import reap_orphaned_files
+
+
+class Command(BaseCommand):
+    help = "Delete objects of deleted files from storage once nothing references them (the OrphanedFile outbox)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Keys per transaction and storage call (default REAP_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        deleted, kept = reap_orphaned_files(batch_size=options['batch_size'])
+        self.stdout.write(f"{deleted} objects deleted, {kept} still referenced.")
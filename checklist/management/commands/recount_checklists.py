@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from checklist.counters import recount
+
+
+class Command(BaseCommand):
+    help = "Recompute item_count/completed_count on categories and checklists and repair drifted rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('checklist_ids', nargs='*', type=int, help="Limit to these checklists (default: all).")
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted rows without fixing them.")
+
+    def handle(self, *args, **options):
+        categories, checklists = recount(options['checklist_ids'] or None, dry_run=options['dry_run'])
+        verb = "drifted" if options['dry_run'] else "repaired"
+        self.stdout.write(f"{categories} categories and {checklists} checklists {verb}.")
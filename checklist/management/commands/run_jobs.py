@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from checklist.jobs import HANDLERS, Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs (clone, copy_files, export, delete) from the job table. "
+        "Start as many workers as needed; SIGTERM finishes the current job first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty.")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds between polls of an empty queue.")
+        parser.add_argument('--kind', action='append', choices=sorted(HANDLERS), dest='kinds',
+                            help="Only run jobs of this kind (repeatable).")
+        parser.add_argument('--name', help="Worker name recorded on claimed jobs (default host:pid).")
+
+    def handle(self, *args, **options):
+        worker = Worker(name=options['name'], kinds=options['kinds'])
+        processed = worker.run(burst=options['burst'], poll=options['poll'])
+        self.stdout.write(f"{worker.name}: {processed} jobs run.")
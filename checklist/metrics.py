@@ -0,0 +1,301 @@
+import heapq
+import hmac
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger('checklist.performance')
+
+PHASES = ('db', 'auth', 'serialize', 'storage')
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('checklist_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Time spent per phase during one request, plus the slowest queries.
+    """
+
+    def __init__(self, keep_queries=5):
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self.keep_queries = keep_queries
+        self.slowest = []
+        self._active = set()
+
+    def add_query(self, duration, sql):
+        self.timings['db'] += duration
+        self.counts['db'] += 1
+        if self.keep_queries <= 0:
+            return
+        entry = (duration, self.counts['db'], sql)
+        if len(self.slowest) < self.keep_queries:
+            heapq.heappush(self.slowest, entry)
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def slowest_queries(self):
+        return [(duration, sql) for duration, _, sql in sorted(self.slowest, reverse=True)]
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def timed(phase):
+    """
+    Add the time spent in the block to `phase` of the current request.
+    Nested blocks of the same phase are only counted once.
+    """
+    metrics = _current.get()
+    if metrics is None or phase in metrics._active:
+        yield
+        return
+    metrics._active.add(phase)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[phase] += time.perf_counter() - start
+        metrics.counts[phase] += 1
+        metrics._active.discard(phase)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    DB execute wrapper, installed on every connection (see signals), that
+    feeds the current request's metrics. A no-op outside a request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start, sql)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, labels, value):
+        counts = self._values.get(labels)
+        if counts is None:
+            # Per-bucket counts, then sum and total
+            counts = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        counts[-2] += value
+        counts[-1] += 1
+
+    def samples(self):
+        for labels, counts in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(self.labelnames + ('le',), labels + (_number(bound),)), cumulative
+            yield f"{self.name}_bucket", _labels(self.labelnames + ('le',), labels + ('+Inf',)), counts[-1]
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), counts[-2]
+            yield f"{self.name}_count", _labels(self.labelnames, labels), counts[-1]
+
+
+class Registry:
+    """
+    In-process request metrics, rendered in the Prometheus text format.
+    Each worker process keeps its own aggregates.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        labels = ('view', 'action')
+        self.requests = Counter(
+            'checklist_requests_total', "Requests handled.", labels + ('method', 'status'))
+        self.duration = Histogram(
+            'checklist_request_duration_seconds', "Total request time.", labels)
+        self.phases = Histogram(
+            'checklist_request_phase_seconds', "Time per request spent in db, auth, serialize and storage.",
+            labels + ('phase',))
+        self.queries = Histogram(
+            'checklist_request_queries', "SQL queries per request.", labels, QUERY_BUCKETS)
+        self.slow = Counter(
+            'checklist_slow_requests_total', "Requests slower than PERF_SLOW_REQUEST_MS.", labels)
+        self.metrics = (self.requests, self.duration, self.phases, self.queries, self.slow)
+
+    def record(self, view, action, method, status, duration, metrics, slow=False):
+        labels = (view, action)
+        with self._lock:
+            self.requests.inc(labels + (method, str(status)))
+            self.duration.observe(labels, duration)
+            self.queries.observe(labels, metrics.counts['db'])
+            for phase in PHASES:
+                if metrics.counts[phase]:
+                    self.phases.observe(labels + (phase,), metrics.timings[phase])
+            if slow:
+                self.slow.inc(labels)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in self.metrics:
+                kind = 'histogram' if isinstance(metric, Histogram) else 'counter'
+                lines.append(f"# HELP {metric.name} {metric.documentation}")
+                lines.append(f"# TYPE {metric.name} {kind}")
+                lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            for metric in self.metrics:
+                metric._values.clear()
+
+
+registry = Registry()
+
+
+def _labels(names, values):
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class PerformanceMiddleware:
+    """
+    Records SQL count and time, auth, serialization and storage time for each
+    request, labelled by view and action. Slow requests log their slowest
+    queries, and a Server-Timing header is added when PERF_SERVER_TIMING is on.
+    Runs natively in both the WSGI and ASGI handlers.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'PERF_METRICS_ENABLED', True):
+            return self.get_response(request)
+        metrics, reset, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(reset)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'PERF_METRICS_ENABLED', True):
+            return await self.get_response(request)
+        metrics, reset, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(reset)
+        return self.finish(request, response, metrics, start)
+
+    def start(self):
+        metrics = RequestMetrics(getattr(settings, 'PERF_SLOW_QUERY_COUNT', 5))
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, start):
+        duration = time.perf_counter() - start
+        view, action = view_labels(request)
+        slow = duration * 1000 >= getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        registry.record(view, action, request.method, response.status_code, duration, metrics, slow)
+        if slow:
+            self.log_slow_request(request, view, action, duration, metrics)
+        if getattr(settings, 'PERF_SERVER_TIMING', False):
+            response['Server-Timing'] = server_timing(metrics, duration)
+        return response
+
+    def log_slow_request(self, request, view, action, duration, metrics):
+        logger.warning(
+            "Slow request %s %s (%s.%s): %.1fms, %d queries in %.1fms, auth %.1fms, "
+            "serialize %.1fms, storage %.1fms",
+            request.method, request.path, view, action, duration * 1000,
+            metrics.counts['db'], metrics.timings['db'] * 1000, metrics.timings['auth'] * 1000,
+            metrics.timings['serialize'] * 1000, metrics.timings['storage'] * 1000,
+        )
+        for query_duration, sql in metrics.slowest_queries():
+            logger.warning("  %.1fms %s", query_duration * 1000, sql)
+
+
+def view_labels(request):
+    """
+    `(view, action)` for a resolved request: the view class and viewset action,
+    or the function name and HTTP method.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', ''
+    func = match.func
+    cls = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    actions = getattr(func, 'actions', None) or {}
+    method = request.method.lower()
+    return cls.__name__ if cls else func.__name__, actions.get(method, method)
+
+
+def server_timing(metrics, duration):
+    entries = [f'db;dur={metrics.timings["db"] * 1000:.1f};desc="{metrics.counts["db"]} queries"']
+    entries.extend(
+        f"{phase};dur={metrics.timings[phase] * 1000:.1f}" for phase in PHASES[1:] if metrics.counts[phase]
+    )
+    entries.append(f"total;dur={duration * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Requires `Authorization: Bearer <PERF_METRICS_TOKEN>`
+    when that setting is set; without a token it is only open with DEBUG or
+    PERF_METRICS_PUBLIC.
+    """
+    token = getattr(settings, 'PERF_METRICS_TOKEN', '')
+    if token:
+        # Constant-time, so the response time does not reveal how much of the token matched
+        given = request.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(given, f"Bearer {token}".encode()):
+            return HttpResponse(status=401)
+    elif not (settings.DEBUG or getattr(settings, 'PERF_METRICS_PUBLIC', False)):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
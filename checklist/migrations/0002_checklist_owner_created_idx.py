@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 17:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklist', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checklist',
+            index=models.Index(fields=['owner', '-created_at', '-id'], name='checklist_owner_created_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-18 17:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Checklist = apps.get_model('checklist', 'Checklist')
+    Category = apps.get_model('checklist', 'Category')
+    Item = apps.get_model('checklist', 'Item')
+
+    def count(queryset, outer_field):
+        return Coalesce(
+            Subquery(
+                queryset.filter(**{outer_field: OuterRef('pk')}).order_by()
+                .values(outer_field).annotate(n=Count('pk')).values('n')
+            ),
+            Value(0),
+        )
+
+    for model, outer_field in ((Category, 'category'), (Checklist, 'category__checklist')):
+        model.objects.update(
+            item_count=count(Item.objects.all(), outer_field),
+            completed_count=count(Item.objects.filter(is_completed=True), outer_field),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklist', '0002_checklist_owner_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='completed_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='item_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='checklist',
+            name='completed_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='checklist',
+            name='item_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
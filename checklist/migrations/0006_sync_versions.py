@@ -0,0 +1,73 @@
+# Generated by Django 5.2 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklist', '0005_sharelink_expiry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('category', 'Category'), ('item', 'Item'), ('category_file', 'Category file'), ('item_file', 'Item file')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='changed_at_version',
+            field=models.BigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoryfile',
+            name='changed_at_version',
+            field=models.BigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='checklist',
+            name='version',
+            field=models.BigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='changed_at_version',
+            field=models.BigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='itemfile',
+            name='changed_at_version',
+            field=models.BigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['checklist', 'changed_at_version'], name='category_changed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='categoryfile',
+            index=models.Index(fields=['category', 'changed_at_version'], name='categoryfile_changed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['category', 'changed_at_version'], name='item_changed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfile',
+            index=models.Index(fields=['item', 'changed_at_version'], name='itemfile_changed_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='checklist',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to='checklist.checklist'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['checklist', 'version'], name='tombstone_version_idx'),
+        ),
+    ]
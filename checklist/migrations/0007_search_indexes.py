@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# (table, column, index prefix). The tsvector expression must match checklist.search.Document.
+SEARCHED_COLUMNS = [
+    ('checklist_checklist', 'title', 'checklist_title'),
+    ('checklist_category', 'name', 'category_name'),
+    ('checklist_item', 'name', 'item_name'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    # Only PostgreSQL has tsvector and pg_trgm; other databases use PortableSearchBackend
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, column, prefix in SEARCHED_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {prefix}_tsv_idx ON {table} "
+            f"USING gin (to_tsvector('simple'::regconfig, {column}))"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {prefix}_trgm_idx ON {table} USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, _, prefix in SEARCHED_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {prefix}_tsv_idx")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {prefix}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklist', '0006_sync_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
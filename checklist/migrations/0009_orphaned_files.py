@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklist', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrphanedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('refs', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='categoryfile',
+            index=models.Index(fields=['file'], name='categoryfile_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfile',
+            index=models.Index(fields=['file'], name='itemfile_file_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2 on 2026-10-18 19:02
+
+import checklist.ordering
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Frozen copy of the key generation the backfill needs, so later changes to
+# checklist.ordering cannot change what this migration writes
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def next_key(key):
+    """
+    The key after `key` (None: the first key), as key_between(key, None)
+    returns it for the integer keys written here: 'a0', 'a1', ..., 'az',
+    'b00', ...
+    """
+    if key is None:
+        return 'a' + DIGITS[0]
+    head, digits = key[0], list(key[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[0]
+    # Every digit overflowed: the next head has one digit more
+    return chr(ord(head) + 1) + ''.join(digits) + DIGITS[0]
+
+
+def backfill_positions(apps, schema_editor):
+    # Keep the current (id) order: keys ascend by id within each parent
+    for model_name, parent in (('Category', 'checklist_id'), ('Item', 'category_id')):
+        model = apps.get_model('checklist', model_name)
+        rows = model.objects.order_by(parent, 'id').values_list('id', parent).iterator(chunk_size=BATCH_SIZE)
+        batch, last_parent, key = [], None, None
+        for pk, parent_id in rows:
+            key = next_key(key if parent_id == last_parent else None)
+            last_parent = parent_id
+            batch.append(model(pk=pk, position=key))
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ['position'])
+                batch = []
+        model.objects.bulk_update(batch, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklist', '0009_orphaned_files'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='item',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='position',
+            field=checklist.ordering.OrderKeyField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='position',
+            field=checklist.ordering.OrderKeyField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['checklist', 'position'], name='category_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['category', 'position'], name='item_position_idx'),
+        ),
+    ]
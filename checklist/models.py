@@ -1,8 +1,59 @@
 from django.db import models
+from django.db.models import Max
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 
-class Checklist(models.Model):
+from .ordering import OrderKeyField, key_between
+
+COUNTER_FIELDS = ('item_count', 'completed_count')
+# Only ever written with F() updates; a plain save() leaves them alone
+MANAGED_FIELDS = COUNTER_FIELDS + ('version', 'pruned_version')
+
+
+class ProgressCounters(models.Model):
+    """
+    Denormalized item and completed-item counts.
+    Maintained by checklist.counters with F() updates only.
+    """
+    item_count = models.IntegerField(default=0, editable=False)
+    completed_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # A plain save must not write back counters loaded before a concurrent F() update
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MANAGED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class Positioned(models.Model):
+    """
+    Ordered among the rows sharing its `position_parent`, by a fractional
+    order key (see checklist.ordering and checklist.reorder), so a move
+    rewrites only the moved row. New rows go last.
+    """
+    position = OrderKeyField()
+    position_parent = None
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.position:
+            siblings = type(self)._default_manager.filter(
+                **{self.position_parent: getattr(self, f"{self.position_parent}_id")}
+            )
+            self.position = key_between(siblings.aggregate(last=Max('position'))['last'] or None, None)
+        super().save(*args, **kwargs)
+
+
+class Checklist(ProgressCounters):
     """
     Checklist model representing a collection of categories.
     Contains a title, description, and creation timestamp.
@@ -11,21 +62,41 @@ class Checklist(models.Model):
     description = models.TextField(blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='checklists')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Sync version, bumped by every change to the checklist or anything in it (see checklist.sync)
+    version = models.BigIntegerField(default=1, editable=False)
+    # Tombstones up to this version were pruned; syncs from before it start over
+    pruned_version = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination walks (owner, created_at, id) newest first
+            models.Index(fields=['owner', '-created_at', '-id'], name='checklist_owner_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
-class Category(models.Model):
+class Category(Positioned, ProgressCounters):
     """
     Category model representing a group of items within a checklist.
     Each category is linked to a checklist and has a name.
     """
     checklist = models.ForeignKey(Checklist, related_name="categories", on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
+    changed_at_version = models.BigIntegerField(default=1, editable=False)
+    position_parent = 'checklist'
+
+    class Meta:
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['checklist', 'changed_at_version'], name='category_changed_idx'),
+            models.Index(fields=['checklist', 'position'], name='category_position_idx'),
+        ]
 
     def __str__(self):
         return f"{self.checklist.title} - {self.name}"
 
-class Item(models.Model):
+class Item(Positioned):
     """
     Item model representing a task or checklist item within a category.
     Each item is linked to a category and has a name and completion status.
@@ -33,6 +104,22 @@ class Item(models.Model):
     category = models.ForeignKey(Category, related_name="items", on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     is_completed = models.BooleanField(default=False)
+    changed_at_version = models.BigIntegerField(default=1, editable=False)
+    position_parent = 'category'
+
+    class Meta:
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['category', 'changed_at_version'], name='item_changed_idx'),
+            models.Index(fields=['category', 'position'], name='item_position_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored state so saves can tell moves and toggles apart
+        instance._loaded_state = (instance.__dict__.get('category_id'), instance.__dict__.get('is_completed'))
+        return instance
 
     def __str__(self):
         return f"{self.category.name} - {self.name}"
@@ -40,19 +127,137 @@ class Item(models.Model):
 class CategoryFile(models.Model):
     category = models.ForeignKey(Category, related_name="files", on_delete=models.CASCADE)
     file = models.FileField(upload_to="category_files/")
+    changed_at_version = models.BigIntegerField(default=1, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'changed_at_version'], name='categoryfile_changed_idx'),
+            models.Index(fields=['file'], name='categoryfile_file_idx'),
+        ]
 
 class ItemFile(models.Model):
     item = models.ForeignKey(Item, related_name="files", on_delete=models.CASCADE)
     file = models.FileField(upload_to="item_files/")
+    changed_at_version = models.BigIntegerField(default=1, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'changed_at_version'], name='itemfile_changed_idx'),
+            models.Index(fields=['file'], name='itemfile_file_idx'),
+        ]
 
 
 class ShareLink(models.Model):
     """
     ShareLink model representing a link to share a checklist.
-    Contains the checklist, a unique token, and creation date
+    Contains the checklist, a unique token, and creation date,
+    plus an optional expiry and the time it was revoked
     """
     token     = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     checklist = models.ForeignKey(Checklist, related_name='share_links', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+    def __str__(self):
+        return f"{self.checklist.title} → {self.token}"
+
+
+class Blob(models.Model):
+    """
+    Stored object shared by CategoryFile/ItemFile rows.
+    Uploads are keyed by content hash so identical files share one object;
+    the object is removed from storage when the last reference goes.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.ref_count} refs)"
+
+
+class OrphanedFile(models.Model):
+    """
+    Outbox of storage keys whose file rows were deleted. `manage.py
+    reap_files` removes the objects nothing references any more, in batches
+    (see checklist.deletion). `refs` are Blob references released by the
+    deletion and not yet subtracted from the blob.
+    """
+    key = models.CharField(max_length=255)
+    refs = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
+class Tombstone(models.Model):
+    """
+    Record of a category, item or file deleted from a checklist, kept so
+    delta sync can tell clients what to remove. Pruned after
+    TOMBSTONE_RETENTION_DAYS (see checklist.sync.prune_tombstones).
+    """
+    KINDS = [
+        ('category', 'Category'),
+        ('item', 'Item'),
+        ('category_file', 'Category file'),
+        ('item_file', 'Item file'),
+    ]
+    checklist = models.ForeignKey(Checklist, related_name='tombstones', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    version = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['checklist', 'version'], name='tombstone_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted at v{self.version}"
+
+
+class Job(models.Model):
+    """
+    Background job run by `manage.py run_jobs` workers (see checklist.jobs).
+    Progress is `done` out of `total`; failed attempts are retried with
+    backoff until `max_attempts`.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, related_name='jobs', on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUSES, default=QUEUED)
+    done = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_queue_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.checklist.title} → {self.token}"
\ No newline at end of file
+        return f"{self.kind} {self.id} ({self.status})"
@@ -0,0 +1,167 @@
+from django.conf import settings
+from django.db import models
+
+# Order keys are strings over these digits, compared byte by byte. A key is
+# an integer part, whose first character gives its length ('a'-'z' for 2-27
+# characters, 'A'-'Z' downwards for negative integers), and an optional
+# fraction without trailing zeros. Appending or prepending steps the
+# integer, so keys grow only logarithmically; inserting between two keys
+# extends the fraction by about one character per six inserts into the
+# same gap.
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+_SMALLEST_INTEGER = 'A' + DIGITS[0] * 26
+
+
+def max_key_length():
+    """
+    Keys longer than this get their siblings rebalanced in the background.
+    """
+    return getattr(settings, 'ORDER_KEY_MAX_LENGTH', 32)
+
+
+class OrderKeyField(models.CharField):
+    """
+    CharField for order keys. Uses a binary collation where the default one
+    is linguistic, so the database sorts keys as key_between() does.
+    """
+    collations = {'postgresql': 'C', 'mysql': 'utf8mb4_bin'}
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 255)
+        kwargs.setdefault('default', '')
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def db_parameters(self, connection):
+        params = super().db_parameters(connection)
+        params['collation'] = self.db_collation or self.collations.get(connection.vendor)
+        return params
+
+
+def key_between(a, b):
+    """
+    A key that sorts after `a` and before `b`; None stands for the start
+    (for `a`) or the end (for `b`) of the list.
+    """
+    if a is not None:
+        _validate(a)
+    if b is not None:
+        _validate(b)
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"{a!r} does not sort before {b!r}.")
+    if a is None:
+        if b is None:
+            return 'a' + DIGITS[0]
+        integer = _integer_part(b)
+        if integer == _SMALLEST_INTEGER:
+            return integer + _midpoint('', b[len(integer):])
+        if integer < b:
+            return integer
+        return _decrement(integer)
+    integer = _integer_part(a)
+    fraction = a[len(integer):]
+    if b is None:
+        incremented = _increment(integer)
+        return incremented if incremented is not None else integer + _midpoint(fraction, None)
+    if integer == _integer_part(b):
+        return integer + _midpoint(fraction, b[len(integer):])
+    incremented = _increment(integer)
+    if incremented is not None and incremented < b:
+        return incremented
+    return integer + _midpoint(fraction, None)
+
+
+def keys_between(a, b, n):
+    """
+    `n` ascending keys between `a` and `b`, as short as possible.
+    """
+    if n <= 0:
+        return []
+    if b is None or a is None:
+        keys, key = [], a if b is None else b
+        for _ in range(n):
+            key = key_between(key, None) if b is None else key_between(None, key)
+            keys.append(key)
+        return keys if b is None else keys[::-1]
+    middle = key_between(a, b)
+    half = n // 2
+    return keys_between(a, middle, half) + [middle] + keys_between(middle, b, n - half - 1)
+
+
+def _midpoint(a, b):
+    # A fraction strictly between fractions a and b (None: 1), no trailing zero
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f"Invalid order key head {head!r}.")
+
+
+def _integer_part(key):
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Invalid order key {key!r}.")
+    return key[:length]
+
+
+def _validate(key):
+    if not key or key == _SMALLEST_INTEGER:
+        raise ValueError(f"Invalid order key {key!r}.")
+    if key[len(_integer_part(key)):].endswith(DIGITS[0]):
+        raise ValueError(f"Invalid order key {key!r}.")
+
+
+def _increment(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[0]
+    if head == 'Z':
+        return 'a' + DIGITS[0]
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        raise ValueError("No order key sorts before the smallest one.")
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
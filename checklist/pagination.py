@@ -0,0 +1,96 @@
+from collections import OrderedDict
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over (created_at, id), newest first.
+    Each page is a range scan that starts right after the last row of the
+    previous one, so the cost stays proportional to the page size at any depth.
+    Cursors are signed; a malformed or altered one is a 400.
+
+    Unlike the stock paginators, `paginate_queryset` returns a queryset limited
+    to the page, so callers can keep building on it (tree assembler, annotations).
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    cursor_salt = 'checklist.pagination.cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_size = self.start_page(queryset, request)
+        keys = list(queryset.values_list('created_at', 'id')[:page_size + 1])
+        return self.end_page(queryset, keys, page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset, page_size = self.start_page(queryset, request)
+        keys = [key async for key in queryset.values_list('created_at', 'id')[:page_size + 1]]
+        return self.end_page(queryset, keys, page_size)
+
+    def start_page(self, queryset, request):
+        self.request = request
+        queryset = queryset.order_by('-created_at', '-id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            created_at, pk = cursor
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        return queryset, self.get_page_size(request)
+
+    def end_page(self, queryset, keys, page_size):
+        self.has_next = len(keys) > page_size
+        keys = keys[:page_size]
+        self.next_key = keys[-1] if self.has_next else None
+        return queryset.filter(id__in=[pk for _, pk in keys])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        created_at, pk = self.next_key
+        token = signing.dumps([created_at.isoformat(), pk], salt=self.cursor_salt)
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            created_at, pk = signing.loads(encoded, salt=self.cursor_salt)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (signing.BadSignature, TypeError, ValueError):
+            created_at = None
+        if created_at is None:
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+        return created_at, pk
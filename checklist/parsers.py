@@ -0,0 +1,23 @@
+from rest_framework.parsers import BaseParser
+
+from .transfer import read_csv, read_ndjson
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline-delimited JSON; `request.data` is a lazy iterator over the records.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return read_ndjson(stream)
+
+
+class CSVParser(BaseParser):
+    """
+    CSV with a header row; `request.data` is a lazy iterator over the records.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return read_csv(stream)
@@ -0,0 +1,104 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# DRF's fallbacks for everything orjson and msgpack don't encode natively
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    return _encoder.default(obj)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that counts encoding time as the request's serialize time.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONRenderer(TimedJSONRenderer):
+    """
+    Encodes with orjson when it is installed, byte for byte like
+    JSONRenderer: compact, UTF-8, DRF's representation of dates, decimals
+    and lazy strings, and U+2028/U+2029 escaped. Indented output (the
+    browsable API, `; indent=` in Accept) and settings orjson cannot
+    honour use JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or not self.compact or self.ensure_ascii or
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        with timed('serialize'):
+            return json_dumps(data)
+
+
+def json_dumps(data):
+    """
+    Compact UTF-8 JSON bytes, as FastJSONRenderer renders them.
+    """
+    if orjson is None:
+        return JSONRenderer().render(data)
+    try:
+        ret = orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    except orjson.JSONEncodeError:
+        # e.g. integers beyond 64 bits, which the json module handles
+        return JSONRenderer().render(data)
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack (`?format=msgpack` or Accept: application/msgpack), with
+    the same values as the JSON output. Needs the optional msgpack package;
+    settings only enable it when that is installed.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timed('serialize'):
+            return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class ExportRenderer(FastJSONRenderer):
+    """
+    Names an export format for content negotiation (`?format=` or Accept).
+    Exports stream their own body; anything else rendered here, e.g. an
+    error, is JSON.
+    """
+    media_type = 'application/json'
+    format = 'json'
+
+
+class NDJSONExportRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVExportRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -0,0 +1,97 @@
+from django.db.models import Count, Q
+from django.db.models.functions import Length
+
+from .models import Category, Item
+from .ordering import key_between, keys_between, max_key_length
+from .signals import invalidate_checklist
+from .sync import change_set
+
+BATCH_SIZE = 1000
+
+
+def move(instance, checklist_id, before=None, after=None, parent_id=None):
+    """
+    Move a category or item right before the sibling with id `before`,
+    right after the one with id `after`, or else to the end; items can go
+    to another category, `parent_id`. Writes only the moved row, unless its
+    neighbours share a key (concurrent inserts), in which case their
+    siblings are rebalanced first. Returns True when the new key is long
+    enough that the siblings should be rebalanced in the background.
+    """
+    parent = instance.position_parent
+    parent_id = parent_id if parent_id is not None else getattr(instance, f"{parent}_id")
+    with change_set(checklist_id) as version:
+        # The version bump locks the checklist row, so moves within it take turns
+        siblings = type(instance).objects.filter(**{parent: parent_id}).exclude(pk=instance.pk)
+        try:
+            position = _position(siblings, before, after)
+        except ValueError:
+            rebalance(type(instance), parent_id, version)
+            position = _position(siblings, before, after)
+        instance.position = position
+        setattr(instance, f"{parent}_id", parent_id)
+        instance.save(update_fields=[parent, 'position'])
+    return len(position) > max_key_length()
+
+
+def _position(siblings, before, after):
+    if before is not None:
+        anchor = siblings.get(pk=before)
+        previous = siblings.filter(
+            Q(position__lt=anchor.position) | Q(position=anchor.position, pk__lt=anchor.pk)
+        ).order_by('-position', '-id').values_list('position', flat=True).first()
+        return key_between(previous, anchor.position)
+    if after is not None:
+        anchor = siblings.get(pk=after)
+        following = siblings.filter(
+            Q(position__gt=anchor.position) | Q(position=anchor.position, pk__gt=anchor.pk)
+        ).order_by('position', 'id').values_list('position', flat=True).first()
+        return key_between(anchor.position, following)
+    last = siblings.order_by('-position', '-id').values_list('position', flat=True).first()
+    return key_between(last, None)
+
+
+def rebalance(model, parent_id, version):
+    """
+    Give the categories of a checklist, or the items of a category, short
+    evenly spaced keys in their current order, stamped with `version`.
+    """
+    rows = list(model.objects.filter(**{model.position_parent: parent_id}).order_by('position', 'id').only('position'))
+    changed = []
+    for row, key in zip(rows, keys_between(None, None, len(rows))):
+        if row.position != key:
+            row.position = key
+            row.changed_at_version = version
+            changed.append(row)
+    model.objects.bulk_update(changed, ['position', 'changed_at_version'], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def rebalance_checklist(checklist_id):
+    """
+    Rebalance the sibling lists of a checklist that have keys longer than
+    max_key_length() or keys shared by several rows. Returns the number of
+    rows rewritten.
+    """
+    longest = max_key_length()
+    categories = Category.objects.filter(checklist_id=checklist_id)
+    items = Item.objects.filter(category__checklist_id=checklist_id)
+    category_lists = _needing_rebalance(categories, 'checklist_id', longest)
+    item_lists = _needing_rebalance(items, 'category_id', longest)
+    if not category_lists and not item_lists:
+        return 0
+    rewritten = 0
+    with change_set(checklist_id) as version:
+        if category_lists:
+            rewritten += rebalance(Category, checklist_id, version)
+        for category_id in item_lists:
+            rewritten += rebalance(Item, category_id, version)
+        # bulk_update skips model signals
+        invalidate_checklist(checklist_id)
+    return rewritten
+
+
+def _needing_rebalance(queryset, parent, longest):
+    long_keys = queryset.annotate(key_length=Length('position')).filter(key_length__gt=longest)
+    shared_keys = queryset.order_by().values(parent, 'position').annotate(rows=Count('id')).filter(rows__gt=1)
+    return set(long_keys.values_list(parent, flat=True)) | set(shared_keys.values_list(parent, flat=True))
@@ -0,0 +1,148 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramWordSimilarity
+from django.db import connections, router
+from django.db.models import Func, Q
+from django.utils.module_loading import import_string
+
+from .models import Checklist, Category, Item
+
+SCOPES = ('checklist', 'category', 'item')
+MAX_TERMS = 8
+
+
+def search_backend():
+    """
+    Instantiate the backend named by SEARCH_BACKEND, or pick one for the
+    database: PostgresSearchBackend on PostgreSQL, PortableSearchBackend elsewhere.
+    """
+    path = getattr(settings, 'SEARCH_BACKEND', '')
+    if path:
+        return import_string(path)()
+    if connections[router.db_for_read(Item)].vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return PortableSearchBackend()
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _scopes(owner):
+    # scope -> (queryset, searched field, values() fields)
+    return {
+        'checklist': (
+            Checklist.objects.filter(owner=owner), 'title', ('id', 'title'),
+        ),
+        'category': (
+            Category.objects.filter(checklist__owner=owner), 'name',
+            ('id', 'name', 'checklist_id', 'checklist__title'),
+        ),
+        'item': (
+            Item.objects.filter(category__checklist__owner=owner), 'name',
+            ('id', 'name', 'is_completed', 'category_id', 'category__name',
+             'category__checklist_id', 'category__checklist__title'),
+        ),
+    }
+
+
+def _hit(scope, row, rank):
+    if scope == 'checklist':
+        return {'type': scope, 'id': row['id'], 'name': row['title'], 'rank': rank,
+                'checklist': None, 'category': None}
+    if scope == 'category':
+        return {'type': scope, 'id': row['id'], 'name': row['name'], 'rank': rank,
+                'checklist': {'id': row['checklist_id'], 'title': row['checklist__title']}, 'category': None}
+    return {'type': scope, 'id': row['id'], 'name': row['name'], 'is_completed': row['is_completed'], 'rank': rank,
+            'checklist': {'id': row['category__checklist_id'], 'title': row['category__checklist__title']},
+            'category': {'id': row['category_id'], 'name': row['category__name']}}
+
+
+class SearchBackend:
+    """
+    Searches checklist titles, category names and item names of one owner
+    with one query per scope, and merges the hits by rank.
+    """
+
+    def search(self, owner, query, scopes=SCOPES, limit=20):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        querysets = _scopes(owner)
+        hits = []
+        for scope in scopes:
+            queryset, field, fields = querysets[scope]
+            hits.extend(
+                _hit(scope, row, round(float(rank), 4))
+                for row, rank in self.search_scope(queryset, field, fields, query, terms, limit)
+            )
+        hits.sort(key=lambda hit: (-hit['rank'], SCOPES.index(hit['type']), hit['id']))
+        return hits[:limit]
+
+    def search_scope(self, queryset, field, fields, query, terms, limit):
+        """
+        Up to `limit` best `(row, rank)` pairs from `queryset`.
+        """
+        raise NotImplementedError
+
+
+class Document(Func):
+    """
+    The tsvector of a name column. Must stay identical to the expression of
+    the GIN indexes created in migration 0007 for them to be used.
+    """
+    function = 'to_tsvector'
+    template = "%(function)s('simple'::regconfig, %(expressions)s)"
+    output_field = SearchVectorField()
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Prefix matches of every term through the tsvector GIN indexes, or fuzzy
+    matches (typos, partial words) through the pg_trgm indexes, ranked by
+    ts_rank plus word similarity. The indexes are expression indexes, so
+    PostgreSQL keeps them up to date on every write.
+    """
+
+    def search_scope(self, queryset, field, fields, query, terms, limit):
+        tsquery = SearchQuery(' & '.join(f"{term}:*" for term in terms), search_type='raw', config='simple')
+        document = Document(field)
+        rows = queryset.annotate(document=document).filter(
+            Q(document=tsquery) | Q(**{f'{field}__trigram_word_similar': query})
+        ).annotate(
+            rank=SearchRank(document, tsquery) + TrigramWordSimilarity(query, field)
+        ).order_by('-rank', 'id').values(*fields, 'rank')[:limit]
+        return [(row, row.pop('rank')) for row in rows]
+
+
+class PortableSearchBackend(SearchBackend):
+    """
+    Every term as a case-insensitive substring, ranked in Python by whole-word
+    and prefix matches. Works on any database but scans, so it is meant for
+    SQLite and tests.
+    """
+    candidates = 500
+
+    def search_scope(self, queryset, field, fields, query, terms, limit):
+        for term in terms:
+            queryset = queryset.filter(**{f'{field}__icontains': term})
+        rows = queryset.order_by('-id').values(*fields)[:max(limit, self.candidates)]
+        ranked = sorted(
+            ((row, _portable_rank(row[field], terms)) for row in rows),
+            key=lambda pair: (-pair[1], pair[0]['id']),
+        )
+        return ranked[:limit]
+
+
+def _portable_rank(text, terms):
+    words = search_terms(text)
+    score = 0.0
+    for term in terms:
+        if term in words:
+            score += 1.0
+        elif any(word.startswith(term) for word in words):
+            score += 0.75
+        else:
+            score += 0.25
+    return score / len(terms)
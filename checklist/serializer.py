@@ -1,36 +1,126 @@
 
+from django.db import models
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
-from .models import Checklist, Category, Item, CategoryFile, ItemFile
+from rest_framework.settings import api_settings
+
+from .fileurls import file_urls
+from .fieldsets import SparseFieldsMixin
+from .metrics import timed
+from .models import Checklist, Category, Item, CategoryFile, ItemFile, Job
+
+
+class TimedSerializerMixin:
+    """
+    Counts representation time as the request's serialize time.
+    """
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+class FileURLField(serializers.FileField):
+    """
+    FileField whose URLs come from the signed-URL cache (checklist.fileurls).
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return self.represent_many([value.name])[value.name]
+
+    def represent_many(self, names):
+        """
+        `{name: representation}` for stored file names, signed as one batch.
+        """
+        names = [name for name in names if name]
+        if not getattr(self, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return {name: name for name in names}
+        urls = file_urls().urls(names)
+        request = self.context.get('request', None)
+        if request is not None:
+            return {name: request.build_absolute_uri(url) for name, url in urls.items()}
+        return urls
+
+
+class FileListSerializer(serializers.ListSerializer):
+    """
+    Signs the URLs of all files in the list as one batch before rendering them.
+    """
+
+    def to_representation(self, data):
+        files = list(data.all() if isinstance(data, BaseManager) else data)
+        self.child.fields['file'].represent_many([f.file.name for f in files])
+        return super().to_representation(files)
+
+
+class CategoryFileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    serializer_field_mapping = {**serializers.ModelSerializer.serializer_field_mapping, models.FileField: FileURLField}
 
-class CategoryFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = CategoryFile
         fields = ['id', 'file']
+        list_serializer_class = FileListSerializer
+
+class ItemFileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    serializer_field_mapping = CategoryFileSerializer.serializer_field_mapping
 
-class ItemFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = ItemFile
         fields = ['id', 'file']
+        list_serializer_class = FileListSerializer
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     files = ItemFileSerializer(many=True, read_only=True)
 
     class Meta:
         model = Item
-        fields = ['id', 'name', 'is_completed', 'files']
+        fields = ['id', 'name', 'is_completed', 'files', 'position']
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     items = ItemSerializer(many=True, read_only=True)
     files = CategoryFileSerializer(many=True, read_only=True)
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'items', 'files']
+        fields = ['id', 'name', 'items', 'files', 'item_count', 'completed_count', 'position']
+        read_only_fields = ['item_count', 'completed_count']
 
-class ChecklistSerializer(serializers.ModelSerializer):
+class ChecklistSerializer(SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
 
     class Meta:
         model = Checklist
-        fields = ['id', 'title', 'description', 'created_at', 'categories', 'owner']
-        read_only_fields = ['owner']
\ No newline at end of file
+        fields = ['id', 'title', 'description', 'created_at', 'categories', 'owner',
+                  'item_count', 'completed_count']
+        read_only_fields = ['owner', 'item_count', 'completed_count']
+
+class ChecklistSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Checklist fields and progress counters, without the nested tree.
+    """
+    category_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Checklist
+        fields = ['id', 'title', 'description', 'created_at', 'owner',
+                  'category_count', 'item_count', 'completed_count']
+        read_only_fields = fields
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Job status; `progress` is done/total as a percentage once the total is known.
+    """
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'params', 'status', 'done', 'total', 'progress', 'result', 'error',
+                  'attempts', 'max_attempts', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+    def get_progress(self, job):
+        if not job.total:
+            return 100.0 if job.status == Job.SUCCEEDED else None
+        return round(100.0 * min(job.done, job.total) / job.total, 1)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'checklist',
     'rest_framework',
     'corsheaders',
@@ -49,7 +51,7 @@ load_dotenv()
 
 STORAGES = {
     "default": {
-        "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+        "BACKEND": "checklist.storage.S3Storage",
     },
     # if you also serve staticfiles from S3, you can add:
     "staticfiles": {
@@ -61,12 +63,79 @@ AWS_ACCESS_KEY_ID        = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY    = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME  = os.getenv('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME       = os.getenv('AWS_S3_REGION_NAME', 'us-east-1')
-AWS_S3_CUSTOM_DOMAIN     = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
+# Set AWS_S3_CUSTOM_DOMAIN to an empty string for presigned URLs (private buckets)
+AWS_S3_CUSTOM_DOMAIN     = os.getenv('AWS_S3_CUSTOM_DOMAIN', f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com') or None
+AWS_QUERYSTRING_EXPIRE   = int(os.getenv('AWS_QUERYSTRING_EXPIRE', 3600))
+AWS_S3_SIGNATURE_VERSION = os.getenv('AWS_S3_SIGNATURE_VERSION', 's3v4')
+
+# File URLs in responses are signed in batches and cached per key (LRU of FILE_URL_CACHE_SIZE).
+# No response carries a URL within FILE_URL_REFRESH seconds of expiring. FILE_URL_CDN_DOMAIN
+# serves files through a CDN in front of the bucket instead, without signing.
+FILE_URL_CACHE_SIZE      = int(os.getenv('FILE_URL_CACHE_SIZE', 10000))
+FILE_URL_REFRESH         = int(os.getenv('FILE_URL_REFRESH', 300))
+FILE_URL_CDN_DOMAIN      = os.getenv('FILE_URL_CDN_DOMAIN', '')
 
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+# Auth0 signing keys are cached in-process; Cache-Control max-age wins when present
+AUTH0_JWKS_CACHE_TTL     = int(os.getenv('AUTH0_JWKS_CACHE_TTL', 600))
+AUTH0_JWKS_MISS_INTERVAL = int(os.getenv('AUTH0_JWKS_MISS_INTERVAL', 30))
+AUTH0_JWKS_TIMEOUT       = int(os.getenv('AUTH0_JWKS_TIMEOUT', 5))
+# Verified tokens are remembered until `exp` so repeat requests skip the RSA verify.
+# Saving a user drops its tokens in that process; other processes notice within AUTH0_TOKEN_CACHE_TTL
+AUTH0_TOKEN_CACHE_SIZE   = int(os.getenv('AUTH0_TOKEN_CACHE_SIZE', 10000))
+AUTH0_TOKEN_CACHE_TTL    = int(os.getenv('AUTH0_TOKEN_CACHE_TTL', 300))
+
+# Largest number of operations accepted by the item batch endpoints
+ITEM_BATCH_MAX_SIZE      = int(os.getenv('ITEM_BATCH_MAX_SIZE', 500))
+
+# Categories and items whose order keys grow past this many characters (after many
+# moves into the same gap) get short keys again in a background job
+ORDER_KEY_MAX_LENGTH     = int(os.getenv('ORDER_KEY_MAX_LENGTH', 32))
+
+# Background jobs (manage.py run_jobs): attempts per job, base retry delay (doubled
+# per attempt), and seconds without progress before a running job is requeued
+JOB_MAX_ATTEMPTS         = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_DELAY          = int(os.getenv('JOB_RETRY_DELAY', 10))
+JOB_TIMEOUT              = int(os.getenv('JOB_TIMEOUT', 600))
+# Delta sync tombstones older than this are pruned by the workers, at most once per interval (seconds)
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 30))
+TOMBSTONE_PRUNE_INTERVAL = int(os.getenv('TOMBSTONE_PRUNE_INTERVAL', 3600))
+
+# Search engine for /api/search/. Empty picks PostgresSearchBackend on PostgreSQL,
+# checklist.search.PortableSearchBackend elsewhere
+SEARCH_BACKEND           = os.getenv('SEARCH_BACKEND', '')
+
+# Rows fetched per query chunk by exports, and rows per bulk_create by imports
+EXPORT_CHUNK_SIZE        = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+IMPORT_BATCH_SIZE        = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+
+# Outbox keys handled per transaction by `manage.py reap_files`
+REAP_BATCH_SIZE          = int(os.getenv('REAP_BATCH_SIZE', 1000))
+
+# Direct-to-storage uploads. Use checklist.uploads.FileSystemUploadBackend with local storage
+UPLOAD_BACKEND             = os.getenv('UPLOAD_BACKEND', 'checklist.uploads.S3UploadBackend')
+UPLOAD_URL_EXPIRES         = int(os.getenv('UPLOAD_URL_EXPIRES', 900))
+UPLOAD_MAX_SIZE            = int(os.getenv('UPLOAD_MAX_SIZE', 5 * 1024 ** 3))
+UPLOAD_MULTIPART_THRESHOLD = int(os.getenv('UPLOAD_MULTIPART_THRESHOLD', 64 * 1024 ** 2))
+UPLOAD_PART_SIZE           = int(os.getenv('UPLOAD_PART_SIZE', 16 * 1024 ** 2))
+
+# Uploaded files are stored once per content hash under this prefix
+BLOB_PREFIX                = os.getenv('BLOB_PREFIX', 'blobs/')
+
+# Per-request SQL/auth/serialize/storage timings, exported at /metrics
+PERF_METRICS_ENABLED       = os.getenv('PERF_METRICS_ENABLED', 'true').lower() == 'true'
+PERF_SERVER_TIMING         = os.getenv('PERF_SERVER_TIMING', 'false').lower() == 'true'
+PERF_SLOW_REQUEST_MS       = int(os.getenv('PERF_SLOW_REQUEST_MS', 500))
+PERF_SLOW_QUERY_COUNT      = int(os.getenv('PERF_SLOW_QUERY_COUNT', 5))
+PERF_METRICS_TOKEN         = os.getenv('PERF_METRICS_TOKEN', '')
+# Without a token /metrics answers 403 unless DEBUG or this is set
+PERF_METRICS_PUBLIC        = os.getenv('PERF_METRICS_PUBLIC', 'false').lower() == 'true'
+
 MIDDLEWARE = [
+    'checklist.metrics.PerformanceMiddleware',
+    'checklist.dbrouter.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -78,7 +147,10 @@ MIDDLEWARE = [
 ]
 CORS_ALLOW_ALL_ORIGINS = True
 
-ROOT_URLCONF = 'checklist.urls'
+# Serve checklist list/retrieve and shared checklists from async views (enabled by asgi.py)
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'false').lower() == 'true'
+
+ROOT_URLCONF = 'checklist.async_urls' if ASYNC_READ_VIEWS else 'checklist.urls'
 
 TEMPLATES = [
     {
@@ -112,6 +184,55 @@ DATABASES = {
     }
 }
 
+# Read replicas: DB_REPLICA_HOSTS=host1,host2 adds replica_1, replica_2 with the default
+# credentials. Safe requests to the checklist views read from them (see checklist.dbrouter).
+for _n, _host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{_n}'] = {**DATABASES['default'], 'HOST': _host.strip(), 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS        = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS         = ['checklist.dbrouter.ReplicaRouter']
+# After a write, the user's reads stay on the primary this long
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+# An unreachable replica is skipped this long before it is tried again
+DB_REPLICA_RETRY_SECONDS = int(os.getenv('DB_REPLICA_RETRY_SECONDS', 30))
+
+# Caches
+# Rendered shared checklists live in their own cache. Locmem is per-process;
+# point SHARED_CACHE_BACKEND/LOCATION at Redis or Memcached in production.
+# Startup fails on locmem unless SHARED_CACHE_ALLOW_LOCMEM (the DEBUG default) allows it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared_checklists': {
+        'BACKEND':  os.getenv('SHARED_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('SHARED_CACHE_LOCATION', 'shared-checklists'),
+    },
+    # Throttle counters, shared by every worker; needs atomic incr() (Redis or Memcached)
+    'throttle': {
+        'BACKEND':  os.getenv('THROTTLE_CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION', 'redis://localhost:6379/1'),
+    },
+}
+SHARED_CHECKLIST_CACHE         = 'shared_checklists'
+SHARED_CHECKLIST_CACHE_TIMEOUT = int(os.getenv('SHARED_CHECKLIST_CACHE_TIMEOUT', 3600))
+SHARED_CACHE_ALLOW_LOCMEM      = os.getenv('SHARED_CACHE_ALLOW_LOCMEM', str(DEBUG)).lower() == 'true'
+# Share token -> checklist id resolutions (unknown tokens are cached briefly)
+SHARE_TOKEN_CACHE_TIMEOUT      = int(os.getenv('SHARE_TOKEN_CACHE_TIMEOUT', 3600))
+SHARE_TOKEN_MISS_CACHE_TIMEOUT = int(os.getenv('SHARE_TOKEN_MISS_CACHE_TIMEOUT', 60))
+# With a per-process (locmem) shared cache, revocations reach other workers only when their entries expire
+SHARE_TOKEN_LOCMEM_TIMEOUT     = int(os.getenv('SHARE_TOKEN_LOCMEM_TIMEOUT', 5))
+# Longest `expires_in` accepted for a share link, in seconds
+SHARE_LINK_MAX_EXPIRES_IN      = int(os.getenv('SHARE_LINK_MAX_EXPIRES_IN', 365 * 86400))
+# Live shared checklist events (ASGI only). The default broker only sees writes of its own process;
+# use checklist.events.PostgresBroker with several workers or nodes
+EVENT_BROKER                   = os.getenv('EVENT_BROKER', 'checklist.events.LocalBroker')
+EVENT_STREAM_HEARTBEAT         = int(os.getenv('EVENT_STREAM_HEARTBEAT', 15))
+# Throttle buckets (see REST_FRAMEWORK below), counted in THROTTLE_CACHE by every worker.
+# checklist.throttling.LocMemCounters counts per process: the DEBUG default, so development needs no Redis
+THROTTLE_COUNTERS              = os.getenv('THROTTLE_COUNTERS', 'checklist.throttling.LocMemCounters' if DEBUG
+                                           else 'checklist.throttling.CacheCounters')
+THROTTLE_CACHE                 = os.getenv('THROTTLE_CACHE', 'throttle')
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -160,4 +281,48 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'checklist.auth0backend.Auth0JSONWebTokenAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'checklist.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Token buckets per share link, per IP (anonymous requests) and per user, for reads and
+    # for uploads (requests and bytes). "<size>/<period>": <size> requests (bytes, K/M/G) that
+    # refill over <period>. An empty rate turns the bucket off
+    'DEFAULT_THROTTLE_CLASSES': (
+        'checklist.throttling.ShareTokenThrottle',
+        'checklist.throttling.ShareTokenBytesThrottle',
+        'checklist.throttling.IPThrottle',
+        'checklist.throttling.IPBytesThrottle',
+        'checklist.throttling.UserThrottle',
+        'checklist.throttling.UserBytesThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'share_read':         os.getenv('THROTTLE_SHARE_READ', '600/min'),
+        'share_upload':       os.getenv('THROTTLE_SHARE_UPLOAD', '60/hour'),
+        'share_upload_bytes': os.getenv('THROTTLE_SHARE_UPLOAD_BYTES', '1G/hour'),
+        'ip_read':            os.getenv('THROTTLE_IP_READ', '300/min'),
+        'ip_upload':          os.getenv('THROTTLE_IP_UPLOAD', '60/hour'),
+        'ip_upload_bytes':    os.getenv('THROTTLE_IP_UPLOAD_BYTES', '1G/hour'),
+        'user_read':          os.getenv('THROTTLE_USER_READ', '1200/min'),
+        'user_upload':        os.getenv('THROTTLE_USER_UPLOAD', '600/hour'),
+        'user_upload_bytes':  os.getenv('THROTTLE_USER_UPLOAD_BYTES', '10G/hour'),
+    },
+    # Proxies in front of the app that append to X-Forwarded-For; 0 uses the peer address
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
+}
+
+# MessagePack responses (Accept: application/msgpack) when the optional msgpack package is installed
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += ('checklist.renderers.MessagePackRenderer',)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'checklist.performance': {'handlers': ['console'], 'level': 'WARNING'},
+        'checklist.jobs': {'handlers': ['console'], 'level': 'INFO'},
+    },
 }
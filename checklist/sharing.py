@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils import timezone
+
+from .cache import acache, shared_cache
+from .models import ShareLink
+
+_MISSING = 'missing'
+
+
+def _token_key(token):
+    return f"share-token:{token}"
+
+
+def resolve_share_token(request, token):
+    """
+    Resolve a share token to its checklist id, or raise Http404 when the link
+    does not exist, was revoked or has expired.
+
+    Lookups are memoized on the request and cached in the shared cache, so
+    repeat resolutions cost no queries; expiry is checked against the cached
+    timestamp.
+    """
+    memo = _memo(request)
+    token = str(token)
+    if token not in memo:
+        memo[token] = _lookup(token)
+    return _checked(memo[token])
+
+
+async def aresolve_share_token(request, token):
+    """
+    Async variant of resolve_share_token.
+    """
+    memo = _memo(request)
+    token = str(token)
+    if token not in memo:
+        memo[token] = await _alookup(token)
+    return _checked(memo[token])
+
+
+async def acheck_share_token(token):
+    """
+    aresolve_share_token without the request memo, for re-checking a link
+    during a long-lived response such as an event stream.
+    """
+    return _checked(await _alookup(str(token)))
+
+
+def invalidate_share_token(token):
+    shared_cache().delete(_token_key(token))
+
+
+def _memo(request):
+    memo = getattr(request, '_share_tokens', None)
+    if memo is None:
+        memo = request._share_tokens = {}
+    return memo
+
+
+def _checked(entry):
+    if entry == _MISSING:
+        raise Http404("Share link not found.")
+    checklist_id, expires_at = entry
+    if expires_at is not None and expires_at <= timezone.now().timestamp():
+        raise Http404("Share link has expired.")
+    return checklist_id
+
+
+def _lookup(token):
+    cache = shared_cache()
+    entry = cache.get(_token_key(token))
+    if entry is not None:
+        return entry
+
+    try:
+        row = _share_rows(token).first()
+    except (ValueError, ValidationError):
+        row = None
+    entry, timeout = _entry_for(row, cache)
+    cache.set(_token_key(token), entry, timeout)
+    return entry
+
+
+async def _alookup(token):
+    cache = shared_cache()
+    entry = await acache(cache, 'get', _token_key(token))
+    if entry is not None:
+        return entry
+
+    try:
+        row = await _share_rows(token).afirst()
+    except (ValueError, ValidationError):
+        row = None
+    entry, timeout = _entry_for(row, cache)
+    await acache(cache, 'set', _token_key(token), entry, timeout)
+    return entry
+
+
+def _share_rows(token):
+    return ShareLink.objects.filter(token=token).values_list('checklist_id', 'expires_at', 'revoked_at')
+
+
+def _entry_for(row, cache):
+    if row is None or row[2] is not None:
+        entry = _MISSING
+        timeout = getattr(settings, 'SHARE_TOKEN_MISS_CACHE_TIMEOUT', 60)
+    else:
+        entry = (row[0], row[1].timestamp() if row[1] else None)
+        timeout = getattr(settings, 'SHARE_TOKEN_CACHE_TIMEOUT', 3600)
+    if isinstance(cache, LocMemCache):
+        # A revocation only evicts this process's entry; other workers must notice soon
+        timeout = min(timeout, getattr(settings, 'SHARE_TOKEN_LOCMEM_TIMEOUT', 5))
+    return entry, timeout
@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .blobs import release_blobs
+from .cache import bump_checklist_version
+from .counters import add_item_delta, apply_deltas, signal_counters_active
+from .events import publish_change
+from .metrics import record_query
+from .models import Checklist, Category, Item, CategoryFile, ItemFile, ShareLink
+from .sharing import invalidate_share_token
+from .sync import record_change, record_delete
+
+
+def invalidate_checklist(checklist_id):
+    """
+    Drop cached shared renderings once the surrounding transaction commits,
+    so a concurrent reader cannot re-cache the pre-commit state, and tell
+    event streams about the change.
+    """
+    if checklist_id is not None:
+        transaction.on_commit(lambda: bump_checklist_version(checklist_id))
+        transaction.on_commit(lambda: publish_change(checklist_id), robust=True)
+
+
+TREE_MODELS = (Checklist, Category, Item, CategoryFile, ItemFile)
+
+
+def _checklist_id_for(instance, origin=None):
+    """
+    The checklist of a row, taken from its parents when they are loaded with
+    it (select_related, or passed to save()). Otherwise one query per parent,
+    shared by the rows deleted from one `origin`.
+    """
+    if isinstance(instance, Checklist):
+        return instance.pk
+    if isinstance(instance, Category):
+        return instance.checklist_id
+    cached = instance._state.fields_cache
+    if isinstance(instance, ItemFile):
+        if 'item' in cached:
+            return _checklist_id_for(cached['item'], origin)
+        parent, lookup = (Item, instance.item_id), 'category__checklist_id'
+    elif isinstance(instance, (Item, CategoryFile)):
+        if 'category' in cached:
+            return cached['category'].checklist_id
+        parent, lookup = (Category, instance.category_id), 'checklist_id'
+    else:
+        return None
+    memo = origin.__dict__.setdefault('_checklist_ids', {}) if origin is not None else {}
+    if parent not in memo:
+        model, pk = parent
+        memo[parent] = model.objects.filter(pk=pk).values_list(lookup, flat=True).first()
+    return memo[parent]
+
+
+@receiver([post_save, post_delete], sender=Checklist)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Item)
+@receiver([post_save, post_delete], sender=CategoryFile)
+@receiver([post_save, post_delete], sender=ItemFile)
+def checklist_tree_changed(sender, instance, signal=None, created=False, raw=False, origin=None, **kwargs):
+    # Connected before item_saved, so the sync stamp still sees the item's previous state
+    if signal is post_delete and isinstance(origin, TREE_MODELS) and origin is not instance:
+        # Deleted in the cascade of a row of the same checklist, whose own signal covers it
+        return
+    checklist_id = _checklist_id_for(instance, origin)
+    invalidate_checklist(checklist_id)
+    if raw or checklist_id is None:
+        return
+    if signal is post_save:
+        record_change(checklist_id, instance, created)
+    elif sender is not Checklist and _origin_model(origin) is sender:
+        # Rows removed by a parent's cascade are covered by the parent's tombstone
+        record_delete(checklist_id, instance)
+
+
+def _origin_model(origin):
+    if isinstance(origin, QuerySet):
+        return origin.model
+    return type(origin)
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or not signal_counters_active():
+        return
+    deltas = {}
+    loaded = getattr(instance, '_loaded_state', None)
+    if loaded is None and not created:
+        # Saved without being loaded first; the previous state is unknown
+        return
+    old_category_id, old_completed = loaded or (None, False)
+    if created:
+        add_item_delta(deltas, instance.category_id, instance.is_completed, 1)
+    elif old_category_id != instance.category_id or old_completed != instance.is_completed:
+        add_item_delta(deltas, old_category_id, old_completed, -1)
+        add_item_delta(deltas, instance.category_id, instance.is_completed, 1)
+    apply_deltas(deltas)
+    instance._loaded_state = (instance.category_id, instance.is_completed)
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, origin=None, **kwargs):
+    # Parents deleted in the same cascade take their counters with them
+    if not signal_counters_active() or _origin_model(origin) in (Category, Checklist):
+        return
+    deltas = {}
+    add_item_delta(deltas, instance.category_id, instance.is_completed, -1)
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, origin=None, **kwargs):
+    if not signal_counters_active() or _origin_model(origin) is Checklist:
+        return
+    Checklist.objects.filter(pk=instance.checklist_id).update(
+        item_count=F('item_count') - instance.item_count,
+        completed_count=F('completed_count') - instance.completed_count,
+    )
+
+
+@receiver(post_delete, sender=CategoryFile)
+@receiver(post_delete, sender=ItemFile)
+def file_deleted(sender, instance, **kwargs):
+    release_blobs([instance.file.name])
+
+
+@receiver([post_save, post_delete], sender=ShareLink)
+def share_link_changed(sender, instance, **kwargs):
+    token = instance.token
+    transaction.on_commit(lambda: invalidate_share_token(token))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Outermost, so execute_wrapper() blocks opened before the connect still pop their own
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
@@ -0,0 +1,206 @@
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Checklist, Category, Item, CategoryFile, ItemFile, Tombstone
+from .serializer import ChecklistSerializer, CategoryFileSerializer, ItemFileSerializer
+
+KINDS = {
+    Category: 'category',
+    Item: 'item',
+    CategoryFile: 'category_file',
+    ItemFile: 'item_file',
+}
+
+_state = threading.local()
+
+
+def bump_version(checklist_id):
+    """
+    Increment the checklist's version and return the new value. The UPDATE
+    holds the row lock until commit, so versions follow commit order.
+    """
+    Checklist.objects.filter(pk=checklist_id).update(version=F('version') + 1)
+    return Checklist.objects.filter(pk=checklist_id).values_list('version', flat=True).first()
+
+
+class ChangeSet:
+    def __init__(self, version):
+        self.version = version
+        self.tombstones = []
+
+
+def _active():
+    return getattr(_state, 'change_sets', {})
+
+
+@contextmanager
+def change_set(checklist_id):
+    """
+    Bump the checklist's version once for everything changed inside the block,
+    e.g. a batch of item operations. Yields the version; tombstones recorded
+    inside the block are written together at the end.
+    """
+    with transaction.atomic():
+        changes = ChangeSet(bump_version(checklist_id))
+        previous = _active()
+        _state.change_sets = {**previous, checklist_id: changes}
+        try:
+            yield changes.version
+        finally:
+            _state.change_sets = previous
+        Tombstone.objects.bulk_create(changes.tombstones)
+
+
+@contextmanager
+def _version_for(checklist_id):
+    changes = _active().get(checklist_id)
+    if changes is not None:
+        yield changes
+        return
+    with transaction.atomic():
+        changes = ChangeSet(bump_version(checklist_id))
+        yield changes
+        Tombstone.objects.bulk_create(changes.tombstones)
+
+
+def record_change(checklist_id, instance, created=False):
+    """
+    Stamp a saved row with a new checklist version. Saving an item also
+    stamps its categories, whose counters may have changed.
+    """
+    if isinstance(instance, Checklist):
+        if not created:
+            with _version_for(checklist_id):
+                pass
+        return
+    with _version_for(checklist_id) as changes:
+        type(instance).objects.filter(pk=instance.pk).update(changed_at_version=changes.version)
+        instance.changed_at_version = changes.version
+        if isinstance(instance, Item):
+            # Runs before item_saved, so _loaded_state still holds the previous category
+            previous = getattr(instance, '_loaded_state', None)
+            category_ids = {instance.category_id, previous[0] if previous else None} - {None}
+            Category.objects.filter(pk__in=category_ids).update(changed_at_version=changes.version)
+
+
+def record_delete(checklist_id, instance):
+    """
+    Leave a tombstone for a deleted row. Deleting an item also stamps its
+    category, whose counters changed.
+    """
+    with _version_for(checklist_id) as changes:
+        changes.tombstones.append(Tombstone(
+            checklist_id=checklist_id, kind=KINDS[type(instance)], object_id=instance.pk, version=changes.version,
+        ))
+        if isinstance(instance, Item):
+            Category.objects.filter(pk=instance.category_id).update(changed_at_version=changes.version)
+
+
+def changes_since(checklists, since, context=None):
+    """
+    Everything in the checklist that changed after version `since`: the
+    checklist fields, upserted categories, items and files, and the ids of
+    deleted ones. Uses a fixed number of indexed queries, so the cost follows
+    the size of the change rather than of the checklist.
+
+    The version is read first; rows changed concurrently may show up again in
+    the next sync, which clients apply idempotently. A `since` ahead of the
+    checklist (e.g. after a restore), or from before tombstones it would need
+    were pruned, returns a full snapshot with `reset`. Returns None when the
+    checklist does not exist.
+    """
+    context = context or {}
+    row = checklists.values(
+        'id', 'title', 'description', 'created_at', 'owner', 'item_count', 'completed_count', 'version',
+        'pruned_version',
+    ).first()
+    if row is None:
+        return None
+    version, pruned_version = row.pop('version'), row.pop('pruned_version')
+    reset = since > version or 0 < since < pruned_version
+    if reset:
+        since = 0
+    checklist_id = row['id']
+    row['created_at'] = ChecklistSerializer(context=context).fields['created_at'].to_representation(row['created_at'])
+
+    categories = Category.objects.filter(checklist_id=checklist_id, changed_at_version__gt=since).order_by('id')
+    items = Item.objects.filter(category__checklist_id=checklist_id, changed_at_version__gt=since).order_by('id')
+    category_files = CategoryFile.objects.filter(
+        category__checklist_id=checklist_id, changed_at_version__gt=since
+    ).order_by('id')
+    item_files = ItemFile.objects.filter(
+        item__category__checklist_id=checklist_id, changed_at_version__gt=since
+    ).order_by('id')
+
+    deletes = {kind: [] for kind in KINDS.values()}
+    if since:
+        tombstones = Tombstone.objects.filter(checklist_id=checklist_id, version__gt=since).order_by('id')
+        for kind, object_id in tombstones.values_list('kind', 'object_id'):
+            deletes[kind].append(object_id)
+
+    category_file_field = CategoryFileSerializer(context=context).fields['file']
+    item_file_field = ItemFileSerializer(context=context).fields['file']
+    return {
+        'version': version,
+        'since': since,
+        'reset': reset,
+        'checklist': row,
+        'upserts': {
+            'category': list(categories.values('id', 'name', 'item_count', 'completed_count', 'position')),
+            'item': [
+                {'id': pk, 'category': category_id, 'name': name, 'is_completed': is_completed, 'position': position}
+                for pk, category_id, name, is_completed, position in items.values_list(
+                    'id', 'category_id', 'name', 'is_completed', 'position'
+                )
+            ],
+            'category_file': _files(category_files.values_list('id', 'category_id', 'file'), 'category',
+                                    category_file_field),
+            'item_file': _files(item_files.values_list('id', 'item_id', 'file'), 'item', item_file_field),
+        },
+        'deletes': deletes,
+    }
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def prune_tombstones(retention=None):
+    """
+    Delete tombstones older than `retention` (TOMBSTONE_RETENTION_DAYS by
+    default) in two set-based statements. Each checklist remembers the
+    newest version pruned, and a client syncing from before it gets a full
+    snapshot instead of a delta missing those deletes. Returns the number of
+    tombstones deleted.
+    """
+    cutoff = timezone.now() - (retention if retention is not None else tombstone_retention())
+    expired = Tombstone.objects.filter(created_at__lt=cutoff)
+    newest = expired.filter(checklist_id=OuterRef('pk')).order_by().values('checklist_id').annotate(
+        newest=Max('version'),
+    ).values('newest')
+    using = router.db_for_write(Tombstone)
+    with transaction.atomic(using=using):
+        checklists = expired.values('checklist_id')
+        Checklist.objects.filter(pk__in=checklists).update(
+            pruned_version=Greatest('pruned_version', Subquery(newest)),
+        )
+        # Versions only grow, so nothing written since is at or below the horizon.
+        # Tombstones have no signals or dependent rows, so this is a single DELETE.
+        deleted, _ = Tombstone.objects.filter(
+            checklist_id__in=checklists, version__lte=F('checklist__pruned_version'),
+        ).delete()
+        return deleted
+
+
+def _files(rows, parent, serializer_field):
+    # Same URLs as the serializers, signed as one batch as in tree._group_files
+    rows = list(rows)
+    urls = serializer_field.represent_many([name for _, _, name in rows])
+    return [{'id': pk, parent: parent_id, 'file': urls.get(name)} for pk, parent_id, name in rows]
\ No newline at end of file
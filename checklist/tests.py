@@ -0,0 +1,1585 @@
+import asyncio
+import datetime
+import hashlib
+import importlib
+import io
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import boto3
+import botocore.config
+from asgiref.sync import sync_to_async
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import DatabaseError, connection
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from jwt.algorithms import RSAAlgorithm
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import urls
+from .auth0backend import TokenCache, token_cache
+from .benchmark import compare, generate_dataset, percentile, run_benchmark, stub_auth
+from .counters import recount
+from .dbrouter import ReplicaRouter, ReplicaRoutingMiddleware
+from .deletion import reap_orphaned_files
+from .jobs import HANDLERS, Worker, clone_job, enqueue
+from .models import Blob, Checklist, Category, Item, CategoryFile, Job, OrphanedFile, ShareLink, Tombstone
+from .cache import check_shared_cache, shared_cache
+from .ordering import key_between, keys_between
+from .renderers import FastJSONRenderer
+from .sharing import _token_key
+from .storage import S3Storage
+from .sync import prune_tombstones
+from .throttling import CacheCounters, throttle_counters
+from .uploads import S3UploadBackend
+from .utils import JWKSKeyStore
+
+# The API with the FileSystemUploadBackend route, whatever UPLOAD_BACKEND was at import
+urlpatterns = urls.urlpatterns + [
+    pattern for pattern in urls.local_upload_urlpatterns if pattern not in urls.urlpatterns
+]
+
+
+class APITestCase(TestCase):
+    """
+    Tests against file storage in a temporary directory, empty caches and
+    per-process throttle counters, with `self.client` authenticated as
+    `self.owner` once set.
+    """
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media = tempfile.mkdtemp(prefix='checklist-tests-')
+        cls._storage = override_settings(STORAGES={
+            'default': {'BACKEND': 'checklist.storage.FileSystemStorage', 'OPTIONS': {'location': cls.media}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }, UPLOAD_BACKEND='checklist.uploads.FileSystemUploadBackend',
+            THROTTLE_COUNTERS='checklist.throttling.LocMemCounters', CACHES={
+                **settings.CACHES, 'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            })
+        cls._storage.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._storage.disable()
+        shutil.rmtree(cls.media, ignore_errors=True)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        throttle_counters().clear()
+
+    def login(self, user):
+        self.owner = user
+        self.client.force_authenticate(user)
+
+
+class StubJWKS:
+    """
+    A JWKS endpoint for JWKSKeyStore: serves `self.kids` after `delay`
+    seconds, counts fetches and fails while `self.error` is set.
+    """
+
+    def __init__(self, *kids, max_age=None, delay=0):
+        self.kids = list(kids)
+        self.max_age = max_age
+        self.delay = delay
+        self.error = None
+        self.fetches = 0
+
+    def document(self):
+        self.fetches += 1
+        if self.error is not None:
+            raise self.error
+        return {'keys': [dict(JWKSKeyStoreTests.jwks[kid], kid=kid) for kid in self.kids]}, self.max_age
+
+    def __call__(self, url):
+        time.sleep(self.delay)
+        return self.document()
+
+    async def fetch_async(self, url):
+        await asyncio.sleep(self.delay)
+        return self.document()
+
+
+class JWKSKeyStoreTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.jwks = {
+            kid: json.loads(RSAAlgorithm.to_jwk(rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()))
+            for kid in ('a', 'b')
+        }
+
+    def store(self, stub, **options):
+        return JWKSKeyStore(url='https://example.test/jwks.json', fetcher=stub, async_fetcher=stub.fetch_async,
+                            **{'ttl': 600, 'miss_interval': 30, **options})
+
+    def test_unknown_kid_refreshes_once_per_interval(self):
+        stub = StubJWKS('a')
+        store = self.store(stub)
+        self.assertIs(store.get_key('a'), store.get_key('a'))
+        self.assertEqual(stub.fetches, 1)
+        stub.kids.append('b')
+        # Within miss_interval of the last fetch an unknown kid does not refetch
+        with self.assertRaises(Exception):
+            store.get_key('b')
+        self.assertEqual(stub.fetches, 1)
+        store.miss_interval = 0
+        self.assertIsNotNone(store.get_key('b'))
+        self.assertEqual(stub.fetches, 2)
+
+    def test_single_flight(self):
+        stub = StubJWKS('a', delay=0.05)
+        store = self.store(stub)
+        barrier = threading.Barrier(8)
+        keys = []
+
+        def get():
+            barrier.wait()
+            keys.append(store.get_key('a'))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stub.fetches, 1)
+        self.assertEqual(len(keys), 8)
+        self.assertEqual(len({id(key) for key in keys}), 1)
+
+    def test_serves_stale_keys_when_the_fetch_fails(self):
+        stub = StubJWKS('a')
+        store = self.store(stub, ttl=0)
+        key = store.get_key('a')
+        stub.error = ConnectionError("down")
+        with self.assertLogs('checklist.utils', 'WARNING'):
+            self.assertIs(store.get_key('a'), key)
+        # and backs off for miss_interval instead of fetching on every call
+        self.assertIs(store.get_key('a'), key)
+        self.assertEqual(stub.fetches, 2)
+
+    def test_fails_without_keys_to_fall_back_on(self):
+        stub = StubJWKS('a')
+        stub.error = ConnectionError("down")
+        with self.assertRaises(Exception):
+            self.store(stub).get_key('a')
+
+    def test_ttl(self):
+        clock = [1000.0]
+        stub = StubJWKS('a')
+        store = self.store(stub, ttl=100)
+        with mock.patch('checklist.utils.time.monotonic', lambda: clock[0]):
+            store.get_key('a')
+            clock[0] += 99
+            store.get_key('a')
+            self.assertEqual(stub.fetches, 1)
+            clock[0] += 1
+            store.get_key('a')
+            self.assertEqual(stub.fetches, 2)
+            # Cache-Control max-age wins over the ttl
+            stub.max_age = 10
+            clock[0] += 100
+            store.get_key('a')
+            clock[0] += 10
+            store.get_key('a')
+            self.assertEqual(stub.fetches, 4)
+
+    async def test_aget_key(self):
+        stub = StubJWKS('a', delay=0.01)
+        store = self.store(stub)
+        keys = await asyncio.gather(*[store.aget_key('a') for _ in range(8)])
+        self.assertEqual(stub.fetches, 1)
+        self.assertEqual(len({id(key) for key in keys}), 1)
+        self.assertIs(store.get_key('a'), keys[0])
+        store.miss_interval = 0
+        stub.error = ConnectionError("down")
+        with self.assertLogs('checklist.utils', 'WARNING'):
+            with self.assertRaises(Exception):
+                await store.aget_key('b')
+            self.assertIs(await store.aget_key('a'), keys[0])
+
+
+class TokenCacheTests(APITestCase):
+
+    def test_lru(self):
+        cache = TokenCache(max_size=2)
+        exp = time.time() + 3600
+        for key in 'ab':
+            cache.set(key, {'sub': key, 'exp': exp}, 1)
+        self.assertIsNotNone(cache.get('a'))
+        cache.set('c', {'sub': 'c', 'exp': exp}, 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats(), {
+            'size': 2, 'max_size': 2, 'hits': 2, 'misses': 1, 'evictions': 1, 'hit_rate': 2 / 3,
+        })
+
+    def test_expiry(self):
+        clock = [1000.0]
+        cache = TokenCache(ttl=60)
+        with mock.patch('checklist.auth0backend.time.time', lambda: clock[0]):
+            cache.set('a', {'sub': 'a', 'exp': 1010}, 1)
+            cache.set('b', {'sub': 'b', 'exp': 5000}, 1)
+            cache.set('c', {'sub': 'c'}, 1)
+            clock[0] = 1009
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNone(cache.get('c'))
+            clock[0] = 1010
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('b'))
+            # and never for longer than the ttl
+            clock[0] = 1060
+            self.assertIsNone(cache.get('b'))
+
+    def test_cached_principal(self):
+        with stub_auth() as mint:
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {mint('auth0|someone')}")
+            self.assertEqual(self.client.get('/api/checklists/').status_code, 200)
+            user = User.objects.get(username='auth0|someone')
+            # The principal comes from the cache: the only query is the empty checklist page
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/checklists/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(token_cache.stats()['hits'], 1)
+
+            # Updating the user drops its tokens, so the next request loads the row again
+            user.is_active = False
+            user.save()
+            self.assertEqual(token_cache.stats()['size'], 0)
+            self.assertEqual(self.client.get('/api/checklists/').status_code, 200)
+            self.assertEqual(token_cache.stats()['misses'], 2)
+
+            user.delete()
+            self.assertEqual(token_cache.stats()['size'], 0)
+
+
+class TreeQueryCountTests(APITestCase):
+    """
+    List and retrieve run a fixed number of queries, whatever the tree size.
+    """
+
+    def assertQueriesConstant(self, path, queries, sizes=((2, 2), (8, 12))):
+        for categories, items in sizes:
+            with self.subTest(categories=categories, items=items):
+                [owner] = generate_dataset(1, 3, categories, items, files=2)
+                self.login(owner)
+                url = path.format(id=owner.checklists.order_by('id').first().pk)
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_list(self):
+        self.assertQueriesConstant('/api/checklists/', 6)
+
+    def test_retrieve(self):
+        self.assertQueriesConstant('/api/checklists/{id}/', 6)
+
+    def test_retrieve_renders_the_whole_tree(self):
+        [owner] = generate_dataset(1, 1, 3, 4, files=1)
+        self.login(owner)
+        checklist = owner.checklists.get()
+        data = self.client.get(f'/api/checklists/{checklist.pk}/').json()
+        self.assertEqual(len(data['categories']), 3)
+        self.assertEqual([len(category['items']) for category in data['categories']], [4, 4, 4])
+        self.assertEqual(len(data['categories'][0]['files']), 1)
+        self.assertEqual(len(data['categories'][0]['items'][0]['files']), 1)
+        self.assertEqual(data['item_count'], Checklist.objects.get(pk=checklist.pk).item_count)
+
+
+class CloneTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 2, 2, 3, files=1)
+        self.login(owner)
+        self.first, self.second = owner.checklists.order_by('id')
+
+    def test_clone_many(self):
+        response = self.client.post('/api/checklists/clone/', {'ids': [self.first.pk, self.second.pk]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([tree['title'] for tree in response.json()], [f"Copy of {self.first.title}", f"Copy of {self.second.title}"])
+        self.assertEqual(self.owner.checklists.count(), 4)
+        clone = Checklist.objects.get(pk=response.json()[0]['id'])
+        self.assertEqual(clone.item_count, self.first.item_count)
+
+    def test_clone_many_needs_a_list(self):
+        for ids in (f"{self.first.pk}{self.second.pk}", self.first.pk, [], None, ['x']):
+            with self.subTest(ids=ids):
+                response = self.client.post('/api/checklists/clone/', {'ids': ids}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.owner.checklists.count(), 2)
+
+    def test_clone_title(self):
+        url = f"/api/checklists/{self.first.pk}/clone/"
+        for title in ('x' * 201, 5):
+            with self.subTest(title=title):
+                self.assertEqual(self.client.post(url, {'title': title}, format='json').status_code, 400)
+        self.assertEqual(self.owner.checklists.count(), 2)
+        response = self.client.post(url, {'title': 'x' * 200}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['title'], 'x' * 200)
+
+    def test_clone_many_of_someone_elses_checklist(self):
+        [other] = generate_dataset(1, 1, 1, 1)
+        response = self.client.post('/api/checklists/clone/', {'ids': [other.checklists.get().pk]}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class PaginationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 5, 1, 2, files=0)
+        self.login(owner)
+        self.ids = list(owner.checklists.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.append([checklist['id'] for checklist in response.json()['results']])
+            url = response.json()['next']
+            if len(ids) == 1:
+                # Rows created after the first page must not shift the following ones
+                Checklist.objects.create(owner=self.owner, title='newer')
+        return ids
+
+    def test_cursors_are_stable(self):
+        self.assertEqual(self.pages('/api/checklists/?page_size=2'), [self.ids[:2], self.ids[2:4], self.ids[4:]])
+
+    def test_summary(self):
+        pages = []
+        url = '/api/checklists/?view=summary&page_size=3'
+        while url:
+            response = self.client.get(url).json()
+            pages.append(response['results'])
+            url = response['next']
+        self.assertEqual([[row['id'] for row in page] for page in pages], [self.ids[:3], self.ids[3:]])
+        row = pages[0][0]
+        self.assertEqual(set(row), {'id', 'title', 'description', 'created_at', 'owner',
+                                    'category_count', 'item_count', 'completed_count'})
+        self.assertEqual((row['category_count'], row['item_count']), (1, 2))
+
+    def test_invalid_cursors(self):
+        cursor = parse_qs(urlsplit(self.client.get('/api/checklists/?page_size=2').json()['next']).query)['cursor'][0]
+        value, signature = cursor.rsplit(':', 1)
+        for bad in ('nonsense', cursor[:-2], f"{value}:{signature[::-1]}", 'MjAyNi0wMS0wMVQwMDowMDowMHwx'):
+            with self.subTest(cursor=bad):
+                response = self.client.get('/api/checklists/', {'cursor': bad})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'cursor': 'Invalid cursor'})
+
+
+class SharedChecklistCacheTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 2, 3)
+        self.checklist = owner.checklists.get()
+        self.url = f"/api/share/{ShareLink.objects.get(checklist=self.checklist).token}/"
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertIn('Accept', response['Vary'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_each_rendering_has_its_own_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        html = self.client.get(self.url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(html.status_code, 200)
+        self.assertNotEqual(html['ETag'], etag)
+        indented = self.client.get(self.url, HTTP_ACCEPT='application/json; indent=2', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(indented.status_code, 200)
+
+    def test_changes_retire_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        item = Item.objects.filter(category__checklist=self.checklist).first()
+        item.is_completed = not item.is_completed
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_locmem_needs_allowing(self):
+        check_shared_cache()
+        with self.settings(SHARED_CACHE_ALLOW_LOCMEM=False), self.assertRaises(ImproperlyConfigured):
+            check_shared_cache()
+
+    @override_settings(ROOT_URLCONF='checklist.async_urls')
+    async def test_async_view_matches_the_sync_etag(self):
+        client = AsyncClient()
+        with override_settings(ROOT_URLCONF='checklist.urls'):
+            etag = (await client.get(self.url))['ETag']
+        response = await client.get(self.url)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual((await client.get(self.url, headers={'If-None-Match': etag})).status_code, 304)
+
+
+class ShareLinkTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 1, 1, files=0)
+        self.login(owner)
+        self.checklist = owner.checklists.get()
+        self.category = self.checklist.categories.get()
+        self.token = ShareLink.objects.filter(checklist=self.checklist).values_list('token', flat=True).first()
+
+    def test_expires_in(self):
+        url = f"/api/checklists/{self.checklist.pk}/share/"
+        self.assertEqual(self.client.post(url, {'expires_in': 3600}, format='json').status_code, 201)
+        for expires_in in (10 ** 18, 0, -1, 'soon', 366 * 86400):
+            self.assertEqual(self.client.post(url, {'expires_in': expires_in}, format='json').status_code, 400)
+
+    def test_batch_on_the_share_route(self):
+        url = f"/api/share/{self.token}/categories/{self.category.pk}/items/batch/"
+        operations = {'operations': [{'op': 'create', 'data': {'name': 'new'}}]}
+        self.assertEqual(self.client.post(url, operations, format='json').status_code, 200)
+        self.login(User.objects.create(username='other'))
+        self.assertEqual(self.client.post(url, operations, format='json').status_code, 404)
+
+    def test_locmem_resolutions_expire_soon(self):
+        cache = shared_cache()
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set, \
+                self.settings(SHARE_TOKEN_LOCMEM_TIMEOUT=2):
+            self.assertEqual(self.client.get(f"/api/share/{self.token}/").status_code, 200)
+        self.assertEqual(cache_set.call_args_list[0].args[:3],
+                         (_token_key(self.token), (self.checklist.pk, None), 2))
+
+
+class SignalQueryTests(APITestCase):
+    """
+    Signals find the checklist of a row without a query per row.
+    """
+
+    def delete_category_queries(self, items):
+        [owner] = generate_dataset(1, 1, 1, items, files=0)
+        self.login(owner)
+        category = Category.objects.get(checklist__owner=owner)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(f"/api/checklists/{category.checklist_id}/categories/{category.pk}/")
+        self.assertEqual(response.status_code, 204)
+        return len(queries)
+
+    def test_cascade_does_not_look_up_each_row(self):
+        self.assertEqual(self.delete_category_queries(2), self.delete_category_queries(20))
+
+    def test_item_update_reuses_the_loaded_category(self):
+        [owner] = generate_dataset(1, 1, 1, 1, files=0)
+        self.login(owner)
+        item = Item.objects.select_related('category').get(category__checklist__owner=owner)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f"/api/checklists/{item.category.checklist_id}/categories/{item.category_id}/items/{item.pk}/",
+                {'is_completed': not item.is_completed}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        lookups = [query['sql'] for query in queries if 'SELECT "checklist_category"."checklist_id"' in query['sql']]
+        self.assertEqual(lookups, [])
+
+
+class ItemBatchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 2, 3, files=0)
+        self.login(owner)
+        self.checklist = owner.checklists.get()
+        self.category, self.other = Category.objects.filter(checklist=self.checklist).order_by('position')
+        self.url = f"/api/checklists/{self.checklist.pk}/items/batch/"
+
+    def batch(self, *operations, url=None):
+        return self.client.post(url or self.url, {'operations': list(operations)}, format='json')
+
+    def rows(self):
+        return (
+            list(Item.objects.filter(category__checklist=self.checklist).order_by('pk')
+                 .values_list('pk', 'category_id', 'name', 'is_completed')),
+            list(Category.objects.filter(checklist=self.checklist).order_by('pk')
+                 .values_list('item_count', 'completed_count')),
+            Checklist.objects.values_list('item_count', 'completed_count', 'version').get(pk=self.checklist.pk),
+        )
+
+    def test_one_bad_operation_writes_nothing(self):
+        before = self.rows()
+        item = self.category.items.first()
+        response = self.batch(
+            {'op': 'create', 'data': {'name': 'new', 'category': self.category.pk}},
+            {'op': 'update', 'id': item.pk, 'data': {'is_completed': not item.is_completed}},
+            {'op': 'delete', 'id': 0},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 200, 404])
+        self.assertEqual(self.rows(), before)
+
+    def test_moves_stay_in_the_checklist(self):
+        [other] = generate_dataset(1, 1, 1, 1, files=0)
+        foreign_category = Category.objects.get(checklist__owner=other)
+        foreign_item = Item.objects.get(category=foreign_category)
+        before = self.rows()
+        item = self.category.items.first()
+        response = self.batch({'op': 'update', 'id': item.pk, 'data': {'category': foreign_category.pk}})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.json()['results'][0]['errors'])
+        response = self.batch({'op': 'update', 'id': foreign_item.pk, 'data': {'name': 'mine'}})
+        self.assertEqual(response.json()['results'][0]['status'], 404)
+        # The category route only reaches its own items
+        response = self.batch({'op': 'delete', 'id': item.pk},
+                              url=f"/api/checklists/{self.checklist.pk}/categories/{self.other.pk}/items/batch/")
+        self.assertEqual(response.json()['results'][0]['status'], 404)
+        self.assertEqual(self.rows(), before)
+        self.assertEqual(Item.objects.get(pk=foreign_item.pk).name, foreign_item.name)
+
+    def test_counters(self):
+        moved, deleted, toggled = self.category.items.order_by('position')
+        response = self.batch(
+            {'op': 'create', 'data': {'name': 'a', 'is_completed': True, 'category': self.other.pk}},
+            {'op': 'update', 'id': moved.pk, 'data': {'category': self.other.pk, 'is_completed': True}},
+            {'op': 'update', 'id': toggled.pk, 'data': {'is_completed': not toggled.is_completed}},
+            {'op': 'delete', 'id': deleted.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        created = response.json()['results'][0]
+        self.assertEqual(created['data'], {'id': created['id'], 'name': 'a', 'is_completed': True})
+        self.assertEqual(recount(dry_run=True), (0, 0))
+        self.category.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.category.item_count, self.category.completed_count), (1, int(not toggled.is_completed)))
+        self.assertEqual(self.other.item_count, 5)
+        self.assertEqual(list(self.other.items.order_by('position').values_list('pk', flat=True))[-2:],
+                         [created['id'], moved.pk])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def queries(n):
+            items = list(self.category.items.values_list('pk', flat=True))
+            operations = [{'op': 'create', 'data': {'name': f"n{i}"}} for i in range(n)] + [
+                {'op': 'update', 'id': pk, 'data': {'is_completed': True}} for pk in items
+            ]
+            url = f"/api/checklists/{self.checklist.pk}/categories/{self.category.pk}/items/batch/"
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.batch(*operations, url=url).status_code, 200)
+            return len(captured)
+
+        self.assertEqual(queries(2), queries(50))
+        self.assertEqual(recount(dry_run=True), (0, 0))
+
+
+class CounterTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 2, 2, 3, files=0)
+        self.login(owner)
+        self.checklist, self.second = owner.checklists.order_by('pk')
+        self.category, self.other = Category.objects.filter(checklist=self.checklist).order_by('position')
+
+    def items_url(self, category):
+        return f"/api/checklists/{category.checklist_id}/categories/{category.pk}/items/"
+
+    def assertCounted(self):
+        self.assertEqual(recount(dry_run=True), (0, 0))
+
+    def test_recount_repairs_drift(self):
+        Category.objects.filter(pk=self.category.pk).update(item_count=40, completed_count=-1)
+        Checklist.objects.filter(pk=self.checklist.pk).update(item_count=0)
+        Checklist.objects.filter(pk=self.second.pk).update(completed_count=9)
+        self.assertEqual(recount([self.checklist.pk], dry_run=True), (1, 1))
+        self.assertEqual(recount([self.checklist.pk]), (1, 1))
+        out = io.StringIO()
+        call_command('recount_checklists', stdout=out)
+        self.assertEqual(out.getvalue().strip(), "0 categories and 1 checklists repaired.")
+        self.assertCounted()
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.item_count, 3)
+
+    def test_writes_keep_counters(self):
+        item, second, third = self.category.items.order_by('position')
+        url = self.items_url(self.category)
+        response = self.client.post(url, {'name': 'new', 'is_completed': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertCounted()
+        for completed in (not item.is_completed, item.is_completed, item.is_completed):
+            response = self.client.patch(f"{url}{item.pk}/", {'is_completed': completed}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertCounted()
+        response = self.client.post(f"{url}{second.pk}/move/", {'category': self.other.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertCounted()
+        response = self.client.patch(f"{self.items_url(self.other)}{second.pk}/",
+                                     {'is_completed': not second.is_completed}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertCounted()
+        self.assertEqual(self.client.delete(f"{url}{third.pk}/").status_code, 204)
+        self.assertCounted()
+        response = self.client.delete(f"/api/checklists/{self.checklist.pk}/categories/{self.other.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertCounted()
+        self.checklist.refresh_from_db()
+        self.assertEqual(self.checklist.item_count, self.category.items.count())
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class DirectUploadTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 1, 1, files=0)
+        self.login(owner)
+        self.category = Category.objects.get(checklist__owner=owner)
+        self.url = f"/api/checklists/{self.category.checklist_id}/categories/{self.category.pk}/files/uploads/"
+
+    def upload(self, body):
+        upload = self.client.post(self.url, {'filename': 'notes.txt', 'size': len(body)}, format='json').json()
+        response = self.client.generic('PUT', upload['url'], body, content_type='text/plain')
+        self.assertEqual(response.status_code, 204)
+        return upload['key']
+
+    def test_upload(self):
+        key = self.upload(b'0123456789')
+        response = self.client.post(f"{self.url}complete/", {'key': key}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CategoryFile.objects.get(category=self.category).file.name, key)
+
+    def test_complete_needs_a_string_key(self):
+        for data in ({'key': 5}, {'key': ['a']}, {}, {'key': self.upload(b'0'), 'upload_id': 5}):
+            response = self.client.post(f"{self.url}complete/", data, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(CategoryFile.objects.exists())
+
+    def test_oversize_upload_is_reaped(self):
+        key = self.upload(b'0123456789')
+        with self.settings(UPLOAD_MAX_SIZE=5):
+            response = self.client.post(f"{self.url}complete/", {'key': key}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CategoryFile.objects.exists())
+        self.assertEqual(list(OrphanedFile.objects.values_list('key', flat=True)), [key])
+        self.assertEqual(reap_orphaned_files(), (1, 0))
+        self.assertFalse(default_storage.exists(key))
+
+
+class MultipartUploadTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 1, 1, files=0)
+        self.login(owner)
+        self.category = Category.objects.get(checklist__owner=owner)
+        self.url = f"/api/checklists/{self.category.checklist_id}/categories/{self.category.pk}/files/"
+
+    def upload(self):
+        return self.client.post(self.url, {'file': SimpleUploadedFile('notes.txt', b'same bytes')}, format='multipart')
+
+    def test_identical_uploads_share_a_blob(self):
+        self.assertEqual(self.upload().status_code, 201)
+        self.assertEqual(self.upload().status_code, 201)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(set(CategoryFile.objects.values_list('file', flat=True)), {blob.key})
+
+    def test_failed_save_releases_the_blob(self):
+        with mock.patch.object(CategoryFile, 'save', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            self.upload()
+        self.assertFalse(Blob.objects.exists())
+        [key] = OrphanedFile.objects.values_list('key', flat=True)
+        self.assertTrue(default_storage.exists(key))
+        self.assertEqual(reap_orphaned_files(), (1, 0))
+        self.assertFalse(default_storage.exists(key))
+
+    def test_failed_save_keeps_a_shared_blob(self):
+        self.assertEqual(self.upload().status_code, 201)
+        with mock.patch.object(CategoryFile, 'save', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            self.upload()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertEqual(reap_orphaned_files(), (0, 1))
+        self.assertTrue(default_storage.exists(Blob.objects.get().key))
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class ThrottleTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 1, 1, files=0)
+        self.login(owner)
+        category = Category.objects.get(checklist__owner=owner)
+        self.url = f"/api/checklists/{category.checklist_id}/categories/{category.pk}/files/uploads/"
+
+    def rates(self, **rates):
+        return self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+            **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates,
+        }})
+
+    def announce(self, size):
+        return self.client.post(self.url, {'filename': 'notes.txt', 'size': size}, format='json')
+
+    def test_read_bucket(self):
+        with self.rates(user_read='2/min'):
+            self.assertEqual(self.client.get('/api/checklists/').status_code, 200)
+            self.assertEqual(self.client.get('/api/checklists/').status_code, 200)
+            response = self.client.get('/api/checklists/')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 90)
+
+    def test_byte_quota(self):
+        with self.rates(user_upload_bytes='1K/hour'):
+            self.assertEqual(self.announce(600).status_code, 201)
+            response = self.announce(600)
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+            # The rejected upload took no bytes
+            self.assertEqual(self.announce(400).status_code, 201)
+            self.assertEqual(self.announce(100).status_code, 429)
+
+    def test_cache_counters_need_a_shared_cache(self):
+        with self.settings(THROTTLE_CACHE='default'), self.assertRaises(ImproperlyConfigured):
+            CacheCounters()
+
+
+class BenchmarkTests(APITestCase):
+
+    def test_generate_dataset(self):
+        owners = generate_dataset(2, 2, 3, 4, files=1)
+        self.assertEqual(len(owners), 2)
+        for owner in owners:
+            checklists = owner.checklists.order_by('id')
+            self.assertEqual(len(checklists), 2)
+            self.assertEqual(ShareLink.objects.filter(checklist__owner=owner).get().checklist, checklists[0])
+            for checklist in checklists:
+                categories = list(checklist.categories.order_by('position'))
+                self.assertEqual([category.name for category in categories], ['Category 0', 'Category 1', 'Category 2'])
+                items = list(categories[0].items.order_by('position'))
+                self.assertEqual([item.name for item in items], [f'Item {i}' for i in range(4)])
+                self.assertEqual(checklist.item_count, 12)
+                self.assertEqual(checklist.completed_count, Item.objects.filter(category__checklist=checklist, is_completed=True).count())
+        self.assertEqual(CategoryFile.objects.filter(category__checklist__owner=owners[0]).count(), 6)
+
+    def test_generate_dataset_is_reproducible(self):
+        completed = [
+            list(Item.objects.filter(category__checklist__owner=owner).order_by('id').values_list('is_completed', flat=True))
+            for [owner] in (generate_dataset(1, 1, 2, 10, seed=7), generate_dataset(1, 1, 2, 10, seed=7))
+        ]
+        self.assertEqual(completed[0], completed[1])
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual([percentile(samples, pct) for pct in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_compare(self):
+        baseline = {'results': {'list': {'p95_ms': 10, 'queries': 6}, 'share': {'p95_ms': 10, 'queries': 3}}}
+        report = {'results': {'list': {'p95_ms': 11, 'queries': 7}, 'share': {'p95_ms': 13, 'queries': 3},
+                              'search': {'p95_ms': 50, 'queries': 9}}}
+        self.assertEqual(compare(report, baseline), [('list', 'queries', 6, 7), ('share', 'p95_ms', 10, 13)])
+
+    def test_run_benchmark(self):
+        report = run_benchmark('small', iterations=2, warmup=0, only=['list', 'retrieve', 'share', 'clone'])
+        self.assertEqual(report['dataset']['items_per_user'], 10)
+        self.assertEqual(set(report['results']), {'list', 'retrieve', 'share', 'clone'})
+        for result in report['results'].values():
+            self.assertEqual(result['iterations'], 2)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['bytes'], 0)
+
+
+class MetricsEndpointTests(APITestCase):
+
+    @override_settings(DEBUG=False, PERF_METRICS_TOKEN='', PERF_METRICS_PUBLIC=False)
+    def test_closed_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(DEBUG=False, PERF_METRICS_TOKEN='', PERF_METRICS_PUBLIC=True)
+    def test_public(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(DEBUG=True, PERF_METRICS_TOKEN='secret', PERF_METRICS_PUBLIC=True)
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer sécret').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class AsyncReadViewTests(APITestCase):
+    """
+    Under ASGI the async list and detail views answer exactly as the sync
+    DRF views do.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.other = generate_dataset(2, 3, 2, 2, files=1)
+        auth = stub_auth()
+        mint = auth.__enter__()
+        self.addCleanup(auth.__exit__, None, None, None)
+        self.headers = {'Authorization': f"Bearer {mint(self.user.username)}"}
+        self.mine = self.user.checklists.first()
+        self.theirs = self.other.checklists.first()
+
+    async def assertSameResponse(self, path, headers=None):
+        headers = self.headers if headers is None else headers
+        client = AsyncClient()
+        with override_settings(ROOT_URLCONF='checklist.urls'):
+            expected = await client.get(path, headers=headers)
+        with override_settings(ROOT_URLCONF='checklist.async_urls'):
+            response = await client.get(path, headers=headers)
+        self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        return response
+
+    async def test_list(self):
+        url = '/api/checklists/?page_size=2'
+        pages = 0
+        while url:
+            response = await self.assertSameResponse(url)
+            self.assertEqual(response.status_code, 200)
+            url = response.json()['next']
+            pages += 1
+        self.assertEqual(pages, 2)
+        await self.assertSameResponse('/api/checklists/?fields=id,title')
+        self.assertEqual((await self.assertSameResponse('/api/checklists/?cursor=bad')).status_code, 400)
+
+    async def test_detail(self):
+        response = await self.assertSameResponse(f"/api/checklists/{self.mine.pk}/")
+        self.assertEqual(response.json()['id'], self.mine.pk)
+        self.assertEqual((await self.assertSameResponse(f"/api/checklists/{self.theirs.pk}/")).status_code, 404)
+        self.assertEqual((await self.assertSameResponse('/api/checklists/999999999/')).status_code, 404)
+
+    async def test_authentication(self):
+        for headers in ({}, {'Authorization': 'Bearer not-a-jwt'}, {'Authorization': 'Basic a b'}):
+            with self.subTest(headers=headers):
+                for url in ('/api/checklists/', f"/api/checklists/{self.mine.pk}/"):
+                    self.assertEqual((await self.assertSameResponse(url, headers)).status_code, 403)
+
+
+class ReplicaRoutingTests(APITestCase):
+    """
+    DATABASES cannot change within a test run, so `replica_1` is a name the
+    router hands out with its health check stubbed; each test asserts the
+    alias chosen for a read during the request.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._replicas = override_settings(DATABASE_REPLICAS=['replica_1'], CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared_checklists': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': f"{cls.media}/cache"},
+        })
+        cls._replicas.enable()
+        cls._healthy = mock.patch('checklist.dbrouter.healthy_replica', return_value='replica_1')
+        cls._healthy.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._healthy.stop()
+        cls._replicas.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def read_alias(self, method, user, status=200, **headers):
+        request = getattr(RequestFactory(), method)('/api/checklists/', headers=headers)
+        request.user = user
+        request.resolver_match = resolve('/api/checklists/')
+        aliases = []
+
+        def view(request):
+            aliases.append(ReplicaRouter().db_for_read(Checklist))
+            return HttpResponse(status=status)
+
+        ReplicaRoutingMiddleware(view)(request)
+        return aliases[0]
+
+    def test_safe_read_uses_the_replica(self):
+        self.assertEqual(self.read_alias('get', self.alice), 'replica_1')
+        self.assertEqual(self.read_alias('get', AnonymousUser()), 'replica_1')
+
+    def test_write_pins_the_user(self):
+        self.assertEqual(self.read_alias('post', self.alice), 'default')
+        self.assertEqual(self.read_alias('get', self.alice), 'default')
+        self.assertEqual(self.read_alias('get', self.bob), 'replica_1')
+
+    def test_failed_write_does_not_pin(self):
+        self.read_alias('post', self.alice, status=400)
+        self.assertEqual(self.read_alias('get', self.alice), 'replica_1')
+
+    def test_unauthenticated_write_does_not_pin(self):
+        # An unverified token naming alice must not move her reads
+        forged = 'eyJhbGciOiJub25lIn0.eyJzdWIiOiJhbGljZSJ9.'
+        self.read_alias('post', AnonymousUser(), status=401, authorization=f"Bearer {forged}")
+        self.read_alias('post', AnonymousUser(), authorization=f"Bearer {forged}")
+        self.assertEqual(self.read_alias('get', self.alice), 'replica_1')
+
+    def test_needs_a_shared_cache(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                                   'shared_checklists': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                ReplicaRoutingMiddleware(HttpResponse)
+
+
+class DeltaSyncTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 2, 3, files=0)
+        self.login(owner)
+        self.checklist = owner.checklists.get()
+        self.base = f"/api/checklists/{self.checklist.pk}"
+        self.category, self.other = Category.objects.filter(checklist=self.checklist).order_by('id')
+
+    def changes(self, since):
+        response = self.client.get(f"{self.base}/changes/", {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def version(self):
+        return Checklist.objects.values_list('version', flat=True).get(pk=self.checklist.pk)
+
+    def test_snapshot(self):
+        changes = self.changes(0)
+        self.assertEqual(changes['version'], self.version())
+        self.assertEqual(len(changes['upserts']['category']), 2)
+        self.assertEqual(len(changes['upserts']['item']), 6)
+        self.assertFalse(changes['reset'])
+
+    def test_item_delete(self):
+        since = self.version()
+        item = self.category.items.first()
+        response = self.client.delete(f"{self.base}/categories/{self.category.pk}/items/{item.pk}/")
+        self.assertEqual(response.status_code, 204)
+        changes = self.changes(since)
+        self.assertEqual(changes['deletes']['item'], [item.pk])
+        # The category's counters changed with it
+        self.assertEqual([category['id'] for category in changes['upserts']['category']], [self.category.pk])
+        self.assertEqual(changes['upserts']['item'], [])
+        self.assertEqual(self.changes(changes['version'])['deletes']['item'], [])
+
+    def test_category_delete_cascades(self):
+        since = self.version()
+        response = self.client.delete(f"{self.base}/categories/{self.category.pk}/")
+        self.assertEqual(response.status_code, 204)
+        changes = self.changes(since)
+        # Children go with their category; they get no tombstones of their own
+        self.assertEqual(changes['deletes']['category'], [self.category.pk])
+        self.assertEqual(changes['deletes']['item'], [])
+        self.assertEqual(changes['upserts']['category'], [])
+
+    def test_since_ahead_resets(self):
+        changes = self.changes(self.version() + 5)
+        self.assertTrue(changes['reset'])
+        self.assertEqual(len(changes['upserts']['item']), 6)
+
+    def test_pruned_tombstones_reset_older_clients(self):
+        since = self.version()
+        for item in self.category.items.all():
+            self.client.delete(f"{self.base}/categories/{self.category.pk}/items/{item.pk}/")
+        middle = self.version()
+        self.client.delete(f"{self.base}/categories/{self.other.pk}/")
+        Tombstone.objects.filter(kind='item').update(created_at=timezone.now() - timedelta(days=31))
+
+        # Savepoint, UPDATE, DELETE, release: tombstones are never loaded
+        with self.assertNumQueries(4):
+            self.assertEqual(prune_tombstones(), 3)
+        self.assertEqual(list(Tombstone.objects.values_list('kind', flat=True)), ['category'])
+        old = self.changes(since)
+        self.assertTrue(old['reset'])
+        self.assertEqual(old['deletes']['item'], [])
+        recent = self.changes(middle)
+        self.assertFalse(recent['reset'])
+        self.assertEqual(recent['deletes']['category'], [self.other.pk])
+        self.assertEqual(prune_tombstones(), 0)
+
+    @override_settings(TOMBSTONE_RETENTION_DAYS=1)
+    def test_workers_prune(self):
+        item = self.category.items.first()
+        self.client.delete(f"{self.base}/categories/{self.category.pk}/items/{item.pk}/")
+        Tombstone.objects.update(created_at=timezone.now() - timedelta(days=2))
+        worker = Worker(name='test')
+        # The worker recycles connections between jobs, which would end the test's transaction
+        with mock.patch('checklist.jobs.close_old_connections'):
+            worker.run(burst=True)
+            self.assertFalse(Tombstone.objects.exists())
+            # Not again until TOMBSTONE_PRUNE_INTERVAL has passed
+            with mock.patch('checklist.jobs.prune_tombstones') as prune:
+                worker.run(burst=True)
+        prune.assert_not_called()
+
+
+class ExportImportTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 3, 4, files=1)
+        self.login(owner)
+        self.checklist = owner.checklists.get()
+        Checklist.objects.filter(pk=self.checklist.pk).update(title='Trip, "day 1"', description='Pack light')
+
+    def export(self, format):
+        response = self.client.get(f"/api/checklists/{self.checklist.pk}/export/", {'format': format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def import_(self, body, content_type, **params):
+        url = '/api/checklists/import/' + (f"?{urlencode(params)}" if params else '')
+        response = self.client.generic('POST', url, body, content_type=content_type)
+        self.assertEqual(response.status_code, 201, response.content)
+        return Checklist.objects.get(pk=response.json()['id'])
+
+    def contents(self, checklist):
+        return [
+            (category.name, category.item_count, category.completed_count,
+             list(category.items.order_by('position').values_list('name', 'is_completed')))
+            for category in checklist.categories.order_by('position')
+        ]
+
+    def assertRoundTrip(self, copy, title):
+        self.assertEqual(self.contents(copy), self.contents(self.checklist))
+        self.assertEqual((copy.title, copy.item_count, copy.completed_count),
+                         (title, self.checklist.item_count, self.checklist.completed_count))
+        self.assertEqual(recount([copy.pk], dry_run=True), (0, 0))
+        # Files stay with the source checklist
+        self.assertFalse(CategoryFile.objects.filter(category__checklist=copy).exists())
+
+    def test_ndjson(self):
+        copy = self.import_(self.export('ndjson'), 'application/x-ndjson')
+        self.assertRoundTrip(copy, 'Trip, "day 1"')
+        self.assertEqual(copy.description, 'Pack light')
+
+    def test_json(self):
+        copy = self.import_(self.export('json'), 'application/json')
+        self.assertRoundTrip(copy, 'Trip, "day 1"')
+        self.assertEqual(copy.description, 'Pack light')
+
+    def test_csv_has_no_title(self):
+        body = self.export('csv')
+        self.assertRoundTrip(self.import_(body, 'text/csv'), 'Imported checklist')
+        copy = self.import_(body, 'text/csv', title='Trip, "day 1"')
+        self.assertRoundTrip(copy, 'Trip, "day 1"')
+        self.assertEqual(copy.description, '')
+
+
+class SearchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.other = generate_dataset(2, 2, 2, 3, files=0)
+        self.login(self.user)
+        for owner in (self.user, self.other):
+            checklist = owner.checklists.first()
+            Checklist.objects.filter(pk=checklist.pk).update(title=f"Camping {owner.pk}")
+            category = checklist.categories.first()
+            Category.objects.filter(pk=category.pk).update(name='Camp kitchen')
+            Item.objects.filter(category=category).update(name='Camp stove')
+
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_only_own_checklists(self):
+        hits = self.search(q='camp')
+        own = set(self.user.checklists.values_list('id', flat=True))
+        self.assertEqual({hit['type'] for hit in hits}, {'checklist', 'category', 'item'})
+        self.assertEqual(len(hits), 1 + 1 + 3)
+        for hit in hits:
+            self.assertIn(hit['id'] if hit['type'] == 'checklist' else hit['checklist']['id'], own)
+        # Share links make a checklist public by URL, not searchable by others
+        self.login(self.other)
+        self.assertNotIn(self.user.checklists.first().pk, [hit['id'] for hit in self.search(q='camping')])
+        self.assertEqual(len(self.search(q='camp')), 5)
+
+    def test_query_count(self):
+        with self.assertNumQueries(3):
+            self.search(q='camp stove')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.search(q='stove', type='item')), 3)
+        Item.objects.filter(category__checklist__owner=self.user).update(name='Camp stove')
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.search(q='camp', limit=100)), 1 + 1 + 12)
+
+
+class JobTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [self.owner] = generate_dataset(1, 1, 2, 3, files=1)
+        self.checklist = self.owner.checklists.get()
+        # The worker recycles connections between jobs, which would end the test's transaction
+        patcher = mock.patch('checklist.jobs.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_claim(self):
+        first, second = enqueue('clone', self.owner), enqueue('export', self.owner)
+        later = enqueue('clone', self.owner)
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now() + timedelta(hours=1))
+        a, b = Worker(name='a'), Worker(name='b')
+        claimed = a.claim()
+        self.assertEqual((claimed.pk, claimed.status, claimed.locked_by, claimed.attempts),
+                         (first.pk, Job.RUNNING, 'a', 1))
+        self.assertEqual(b.claim().pk, second.pk)
+        # The third job is not due yet
+        self.assertIsNone(b.claim())
+
+    def test_claim_by_kind(self):
+        enqueue('clone', self.owner)
+        export = enqueue('export', self.owner)
+        self.assertEqual(Worker(name='a', kinds=['export']).claim().pk, export.pk)
+        self.assertIsNone(Worker(name='b', kinds=['export']).claim())
+
+    def test_retry_then_fail(self):
+        job = enqueue('boom', self.owner)
+        worker = Worker(name='a')
+        with mock.patch.dict(HANDLERS, {'boom': mock.Mock(side_effect=RuntimeError('flaky'))}):
+            for attempt in range(1, job.max_attempts + 1):
+                Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+                with self.assertLogs('checklist.jobs', 'ERROR'):
+                    self.assertEqual(worker.run(burst=True), 1)
+                job.refresh_from_db()
+                self.assertEqual((job.attempts, job.error), (attempt, 'RuntimeError: flaky'))
+                if attempt < job.max_attempts:
+                    self.assertEqual(job.status, Job.QUEUED)
+                    self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_stale_job_is_requeued(self):
+        job = enqueue('clone', self.owner, checklist_id=self.checklist.pk)
+        a, b = Worker(name='a'), Worker(name='b')
+        job = a.claim()
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=601))
+        b.requeue_stale()
+        requeued = Job.objects.get(pk=job.pk)
+        self.assertEqual((requeued.status, requeued.locked_by), (Job.QUEUED, ''))
+        # The stalled worker can no longer finish it
+        self.assertEqual(a.finish(job, Job.SUCCEEDED), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.QUEUED)
+
+    def test_clone(self):
+        job = enqueue('clone', self.owner, checklist_id=self.checklist.pk, title='Copy')
+        Worker(name='a').run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        clone = Checklist.objects.get(pk=job.result['checklist_id'])
+        self.assertEqual((clone.title, clone.item_count), ('Copy', self.checklist.item_count))
+
+    def test_requeued_clone_is_not_cloned_twice(self):
+        job = enqueue('clone', self.owner, checklist_id=self.checklist.pk)
+        a, b = Worker(name='a'), Worker(name='b')
+        # The first attempt commits its clone, then stalls before finishing
+        first = clone_job(a.claim())
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=601))
+        b.requeue_stale()
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        b.run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), (Job.SUCCEEDED, 2, first))
+        self.assertEqual(self.owner.checklists.count(), 2)
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 2, 2, files=1)
+        self.login(owner)
+        self.url = f"/api/checklists/{owner.checklists.get().pk}/"
+
+    def test_fields(self):
+        data = self.client.get(self.url, {'fields': 'id,title,categories.items.is_completed'}).json()
+        self.assertEqual(set(data), {'id', 'title', 'categories'})
+        self.assertEqual(set(data['categories'][0]), {'items'})
+        self.assertEqual(data['categories'][0]['items'], [{'is_completed': item['is_completed']}
+                                                          for item in data['categories'][0]['items']])
+
+    def test_exclude(self):
+        full = self.client.get(self.url).json()
+        data = self.client.get(self.url, {'exclude': 'description,categories.items.files'}).json()
+        self.assertNotIn('description', data)
+        self.assertEqual(set(data['categories'][0]['items'][0]), set(full['categories'][0]['items'][0]) - {'files'})
+        self.assertIn('files', data['categories'][0])
+
+    def test_list(self):
+        data = self.client.get('/api/checklists/', {'fields': 'id,title'}).json()
+        self.assertEqual([set(checklist) for checklist in data['results']], [{'id', 'title'}])
+
+    def test_fewer_queries(self):
+        with CaptureQueriesContext(connection) as full:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as sparse:
+            self.assertEqual(self.client.get(self.url, {'fields': 'id,title'}).status_code, 200)
+        self.assertLess(len(sparse), len(full))
+
+    def test_invalid(self):
+        for params in ({'fields': 'nope'}, {'fields': 'title.length'}, {'exclude': 'categories.nope'},
+                       {'fields': 'id,,categories..items'}):
+            with self.subTest(**params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+
+class RendererTests(TestCase):
+
+    def test_fast_json_matches_drf(self):
+        data = {
+            'when': timezone.now(), 'day': timezone.now().date(), 'amount': Decimal('1.10'),
+            'name': gettext_lazy('Checklist'), 'text': 'line\u2028break\u2029é', 'big': 2 ** 70,
+            'nested': [{'id': 1, 'uuid': uuid.uuid4()}], 1: None,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_uses_drf(self):
+        data = {'id': 1, 'title': 'Checklist'}
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+
+class DeleteChecklistTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 2, 1, 1, files=0)
+        self.login(owner)
+        self.doomed, self.kept = owner.checklists.order_by('id')
+        self.token = ShareLink.objects.get(checklist=self.doomed).token
+
+    def upload(self, checklist, content, item=False):
+        category = checklist.categories.get()
+        url = f"/api/checklists/{checklist.pk}/categories/{category.pk}/"
+        url += f"items/{category.items.get().pk}/files/" if item else "files/"
+        response = self.client.post(url, {'file': SimpleUploadedFile('notes.txt', content)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Blob.objects.get(ref_count__gte=1, sha256=hashlib.sha256(content).hexdigest()).key
+
+    def test_delete(self):
+        shared = self.upload(self.doomed, b'shared')
+        self.upload(self.doomed, b'shared', item=True)
+        self.upload(self.kept, b'shared')
+        unshared = self.upload(self.doomed, b'only here', item=True)
+        self.assertEqual(self.client.get(f"/api/share/{self.token}/").status_code, 200)
+        self.assertIsNotNone(shared_cache().get(_token_key(self.token)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/checklists/{self.doomed.pk}/")
+        self.assertEqual(response.status_code, 204)
+
+        self.assertFalse(Checklist.objects.filter(pk=self.doomed.pk).exists())
+        self.assertFalse(ShareLink.objects.filter(token=self.token).exists())
+        self.assertFalse(Tombstone.objects.filter(checklist_id=self.doomed.pk).exists())
+        # One outbox row per table and key, carrying the references the rows held
+        self.assertEqual(sorted(OrphanedFile.objects.values_list('key', 'refs')),
+                         sorted([(shared, 1), (shared, 1), (unshared, 1)]))
+        self.assertIsNone(shared_cache().get(_token_key(self.token)))
+        self.assertEqual(self.client.get(f"/api/share/{self.token}/").status_code, 404)
+
+        self.assertEqual(reap_orphaned_files(), (1, 1))
+        self.assertFalse(OrphanedFile.objects.exists())
+        self.assertEqual(Blob.objects.get(key=shared).ref_count, 1)
+        self.assertFalse(Blob.objects.filter(key=unshared).exists())
+        self.assertTrue(default_storage.exists(shared))
+        self.assertFalse(default_storage.exists(unshared))
+        self.assertEqual(self.kept.categories.get().files.get().file.name, shared)
+
+
+class FrozenClock(datetime.datetime):
+
+    @classmethod
+    def utcnow(cls):
+        return datetime.datetime(2026, 10, 18, 12, 0, 0)
+
+
+class PresignBatchTests(SimpleTestCase):
+    """
+    S3Storage.urls() signs all but the first URL itself; each must equal
+    what botocore returns from url(), and from a client's own
+    generate_presigned_url(), at the same instant.
+    """
+    names = [
+        'a.pdf', 'item_files/1/x+y z.pdf', 'naïve/файл.pdf', 'q?#&.txt',
+        'star*.txt', "quote'(!).txt", 'tilde~/a', 'two  spaces',
+    ]
+
+    def storage(self, **options):
+        return S3Storage(**{
+            'access_key': 'AKIDEXAMPLE', 'secret_key': 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY',
+            'bucket_name': 'bucket', 'region_name': 'eu-west-1', 'custom_domain': None, 'querystring_auth': True,
+            **options,
+        })
+
+    def assertMatchesBotocore(self, storage):
+        with mock.patch('botocore.auth.datetime.datetime', FrozenClock):
+            batch = storage.urls(self.names)
+            single = {name: storage.url(name) for name in self.names}
+        self.assertEqual(batch, single)
+        # And each equals what a client of its own presigns, byte for byte
+        client = boto3.session.Session(
+            aws_access_key_id=storage.access_key, aws_secret_access_key=storage.secret_key,
+            aws_session_token=storage.security_token, region_name=storage.region_name,
+        ).client('s3', config=botocore.config.Config(signature_version='s3v4'))
+        with mock.patch('botocore.auth.datetime.datetime', FrozenClock):
+            presigned = {name: client.generate_presigned_url('get_object', ExpiresIn=storage.querystring_expire, Params={
+                'Bucket': 'bucket', 'Key': f"{storage.location}/{name}" if storage.location else name,
+            }) for name in self.names}
+        self.assertEqual(batch, presigned)
+
+    def test_urls(self):
+        self.assertMatchesBotocore(self.storage())
+
+    def test_security_token(self):
+        self.assertMatchesBotocore(self.storage(security_token='FwoGZXIvYXdzEJr//////////wEaDL+token/=='))
+
+    def test_location(self):
+        self.assertMatchesBotocore(self.storage(location='media/sub', security_token='FwoGZXIvYXdzEJr'))
+
+    def test_unsigned(self):
+        storage = self.storage(custom_domain='cdn.example.com')
+        self.assertEqual(storage.urls(self.names), {name: storage.url(name) for name in self.names})
+
+
+class S3UploadBackendTests(SimpleTestCase):
+    """
+    Upload URLs sign the announced size, so S3 refuses a body larger than
+    the byte quota was charged for.
+    """
+
+    def setUp(self):
+        storage = S3Storage(
+            access_key='AKIDEXAMPLE', secret_key='wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY',
+            bucket_name='bucket', region_name='eu-west-1', custom_domain=None, querystring_auth=True,
+        )
+        self.backend = S3UploadBackend(storage)
+
+    def signed_headers(self, url):
+        return parse_qs(urlsplit(url).query)['X-Amz-SignedHeaders'][0].split(';')
+
+    def test_put(self):
+        upload = self.backend.create_upload('a/notes.txt', 'text/plain', 10)
+        self.assertIn('content-length', self.signed_headers(upload['url']))
+        self.assertEqual(upload['headers']['Content-Length'], '10')
+
+    @override_settings(UPLOAD_MULTIPART_THRESHOLD=10, UPLOAD_PART_SIZE=4)
+    def test_parts(self):
+        with mock.patch.object(self.backend.client, 'create_multipart_upload', return_value={'UploadId': 'u'}), \
+                mock.patch.object(self.backend.client, 'generate_presigned_url',
+                                  wraps=self.backend.client.generate_presigned_url) as presign:
+            upload = self.backend.create_upload('a/notes.txt', 'text/plain', 10)
+        self.assertEqual([call.kwargs['Params']['ContentLength'] for call in presign.call_args_list], [4, 4, 2])
+        for part in upload['parts']:
+            self.assertIn('content-length', self.signed_headers(part['url']))
+
+
+@override_settings(ROOT_URLCONF='checklist.async_urls', EVENT_STREAM_HEARTBEAT=0.1,
+                   EVENT_BROKER='checklist.events.LocalBroker')
+class SharedChecklistEventsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 1, 2, files=0)
+        self.login(owner)
+        self.checklist = owner.checklists.get()
+        self.token = ShareLink.objects.get(checklist=self.checklist).token
+        self.url = f"/api/share/{self.token}/events/"
+        # Deliveries run on the test's connection, which must stay open
+        patcher = mock.patch('checklist.events.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def read(self, response, count):
+        """
+        The next `count` events of a stream, as dicts of their fields.
+        """
+        events = []
+        while len(events) < count:
+            chunk = await asyncio.wait_for(anext(response.streaming_content), 5)
+            for block in chunk.decode().split('\n\n'):
+                fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and line[0] != ':')
+                if 'event' in fields:
+                    events.append(fields)
+        return events
+
+    def write(self, *paths, method='patch', **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            for path in paths:
+                response = getattr(self.client, method)(path, data, format='json')
+                self.assertLess(response.status_code, 400)
+
+    def complete(self, *items):
+        base = f"/api/checklists/{self.checklist.pk}/categories/{items[0].category_id}/items/"
+        self.write(*(f"{base}{item.pk}/" for item in items), is_completed=True)
+
+    async def test_event_after_write(self):
+        first, second = [item async for item in Item.objects.filter(category__checklist=self.checklist).order_by('id')]
+        response = await AsyncClient().get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        [snapshot] = await self.read(response, 1)
+        self.assertEqual(snapshot['event'], 'changes')
+        self.assertEqual(len(json.loads(snapshot['data'])['upserts']['item']), 2)
+
+        await sync_to_async(self.complete)(first)
+        [change] = await self.read(response, 1)
+        data = json.loads(change['data'])
+        self.assertEqual((data['since'], int(change['id'])), (int(snapshot['id']), data['version']))
+        self.assertEqual([(item['id'], item['is_completed']) for item in data['upserts']['item']], [(first.pk, True)])
+        await response.streaming_content.aclose()
+
+    async def test_resume_from_last_event_id(self):
+        first, second = [item async for item in Item.objects.filter(category__checklist=self.checklist).order_by('id')]
+        version = (await Checklist.objects.aget(pk=self.checklist.pk)).version
+        # Written while the client was away
+        await sync_to_async(self.complete)(second)
+        response = await AsyncClient().get(self.url, headers={'Last-Event-ID': str(version)})
+        [change] = await self.read(response, 1)
+        data = json.loads(change['data'])
+        self.assertEqual(data['since'], version)
+        self.assertEqual([item['id'] for item in data['upserts']['item']], [second.pk])
+        await response.streaming_content.aclose()
+
+    async def test_gone_after_revoke(self):
+        response = await AsyncClient().get(self.url)
+        await self.read(response, 1)
+        await sync_to_async(self.write)(f"/api/checklists/{self.checklist.pk}/share/revoke/", method='post',
+                                         token=str(self.token))
+        [gone] = await self.read(response, 1)
+        self.assertEqual(gone['event'], 'gone')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(response.streaming_content)
+
+    async def test_gone_after_delete(self):
+        response = await AsyncClient().get(self.url)
+        await self.read(response, 1)
+        await sync_to_async(self.write)(f"/api/checklists/{self.checklist.pk}/", method='delete')
+        [gone] = await self.read(response, 1)
+        self.assertEqual(gone['event'], 'gone')
+
+
+class OrderingTests(SimpleTestCase):
+
+    def test_append_and_prepend(self):
+        keys = [key_between(None, None)]
+        for _ in range(5000):
+            keys.append(key_between(keys[-1], None))
+        for _ in range(5000):
+            keys.insert(0, key_between(None, keys[0]))
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertLessEqual(max(map(len, keys)), 4)
+
+    def test_insert_into_one_gap(self):
+        rng = random.Random(0)
+        keys = keys_between(None, None, 3)
+        for _ in range(2000):
+            i = rng.randrange(len(keys) + 1)
+            keys.insert(i, key_between(keys[i - 1] if i else None, keys[i] if i < len(keys) else None))
+        self.assertEqual(keys, sorted(keys))
+        low, high = keys[0], keys[1]
+        for _ in range(60):
+            high = key_between(low, high)
+        self.assertLess(low, high)
+
+    def test_keys_between(self):
+        for a, b, n in ((None, None, 10), ('a0', 'a1', 100), ('a0', None, 5), (None, 'a0', 5), ('a0', 'a0V', 7)):
+            with self.subTest(a=a, b=b):
+                keys = keys_between(a, b, n)
+                self.assertEqual(len(set(keys)), n)
+                self.assertEqual(keys, sorted(keys))
+                self.assertTrue(a is None or a < keys[0])
+                self.assertTrue(b is None or keys[-1] < b)
+
+    def test_invalid(self):
+        for a, b in (('a1', 'a0'), ('a0', 'a0'), ('', None), ('a10', None), ('!', None)):
+            with self.subTest(a=a, b=b), self.assertRaises(ValueError):
+                key_between(a, b)
+
+    def test_migration_backfill_matches_key_between(self):
+        next_key = importlib.import_module('checklist.migrations.0010_positions').next_key
+        key = expected = None
+        for _ in range(70000):
+            key, expected = next_key(key), key_between(expected, None)
+            self.assertEqual(key, expected)
+
+
+class MoveTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        [owner] = generate_dataset(1, 1, 2, 3, files=0)
+        self.login(owner)
+        self.checklist = owner.checklists.get()
+        self.category, self.other = Category.objects.filter(checklist=self.checklist).order_by('position')
+        self.items = list(self.category.items.order_by('position'))
+
+    def move(self, item, **data):
+        return self.client.post(
+            f"/api/checklists/{self.checklist.pk}/categories/{item.category_id}/items/{item.pk}/move/",
+            data, format='json',
+        )
+
+    def order(self, category):
+        return list(category.items.order_by('position').values_list('pk', flat=True))
+
+    def test_move_item(self):
+        first, second, third = self.items
+        self.assertEqual(self.move(third, before=first.pk).status_code, 200)
+        self.assertEqual(self.order(self.category), [third.pk, first.pk, second.pk])
+        self.assertEqual(self.move(third, after=first.pk).status_code, 200)
+        self.assertEqual(self.order(self.category), [first.pk, third.pk, second.pk])
+        self.assertEqual(self.move(first).status_code, 200)
+        self.assertEqual(self.order(self.category), [third.pk, second.pk, first.pk])
+        # The tree read follows the keys
+        data = self.client.get(f"/api/checklists/{self.checklist.pk}/").json()
+        self.assertEqual([item['id'] for item in data['categories'][0]['items']], self.order(self.category))
+
+    def test_move_item_to_another_category(self):
+        first = self.items[0]
+        target = self.other.items.order_by('position').first()
+        self.assertEqual(self.move(first, category=self.other.pk, before=target.pk).status_code, 200)
+        self.assertEqual(self.order(self.other)[:2], [first.pk, target.pk])
+        self.assertEqual(Category.objects.get(pk=self.other.pk).item_count, 4)
+        self.assertEqual(Category.objects.get(pk=self.category.pk).item_count, 2)
+
+    def test_move_category(self):
+        url = f"/api/checklists/{self.checklist.pk}/categories/{self.other.pk}/move/"
+        self.assertEqual(self.client.post(url, {'before': self.category.pk}, format='json').status_code, 200)
+        self.assertEqual(list(self.checklist.categories.order_by('position').values_list('pk', flat=True)),
+                         [self.other.pk, self.category.pk])
+
+    def test_invalid_move(self):
+        first, second, _ = self.items
+        foreign = self.other.items.first()
+        for data in ({'before': foreign.pk}, {'after': 'x'}, {'category': 0}, {'before': second.pk, 'after': second.pk}):
+            with self.subTest(**data):
+                self.assertEqual(self.move(first, **data).status_code, 400)
+        self.assertEqual(self.order(self.category), [item.pk for item in self.items])
@@ -0,0 +1,281 @@
+import functools
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache import acache
+
+_counters = None
+
+_RATE = re.compile(r'(\d+)([KMG]?)/(\d*)([smhd])[a-z]*')
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def throttle_counters():
+    """
+    The process-wide counters from THROTTLE_COUNTERS.
+    """
+    global _counters
+    if _counters is None:
+        _counters = import_string(getattr(settings, 'THROTTLE_COUNTERS', 'checklist.throttling.CacheCounters'))()
+    return _counters
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _counters
+    if setting in ('THROTTLE_COUNTERS', 'THROTTLE_CACHE', 'CACHES'):
+        _counters = None
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_rate(rate):
+    match = _RATE.fullmatch(rate.replace(' ', ''))
+    if match is None:
+        return None
+    size, unit, periods, period = match.groups()
+    return int(size) * _UNITS[unit], int(periods or 1) * _PERIODS[period]
+
+
+class LocMemCounters:
+    """
+    Counters in a dict of this process, for a single worker and for tests.
+    """
+
+    def __init__(self):
+        self._counts = {}  # key -> [count, expires at]
+        self._lock = threading.Lock()
+        self._sweep_at = 1024
+
+    def get(self, key):
+        entry = self._counts.get(key)
+        return entry[0] if entry is not None and entry[1] > time.monotonic() else 0
+
+    def incr(self, key, amount, timeout):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None or entry[1] <= now:
+                if len(self._counts) >= self._sweep_at:
+                    self._sweep(now)
+                entry = self._counts[key] = [0, now + timeout]
+            entry[0] += amount
+            return entry[0]
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aincr(self, key, amount, timeout):
+        return self.incr(key, amount, timeout)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    def _sweep(self, now):
+        self._counts = {key: entry for key, entry in self._counts.items() if entry[1] > now}
+        self._sweep_at = max(2 * len(self._counts), 1024)
+
+
+class CacheCounters:
+    """
+    Counters in the THROTTLE_CACHE cache, shared by every worker. Needs a
+    backend with atomic incr(), i.e. Redis (INCRBY) or Memcached.
+    """
+
+    def __init__(self):
+        alias = getattr(settings, 'THROTTLE_CACHE', 'throttle')
+        self.cache = caches[alias]
+        # Locmem is per-process, and the other backends' incr() is a get and a set
+        if isinstance(self.cache, LocMemCache) or type(self.cache).incr is BaseCache.incr:
+            raise ImproperlyConfigured(
+                f"THROTTLE_CACHE {alias!r} must be Redis or Memcached, not {type(self.cache).__name__}."
+            )
+
+    def get(self, key):
+        return self.cache.get(key, 0)
+
+    def incr(self, key, amount, timeout):
+        try:
+            return self.cache.incr(key, amount)
+        except ValueError:
+            # First hit of the window; if another worker adds it first, count on theirs
+            self.cache.add(key, 0, timeout)
+            return self.cache.incr(key, amount)
+
+    async def aget(self, key):
+        return await acache(self.cache, 'get', key, 0)
+
+    async def aincr(self, key, amount, timeout):
+        try:
+            return await acache(self.cache, 'incr', key, amount)
+        except ValueError:
+            await acache(self.cache, 'add', key, 0, timeout)
+            return await acache(self.cache, 'incr', key, amount)
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    A token bucket per client and scope. A rate "<size>/<period>" (e.g.
+    "120/m", "1G/h") gives a bucket of <size> tokens that refills over
+    <period>. A request takes one token, or with `bytes` its upload size in
+    bytes; an upload larger than the bucket needs a full one.
+
+    The scope is `<principal>_read` for safe methods and `<principal>_upload`
+    (`_upload_bytes` with `bytes`) for writes to views with `upload_size()`.
+    Other requests, and scopes without a rate, are not throttled.
+
+    A bucket is approximated by one counter per <period> window: the tokens
+    in use are the current window's count plus the previous one's, scaled by
+    the part of it still within <period>. Bursts of up to <size> pass, and
+    sustained traffic gets at most <size> per <period>. Each request is one
+    atomic increment and one read in throttle_counters(), never a
+    read-modify-write, so concurrent requests on any number of workers
+    cannot lose each other's counts.
+    """
+    principal = None
+    bytes = False
+
+    def __init__(self):
+        # The scope and rate depend on the request
+        self.wait_time = None
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope) or None
+
+    def parse_rate(self, rate):
+        parsed = _parse_rate(rate)
+        if parsed is None:
+            raise ImproperlyConfigured(f"Invalid throttle rate {rate!r} for {self.scope}.")
+        return parsed
+
+    def action(self, request, view):
+        if request.method in SAFE_METHODS:
+            return 'read'
+        if hasattr(view, 'upload_size'):
+            return 'upload'
+        return None
+
+    def allow_request(self, request, view):
+        if not self.prepare(request, view):
+            return True
+        counters = throttle_counters()
+        previous = counters.get(self.previous_key)
+        if self.admit(previous, counters.incr(self.key, self.cost, self.timeout)):
+            return True
+        # Rejected requests take no tokens
+        counters.incr(self.key, -self.cost, self.timeout)
+        return False
+
+    async def aallow_request(self, request, view):
+        if not self.prepare(request, view):
+            return True
+        counters = throttle_counters()
+        previous = await counters.aget(self.previous_key)
+        if self.admit(previous, await counters.aincr(self.key, self.cost, self.timeout)):
+            return True
+        await counters.aincr(self.key, -self.cost, self.timeout)
+        return False
+
+    def prepare(self, request, view):
+        action = self.action(request, view)
+        if action is None or (self.bytes and action != 'upload'):
+            return False
+        self.scope = f"{self.principal}_{action}{'_bytes' if self.bytes else ''}"
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return False
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return False
+        cost = view.upload_size(request) if self.bytes else 1
+        if cost <= 0:
+            return False
+        self.cost = min(cost, self.num_requests)
+        window, self.elapsed = divmod(self.timer() / self.duration, 1)
+        self.key = f"{key}:{int(window)}"
+        self.previous_key = f"{key}:{int(window) - 1}"
+        # A window's count is read until the end of the next one
+        self.timeout = 2 * self.duration
+        return True
+
+    def admit(self, previous, current):
+        if previous * (1 - self.elapsed) + current <= self.num_requests:
+            return True
+        # Seconds until the previous window has drained enough for this request
+        current -= self.cost
+        room = self.num_requests - current - self.cost
+        if room >= 0:
+            self.wait_time = (1 - room / previous - self.elapsed) * self.duration
+        else:
+            # Not before the next window, where this window's count drains instead
+            self.wait_time = (2 - self.elapsed - (self.num_requests - self.cost) / current) * self.duration
+        return False
+
+    def wait(self):
+        return self.wait_time
+
+
+class ShareTokenThrottle(TokenBucketThrottle):
+    """
+    Buckets per share token on the public `/api/share/{token}/` routes, so
+    one leaked link cannot take more than its share of workers.
+    """
+    principal = 'share'
+
+    def get_cache_key(self, request, view):
+        token = getattr(view, 'share_token', None)
+        if not token:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': token}
+
+
+class IPThrottle(TokenBucketThrottle):
+    """
+    Buckets per client IP for anonymous requests. Behind proxies, set
+    NUM_PROXIES so the IP is taken from X-Forwarded-For.
+    """
+    principal = 'ip'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserThrottle(TokenBucketThrottle):
+    """
+    Buckets per authenticated user.
+    """
+    principal = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class ShareTokenBytesThrottle(ShareTokenThrottle):
+    bytes = True
+
+
+class IPBytesThrottle(IPThrottle):
+    bytes = True
+
+
+class UserBytesThrottle(UserThrottle):
+    bytes = True
@@ -0,0 +1,396 @@
+import codecs
+import csv
+import io
+import json
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from rest_framework.exceptions import ParseError
+
+from .counters import recount
+from .models import Checklist, Category, Item, CategoryFile, ItemFile
+from .ordering import key_between
+from .renderers import json_dumps
+from .serializer import ChecklistSerializer, CategoryFileSerializer, ItemFileSerializer
+
+EXPORT_FORMATS = ('ndjson', 'csv', 'json')
+CSV_COLUMNS = ('category_id', 'category', 'item_id', 'item', 'is_completed')
+# Bytes buffered before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+NAME_MAX_LENGTH = 200
+
+
+def export_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def import_batch_size():
+    return getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+
+
+def _dumps(value):
+    # Same encoding as FastJSONRenderer
+    return json_dumps(value).decode()
+
+
+def _chunked(pieces):
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+class _Run:
+    """
+    Walks rows ordered by `key(row)`, handing out the rows for each key in
+    turn. Rows for keys that were passed over (e.g. inserted mid-export) are
+    skipped, so keys must increase across the whole stream.
+    """
+
+    def __init__(self, rows, key):
+        self.rows = iter(rows)
+        self.key = key
+        self.head = next(self.rows, None)
+
+    def take(self, value):
+        while self.head is not None and self.key(self.head) < value:
+            self.head = next(self.rows, None)
+        while self.head is not None and self.key(self.head) == value:
+            row = self.head
+            self.head = next(self.rows, None)
+            yield row
+
+
+class Export:
+    """
+    One checklist as a stream of rows, read with chunked .iterator() queries
+    from the `using` database so memory stays flat for any size.
+    """
+
+    def __init__(self, checklist, context=None, using=None):
+        self.checklist = checklist
+        self.context = context or {}
+        self.using = using
+        self.category_file_field = CategoryFileSerializer(context=self.context).fields['file']
+        self.item_file_field = ItemFileSerializer(context=self.context).fields['file']
+
+    @classmethod
+    def for_checklists(cls, checklists, context=None):
+        """
+        Export of the single checklist in `checklists`, or None when it does not exist.
+        """
+        row = checklists.prefetch_related(None).values(
+            'id', 'title', 'description', 'created_at', 'owner', 'item_count', 'completed_count'
+        ).first()
+        if row is None:
+            return None
+        row['created_at'] = ChecklistSerializer(context=context).fields['created_at'].to_representation(
+            row['created_at']
+        )
+        return cls(row, context, checklists.db)
+
+    def _rows(self, queryset, *fields):
+        return queryset.using(self.using).values(*fields).iterator(chunk_size=export_chunk_size())
+
+    def categories(self):
+        return self._rows(
+            Category.objects.filter(checklist_id=self.checklist['id']).order_by('position', 'id'),
+            'id', 'name', 'item_count', 'completed_count', 'position',
+        )
+
+    def items(self):
+        return self._rows(
+            # Children in their parents' order, so _json and _csv can walk them alongside
+            Item.objects.filter(category__checklist_id=self.checklist['id']).order_by(
+                'category__position', 'category_id', 'position', 'id'
+            ),
+            'id', 'category_id', 'name', 'is_completed', 'position',
+        )
+
+    def category_files(self):
+        return self._rows(
+            CategoryFile.objects.filter(category__checklist_id=self.checklist['id']).order_by(
+                'category__position', 'category_id', 'id'
+            ),
+            'id', 'category_id', 'file',
+        )
+
+    def item_files(self):
+        return self._rows(
+            ItemFile.objects.filter(item__category__checklist_id=self.checklist['id']).order_by(
+                'item__category__position', 'item__category_id', 'item__position', 'item_id', 'id'
+            ),
+            'id', 'item__category_id', 'item_id', 'file',
+        )
+
+    def file_url(self, row, model, serializer_field):
+        # Same URLs as the serializers, as in tree._group_files
+        return serializer_field.to_representation(FieldFile(None, model._meta.get_field('file'), row['file']))
+
+    def stream(self, format):
+        return _chunked(getattr(self, f'_{format}')())
+
+    def _ndjson(self):
+        """
+        One JSON object per line, tagged with `type`: the checklist, then its
+        categories, items, category files and item files, each by id.
+        """
+        yield _dumps({'type': 'checklist', **self.checklist}) + "\n"
+        for row in self.categories():
+            yield _dumps({'type': 'category', **row}) + "\n"
+        for row in self.items():
+            yield _dumps({'type': 'item', 'id': row['id'], 'category': row['category_id'],
+                          'name': row['name'], 'is_completed': row['is_completed'],
+                          'position': row['position']}) + "\n"
+        for row in self.category_files():
+            yield _dumps({'type': 'category_file', 'id': row['id'], 'category': row['category_id'],
+                          'file': self.file_url(row, CategoryFile, self.category_file_field)}) + "\n"
+        for row in self.item_files():
+            yield _dumps({'type': 'item_file', 'id': row['id'], 'item': row['item_id'],
+                          'file': self.file_url(row, ItemFile, self.item_file_field)}) + "\n"
+
+    def _csv(self):
+        """
+        One row per item with its category; empty categories get a row without
+        an item. Lossy: the checklist's title, description and files are not
+        included.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def line(row):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            return buffer.getvalue()
+
+        yield line(CSV_COLUMNS)
+        items = _Run(self.items(), itemgetter('category_id'))
+        for category in self.categories():
+            empty = True
+            for item in items.take(category['id']):
+                empty = False
+                yield line((category['id'], category['name'], item['id'], item['name'],
+                            'true' if item['is_completed'] else 'false'))
+            if empty:
+                yield line((category['id'], category['name'], '', '', ''))
+
+    def _json(self):
+        """
+        The same document as GET /api/checklists/{id}/, written incrementally.
+        """
+        checklist = self.checklist
+        items = _Run(self.items(), itemgetter('category_id'))
+        item_files = _Run(self.item_files(), itemgetter('item__category_id', 'item_id'))
+        category_files = _Run(self.category_files(), itemgetter('category_id'))
+
+        yield '{' + _dumps({key: checklist[key] for key in ('id', 'title', 'description', 'created_at')})[1:-1]
+        yield ',"categories":['
+        for index, category in enumerate(self.categories()):
+            yield (',' if index else '') + '{' + _dumps({'id': category['id'], 'name': category['name']})[1:-1]
+            yield ',"items":['
+            for position, item in enumerate(items.take(category['id'])):
+                files = [
+                    {'id': row['id'], 'file': self.file_url(row, ItemFile, self.item_file_field)}
+                    for row in item_files.take((category['id'], item['id']))
+                ]
+                yield (',' if position else '') + _dumps({
+                    'id': item['id'], 'name': item['name'], 'is_completed': item['is_completed'], 'files': files,
+                    'position': item['position'],
+                })
+            files = [
+                {'id': row['id'], 'file': self.file_url(row, CategoryFile, self.category_file_field)}
+                for row in category_files.take(category['id'])
+            ]
+            yield '],"files":' + _dumps(files) + ','
+            yield _dumps({
+                'item_count': category['item_count'], 'completed_count': category['completed_count'],
+                'position': category['position'],
+            })[1:]
+        yield '],' + _dumps({key: checklist[key] for key in ('owner', 'item_count', 'completed_count')})[1:]
+
+
+def read_ndjson(stream):
+    """
+    Records from newline-delimited JSON, one line at a time.
+    """
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise ParseError(f"Line {number}: invalid JSON.")
+
+
+def read_csv(stream):
+    """
+    Records from CSV with `category` and `item` columns (as exported), one row
+    at a time. Rows are grouped into categories by `category_id` when present,
+    otherwise by category name; rows without an item only create the category.
+    There is no checklist record, so the import gets the default title.
+    """
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    try:
+        reader = csv.DictReader(lines)
+        if reader.fieldnames is None or not {'category', 'item'} <= set(reader.fieldnames):
+            raise ParseError("CSV needs a header with at least `category` and `item` columns.")
+        seen = set()
+        for row in reader:
+            key = row.get('category_id') or row['category']
+            if key not in seen:
+                seen.add(key)
+                yield {'type': 'category', 'id': key, 'name': row['category']}
+            if row['item']:
+                yield {'type': 'item', 'category': key, 'name': row['item'],
+                       'is_completed': _csv_flag(row.get('is_completed'), reader.line_num)}
+    except UnicodeDecodeError:
+        raise ParseError("CSV must be UTF-8 encoded.")
+    except csv.Error as e:
+        raise ParseError(f"Invalid CSV: {e}")
+
+
+def _csv_flag(value, line):
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'false', 'no'):
+        return False
+    if value in ('1', 'true', 'yes'):
+        return True
+    raise ParseError(f"Line {line}: is_completed must be true or false.")
+
+
+def tree_records(data):
+    """
+    Records from a document shaped like GET /api/checklists/{id}/.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('categories', []), list):
+        raise ParseError("Expected a checklist object with a `categories` list.")
+    yield {'type': 'checklist', 'title': data.get('title'), 'description': data.get('description', '')}
+    for index, category in enumerate(data.get('categories', [])):
+        if not isinstance(category, dict) or not isinstance(category.get('items', []), list):
+            raise ParseError(f"Category {index}: expected an object with an `items` list.")
+        yield {'type': 'category', 'id': index, 'name': category.get('name')}
+        for item in category.get('items', []):
+            if not isinstance(item, dict):
+                raise ParseError(f"Category {index}: items must be objects.")
+            yield {'type': 'item', 'category': index, 'name': item.get('name'),
+                   'is_completed': item.get('is_completed', False)}
+
+
+def import_checklist(records, owner, title=None):
+    """
+    Create a new checklist for `owner` from a stream of export records
+    (see Export._ndjson), inserting categories and items with bulk_create in
+    batches of IMPORT_BATCH_SIZE inside one transaction. File records are
+    skipped. A bad record raises ParseError and nothing is kept.
+    Returns the checklist.
+    """
+    importer = _Importer(owner, title, import_batch_size())
+    with transaction.atomic():
+        for number, record in enumerate(records, 1):
+            importer.add(number, record)
+        return importer.finish()
+
+
+class _Importer:
+    def __init__(self, owner, title, batch_size):
+        self.owner = owner
+        self.title = title
+        self.batch_size = batch_size
+        self.checklist = None
+        self.category_ids = {}
+        self.pending_categories = {}
+        self.pending_items = []
+        # Last order key given out, for categories and per category for items; records keep their order
+        self.category_position = None
+        self.item_positions = {}
+
+    def add(self, number, record):
+        if not isinstance(record, dict):
+            raise ParseError(f"Record {number}: expected an object.")
+        kind = record.get('type')
+        if kind == 'checklist':
+            if self.checklist is not None:
+                raise ParseError(f"Record {number}: only one checklist can be imported at a time.")
+            self.create_checklist(number, record)
+        elif kind == 'category':
+            self.add_category(number, record)
+        elif kind == 'item':
+            self.add_item(number, record)
+        elif kind not in ('category_file', 'item_file'):
+            raise ParseError(f"Record {number}: unknown type {kind!r}.")
+
+    def create_checklist(self, number, record=None):
+        record = record or {}
+        description = record.get('description') or ''
+        if not isinstance(description, str):
+            raise ParseError(f"Record {number}: description must be a string.")
+        self.checklist = Checklist.objects.create(
+            owner=self.owner, description=description,
+            title=self.title or _name(record.get('title') or "Imported checklist", number, 'title'),
+        )
+
+    def add_category(self, number, record):
+        if self.checklist is None:
+            self.create_checklist(number)
+        source_id = record.get('id')
+        if source_id is None or not isinstance(source_id, (int, str)):
+            raise ParseError(f"Record {number}: category needs an id.")
+        if source_id in self.category_ids or source_id in self.pending_categories:
+            raise ParseError(f"Record {number}: duplicate category id {source_id!r}.")
+        self.category_position = key_between(self.category_position, None)
+        self.pending_categories[source_id] = Category(
+            checklist=self.checklist, name=_name(record.get('name'), number), position=self.category_position,
+        )
+        if len(self.pending_categories) >= self.batch_size:
+            self.flush_categories()
+
+    def add_item(self, number, record):
+        source_id = record.get('category')
+        if isinstance(source_id, (int, str)) and source_id in self.pending_categories:
+            self.flush_categories()
+        category_id = self.category_ids.get(source_id) if isinstance(source_id, (int, str)) else None
+        if category_id is None:
+            raise ParseError(f"Record {number}: unknown category {source_id!r}.")
+        is_completed = record.get('is_completed', False)
+        if not isinstance(is_completed, bool):
+            raise ParseError(f"Record {number}: is_completed must be true or false.")
+        position = self.item_positions[category_id] = key_between(self.item_positions.get(category_id), None)
+        self.pending_items.append(Item(category_id=category_id, name=_name(record.get('name'), number),
+                                       is_completed=is_completed, position=position))
+        if len(self.pending_items) >= self.batch_size:
+            self.flush_items()
+
+    def flush_categories(self):
+        created = Category.objects.bulk_create(list(self.pending_categories.values()))
+        for source_id, category in zip(self.pending_categories, created):
+            self.category_ids[source_id] = category.pk
+        self.pending_categories = {}
+
+    def flush_items(self):
+        Item.objects.bulk_create(self.pending_items)
+        self.pending_items = []
+
+    def finish(self):
+        if self.checklist is None:
+            raise ParseError("Nothing to import.")
+        self.flush_categories()
+        self.flush_items()
+        # bulk_create skips the counter signals
+        recount([self.checklist.pk])
+        return self.checklist
+
+
+def _name(value, number, field='name'):
+    if not isinstance(value, str) or not value.strip():
+        raise ParseError(f"Record {number}: {field} is required.")
+    if len(value) > NAME_MAX_LENGTH:
+        raise ParseError(f"Record {number}: {field} is longer than {NAME_MAX_LENGTH} characters.")
+    return value
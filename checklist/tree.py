@@ -0,0 +1,131 @@
+from collections import defaultdict
+
+from .fieldsets import FULL
+from .metrics import timed
+from .models import Category, Item, CategoryFile, ItemFile
+from .serializer import ChecklistSerializer, CategoryFileSerializer, ItemFileSerializer
+
+
+def build_checklist_trees(checklists, context=None):
+    """
+    Render checklists in the same shape as ChecklistSerializer using a fixed
+    number of values() queries (checklists, categories, items, category files,
+    item files), no matter how large the trees are. A `fieldset` in the
+    context skips the queries of the relations it leaves out.
+    """
+    with timed('serialize'):
+        checklist_rows = list(_checklist_rows(checklists))
+        if not checklist_rows:
+            return []
+        context = context or {}
+        related = [
+            list(queryset) if queryset is not None else []
+            for queryset in _related_rows([row['id'] for row in checklist_rows], context.get('fieldset'))
+        ]
+        return _assemble(checklist_rows, *related, context)
+
+
+async def abuild_checklist_trees(checklists, context=None):
+    """
+    Async variant of build_checklist_trees for async views, using the async ORM.
+    """
+    with timed('serialize'):
+        checklist_rows = [row async for row in _checklist_rows(checklists)]
+        if not checklist_rows:
+            return []
+        context = context or {}
+        related = [
+            [row async for row in queryset] if queryset is not None else []
+            for queryset in _related_rows([row['id'] for row in checklist_rows], context.get('fieldset'))
+        ]
+        return _assemble(checklist_rows, *related, context)
+
+
+def _checklist_rows(checklists):
+    return checklists.prefetch_related(None).values(
+        'id', 'title', 'description', 'created_at', 'owner', 'item_count', 'completed_count'
+    )
+
+
+def _related_rows(ids, fieldset=None):
+    # None stands for a relation the fieldset leaves out
+    categories = items = category_files = item_files = None
+    category_fields = fieldset.child('categories') if fieldset is not None else FULL
+    if category_fields is not None:
+        categories = Category.objects.filter(checklist_id__in=ids).order_by('checklist_id', 'position', 'id').values(
+            'id', 'checklist_id', 'name', 'item_count', 'completed_count', 'position'
+        )
+        item_fields = category_fields.child('items')
+        if item_fields is not None:
+            items = Item.objects.filter(category__checklist_id__in=ids).order_by('category_id', 'position', 'id').values(
+                'id', 'category_id', 'name', 'is_completed', 'position'
+            )
+            if item_fields.child('files') is not None:
+                item_files = ItemFile.objects.filter(item__category__checklist_id__in=ids).order_by('id').values(
+                    'id', 'item_id', 'file'
+                )
+        if category_fields.child('files') is not None:
+            category_files = CategoryFile.objects.filter(category__checklist_id__in=ids).order_by('id').values(
+                'id', 'category_id', 'file'
+            )
+    return categories, items, category_files, item_files
+
+
+def _assemble(checklist_rows, categories, items, category_files, item_files, context):
+    fieldset = context.get('fieldset')
+    # The fieldset is applied to the assembled trees below, not to the fields rendering values
+    context = {**context, 'fieldset': None}
+    render_created_at = ChecklistSerializer(context=context).fields['created_at'].to_representation
+    category_file_field = CategoryFileSerializer(context=context).fields['file']
+    item_file_field = ItemFileSerializer(context=context).fields['file']
+
+    files_by_category = _group_files(category_files, 'category_id', category_file_field)
+    files_by_item = _group_files(item_files, 'item_id', item_file_field)
+
+    items_by_category = defaultdict(list)
+    for row in items:
+        items_by_category[row['category_id']].append({
+            'id': row['id'],
+            'name': row['name'],
+            'is_completed': row['is_completed'],
+            'files': files_by_item.get(row['id'], []),
+            'position': row['position'],
+        })
+
+    categories_by_checklist = defaultdict(list)
+    for row in categories:
+        categories_by_checklist[row['checklist_id']].append({
+            'id': row['id'],
+            'name': row['name'],
+            'items': items_by_category.get(row['id'], []),
+            'files': files_by_category.get(row['id'], []),
+            'item_count': row['item_count'],
+            'completed_count': row['completed_count'],
+            'position': row['position'],
+        })
+
+    trees = [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'created_at': render_created_at(row['created_at']),
+            'categories': categories_by_checklist.get(row['id'], []),
+            'owner': row['owner'],
+            'item_count': row['item_count'],
+            'completed_count': row['completed_count'],
+        }
+        for row in checklist_rows
+    ]
+    return fieldset.prune(trees) if fieldset is not None else trees
+
+
+def _group_files(rows, parent_key, serializer_field):
+    # Render through the serializer's file field so URLs match ChecklistSerializer exactly,
+    # signing the whole response's URLs as one batch
+    rows = list(rows)
+    urls = serializer_field.represent_many([row['file'] for row in rows])
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[parent_key]].append({'id': row['id'], 'file': urls.get(row['file'])})
+    return grouped
@@ -0,0 +1,135 @@
+import math
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+
+from .metrics import timed
+
+LOCAL_UPLOAD_SALT = 'checklist.uploads.local'
+
+
+class UploadError(Exception):
+    pass
+
+
+def upload_backend():
+    """
+    Instantiate the backend named by UPLOAD_BACKEND.
+    """
+    return import_string(getattr(settings, 'UPLOAD_BACKEND', 'checklist.uploads.S3UploadBackend'))()
+
+
+def new_upload_key(prefix, filename):
+    """
+    Storage key for a new upload, unique and scoped under `prefix`.
+    """
+    return f"{prefix}{uuid.uuid4().hex}/{get_valid_filename(filename) or 'file'}"
+
+
+class S3UploadBackend:
+    """
+    Presigned PUT (or multipart upload above UPLOAD_MULTIPART_THRESHOLD) straight
+    into the bucket behind the default S3Boto3Storage. Works against any
+    S3-compatible endpoint configured through AWS_S3_ENDPOINT_URL.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+        self.client = self.storage.connection.meta.client
+        self.bucket = self.storage.bucket_name
+        self.expires = getattr(settings, 'UPLOAD_URL_EXPIRES', 900)
+
+    def object_key(self, key):
+        location = (self.storage.location or '').strip('/')
+        return f"{location}/{key}" if location else key
+
+    def create_upload(self, key, content_type, size, request=None):
+        with timed('storage'):
+            return self._create_upload(key, content_type, size)
+
+    def _create_upload(self, key, content_type, size):
+        params = {'Bucket': self.bucket, 'Key': self.object_key(key)}
+        part_size = getattr(settings, 'UPLOAD_PART_SIZE', 16 * 1024 * 1024)
+        if size < getattr(settings, 'UPLOAD_MULTIPART_THRESHOLD', 64 * 1024 * 1024):
+            # Content-Length is signed, so the body cannot be larger than the size the byte quota charged
+            url = self.client.generate_presigned_url(
+                'put_object', Params={**params, 'ContentType': content_type, 'ContentLength': size},
+                ExpiresIn=self.expires,
+            )
+            return {'method': 'PUT', 'url': url, 'headers': {'Content-Type': content_type, 'Content-Length': str(size)}}
+
+        upload_id = self.client.create_multipart_upload(**params, ContentType=content_type)['UploadId']
+        parts = [
+            {
+                'part_number': number,
+                'url': self.client.generate_presigned_url(
+                    'upload_part', Params={
+                        **params, 'UploadId': upload_id, 'PartNumber': number,
+                        'ContentLength': min(part_size, size - (number - 1) * part_size),
+                    },
+                    ExpiresIn=self.expires,
+                ),
+            }
+            for number in range(1, math.ceil(size / part_size) + 1)
+        ]
+        return {'method': 'PUT', 'upload_id': upload_id, 'part_size': part_size, 'parts': parts}
+
+    def complete_upload(self, key, upload_id=None, parts=None):
+        with timed('storage'):
+            return self._complete_upload(key, upload_id, parts)
+
+    def _complete_upload(self, key, upload_id, parts):
+        from botocore.exceptions import ClientError
+
+        params = {'Bucket': self.bucket, 'Key': self.object_key(key)}
+        try:
+            if upload_id:
+                self.client.complete_multipart_upload(
+                    **params, UploadId=upload_id,
+                    MultipartUpload={'Parts': [
+                        {'ETag': part['etag'], 'PartNumber': int(part['part_number'])} for part in parts or []
+                    ]},
+                )
+            return self.client.head_object(**params)['ContentLength']
+        except (ClientError, KeyError, TypeError, ValueError) as e:
+            raise UploadError(f"Upload not found or incomplete: {e}")
+
+
+class FileSystemUploadBackend:
+    """
+    Development/test stand-in: hands out a signed URL on this API that accepts
+    the PUT body and writes it to the default storage. No multipart support.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    def create_upload(self, key, content_type, size, request=None):
+        token = signing.dumps({'key': key, 'size': size}, salt=LOCAL_UPLOAD_SALT)
+        url = reverse('local-upload', args=[token])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return {'method': 'PUT', 'url': url, 'headers': {'Content-Type': content_type}}
+
+    def complete_upload(self, key, upload_id=None, parts=None):
+        if not self.storage.exists(key):
+            raise UploadError("Upload not found or incomplete")
+        return self.storage.size(key)
+
+    def receive(self, token, body):
+        """
+        Store a PUT body for a URL issued by `create_upload`.
+        """
+        try:
+            claims = signing.loads(token, salt=LOCAL_UPLOAD_SALT, max_age=getattr(settings, 'UPLOAD_URL_EXPIRES', 900))
+        except signing.BadSignature as e:
+            raise UploadError(f"Invalid upload URL: {e}")
+        if len(body) > claims['size']:
+            raise UploadError("Upload is larger than announced")
+        self.storage.save(claims['key'], ContentFile(body))
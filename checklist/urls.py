@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path, include
+from django.utils.module_loading import import_string
 from rest_framework import routers
 from rest_framework_nested import routers as nested_routers
 from rest_framework.routers import SimpleRouter
+from .metrics import metrics_view
+from .uploads import FileSystemUploadBackend
 from .views import (
     ChecklistViewSet, CategoryViewSet, ItemViewSet,
-    CategoryFileViewSet, ItemFileViewSet, SharedChecklistViewSet
+    CategoryFileViewSet, ItemFileViewSet, SharedChecklistViewSet, LocalUploadView, SearchView,
+    JobViewSet
 )
 
 # ─────────────────────────────────────────────────────────────
@@ -14,6 +19,8 @@ from .views import (
 # /api/checklists/
 router = routers.SimpleRouter()
 router.register(r'checklists', ChecklistViewSet, basename='checklist')
+# /api/jobs/{id}/
+router.register(r'jobs', JobViewSet, basename='job')
 
 # /api/checklists/{checklist_pk}/categories/
 checklist_router = nested_routers.NestedSimpleRouter(router, r'checklists', lookup='checklist')
@@ -67,5 +74,20 @@ urlpatterns = [
     path('api/', include(share_router.urls)),
     path('api/', include(share_cat_router.urls)),
     path('api/', include(share_cat_file_router.urls)),
+    path('api/', include(share_item_router.urls)),
     path('api/', include(share_item_file_router.urls)),
+
+    # Search across the user's checklists, categories and items
+    path('api/search/', SearchView.as_view(), name='search'),
+
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
+]
+
+# Target of FileSystemUploadBackend presigned URLs; accepts anonymous PUTs, so
+# only mounted when that backend is the one configured
+local_upload_urlpatterns = [
+    path('api/uploads/local/<str:token>/', LocalUploadView.as_view(), name='local-upload'),
 ]
+if issubclass(import_string(settings.UPLOAD_BACKEND), FileSystemUploadBackend):
+    urlpatterns += local_upload_urlpatterns
@@ -1,38 +1,198 @@
 # auth0authorization/utils.py
 
+import asyncio
 import json
+import logging
+import re
+import threading
+import time
+import weakref
+
+import httpx
 import requests
 import jwt
+from django.conf import settings
 from jwt.algorithms import RSAAlgorithm  # ✅ required for from_jwk()
 
 AUTH0_DOMAIN = 'dev-hmrsiaqni4mw8mx7.us.auth0.com'
 API_IDENTIFIER = 'https://your-api/'  # 👈 must match Auth0 API identifier
 ISSUER = f'https://{AUTH0_DOMAIN}/'
+JWKS_URL = f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+def requests_jwks_fetcher(url):
+    """
+    Default JWKS fetcher. Returns the parsed JWKS document and the max-age
+    advertised in the Cache-Control header (or None when absent).
+    """
+    timeout = getattr(settings, 'AUTH0_JWKS_TIMEOUT', 5)
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json(), _max_age(response.headers)
+
+
+async def httpx_jwks_fetcher(url):
+    """
+    Default async JWKS fetcher, used by the async views so a slow Auth0
+    response never blocks the event loop.
+    """
+    timeout = getattr(settings, 'AUTH0_JWKS_TIMEOUT', 5)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        response = await client.get(url)
+    response.raise_for_status()
+    return response.json(), _max_age(response.headers)
+
+
+def _max_age(headers):
+    match = _MAX_AGE_RE.search(headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else None
+
+
+class JWKSKeyStore:
+    """
+    In-process store of Auth0 signing keys.
+    Each JWK is parsed into a public key once and served until its TTL lapses.
+    An unknown kid triggers at most one refresh per `miss_interval`, and only one
+    thread fetches at a time. If a refresh fails, the previous keys keep being served.
+    Async callers use aget_key, which fetches with `async_fetcher` on the event loop.
+    """
+
+    def __init__(self, url=JWKS_URL, fetcher=None, ttl=None, miss_interval=None, async_fetcher=None):
+        self.url = url
+        self.fetcher = fetcher or requests_jwks_fetcher
+        self.async_fetcher = async_fetcher or httpx_jwks_fetcher
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AUTH0_JWKS_CACHE_TTL', 600)
+        self.miss_interval = (
+            miss_interval if miss_interval is not None
+            else getattr(settings, 'AUTH0_JWKS_MISS_INTERVAL', 30)
+        )
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        # One asyncio.Lock per event loop for aget_key
+        self._async_locks = weakref.WeakKeyDictionary()
+
+    def get_key(self, kid):
+        key = self._keys.get(kid)
+        if key is not None and time.monotonic() < self._expires_at:
+            return key
+        if self._should_refresh():
+            self._refresh(seen_fetch=self._fetched_at)
+        return self._key_or_raise(kid)
+
+    async def aget_key(self, kid):
+        """
+        Async variant of get_key; refreshes with `async_fetcher`.
+        """
+        key = self._keys.get(kid)
+        if key is not None and time.monotonic() < self._expires_at:
+            return key
+        if self._should_refresh():
+            await self._arefresh(seen_fetch=self._fetched_at)
+        return self._key_or_raise(kid)
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._expires_at = 0.0
+            self._fetched_at = 0.0
+
+    def _should_refresh(self):
+        # Expired keys are refreshed eagerly; an unknown kid only once per interval.
+        now = time.monotonic()
+        return now >= self._expires_at or now - self._fetched_at >= self.miss_interval
 
-def jwt_decode_token(token):
+    def _key_or_raise(self, kid):
+        key = self._keys.get(kid)
+        if key is None:
+            raise Exception('Public key not found in JWKS for kid')
+        return key
+
+    def _refresh(self, seen_fetch):
+        with self._lock:
+            # Another thread refreshed while we were waiting for the lock.
+            if self._fetched_at != seen_fetch:
+                return
+            now = time.monotonic()
+            try:
+                jwks, max_age = self.fetcher(self.url)
+                keys = self._parse(jwks)
+            except Exception as e:
+                self._fetch_failed(e, now)
+                return
+            self._store(keys, max_age, now)
+
+    async def _arefresh(self, seen_fetch):
+        loop = asyncio.get_running_loop()
+        lock = self._async_locks.get(loop)
+        if lock is None:
+            lock = self._async_locks[loop] = asyncio.Lock()
+        async with lock:
+            # Another task refreshed while we were waiting for the lock.
+            if self._fetched_at != seen_fetch:
+                return
+            now = time.monotonic()
+            try:
+                jwks, max_age = await self.async_fetcher(self.url)
+                keys = self._parse(jwks)
+            except Exception as e:
+                with self._lock:
+                    self._fetch_failed(e, now)
+                return
+            with self._lock:
+                self._store(keys, max_age, now)
+
+    @staticmethod
+    def _parse(jwks):
+        return {
+            jwk['kid']: RSAAlgorithm.from_jwk(json.dumps(jwk))
+            for jwk in jwks['keys']
+            if jwk.get('kid')
+        }
+
+    def _fetch_failed(self, error, now):
+        self._fetched_at = now
+        if not self._keys:
+            raise Exception(f"Failed to fetch JWKS: {error}")
+        logger.warning("JWKS refresh failed, serving stale keys: %s", error)
+        # Back off instead of retrying the fetch on every request.
+        self._expires_at = now + self.miss_interval
+
+    def _store(self, keys, max_age, now):
+        self._keys = keys
+        self._fetched_at = now
+        self._expires_at = now + (max_age if max_age is not None else self.ttl)
+
+
+jwks_store = JWKSKeyStore()
+
+
+def jwt_decode_token(token, key_store=None):
     # print("🔍 Decoding JWT token...")
+    public_key = (key_store or jwks_store).get_key(_token_kid(token))
+    return _verify(token, public_key)
+
+
+async def ajwt_decode_token(token, key_store=None):
+    public_key = await (key_store or jwks_store).aget_key(_token_kid(token))
+    return _verify(token, public_key)
+
 
+def _token_kid(token):
     try:
         header = jwt.get_unverified_header(token)
         # print("📦 JWT Header:", header)
     except Exception as e:
         raise Exception(f"Invalid JWT header: {e}")
+    return header.get('kid')
 
-    try:
-        jwks = requests.get(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json').json()
-        # print("📥 JWKS keys received")
-    except Exception as e:
-        raise Exception(f"Failed to fetch JWKS: {e}")
-
-    public_key = None
-    for jwk in jwks['keys']:
-        if jwk['kid'] == header.get('kid'):
-            # print(f"🔑 Found matching key for kid: {jwk['kid']}")
-            public_key = RSAAlgorithm.from_jwk(json.dumps(jwk))
-
-    if public_key is None:
-        raise Exception('Public key not found in JWKS for kid')
 
+def _verify(token, public_key):
     try:
         decoded = jwt.decode(
             token,
@@ -1,35 +1,207 @@
+import json
+from datetime import timedelta
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Checklist, Category, Item, CategoryFile, ItemFile, ShareLink
+from .models import Checklist, Category, Item, CategoryFile, ItemFile, OrphanedFile, ShareLink, Job
 from .serializer import (
     ChecklistSerializer, CategorySerializer, ItemSerializer,
-    CategoryFileSerializer, ItemFileSerializer
+    CategoryFileSerializer, ItemFileSerializer, ChecklistSummarySerializer, JobSerializer
 )
+from .blobs import HashingUploadHandler, register_blob, store_blob
+from .batch import apply_item_batch, max_batch_size
+from .cache import etag_matches, get_shared_payload, representation_etag
+from .clone import clone_checklist
+from .deletion import delete_checklist
+from .fieldsets import Fieldset, prefetch_lookups
+from .jobs import enqueue, enqueue_once
+from .pagination import KeysetPagination
+from .parsers import CSVParser, NDJSONParser
+from .renderers import CSVExportRenderer, ExportRenderer, NDJSONExportRenderer
+from .reorder import move
+from .search import SCOPES, search_backend
+from .sharing import resolve_share_token
+from .sync import changes_since
+from .transfer import EXPORT_FORMATS, Export, import_checklist, read_csv, read_ndjson, tree_records
+from .tree import build_checklist_trees
+from .uploads import FileSystemUploadBackend, UploadError, new_upload_key, upload_backend
+
+
+def _parse_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _changes_response(request, checklists, context):
+    try:
+        since = int(request.query_params.get('since', 0))
+    except (TypeError, ValueError):
+        since = -1
+    if since < 0:
+        return Response({"since": "Must be a non-negative checklist version."}, status=status.HTTP_400_BAD_REQUEST)
+    changes = changes_since(checklists, since, context)
+    if changes is None:
+        raise Http404("No Checklist matches the given query.")
+    return Response(changes)
+
+
+def _import_records(request):
+    if not request.content_type.startswith('multipart/'):
+        data = request.data
+        if not data:
+            raise ParseError("Nothing to import.")
+        return tree_records(data) if isinstance(data, dict) else data
+    upload = request.FILES.get('file')
+    if upload is None:
+        raise ParseError("Upload the export as `file`.")
+    name = upload.name.lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return read_ndjson(upload)
+    if name.endswith('.csv'):
+        return read_csv(upload)
+    if name.endswith('.json'):
+        try:
+            return tree_records(json.load(upload))
+        except ValueError:
+            raise ParseError("Invalid JSON.")
+    raise ParseError("The file must be .ndjson, .csv or .json.")
+
+
+def _clone_params(data):
+    """
+    Validated clone_checklist() options from a clone request, or raise ParseError.
+    """
+    title = data.get('title')
+    max_length = Checklist._meta.get_field('title').max_length
+    if title is not None and (not isinstance(title, str) or len(title) > max_length):
+        raise ParseError(f"title must be a string of at most {max_length} characters.")
+    return {'title': title, 'reset_completion': _parse_bool(data.get('reset_completion'))}
+
+
+def _job_params(data):
+    """
+    Validated `(kind, params)` for a checklist job request, or raise ParseError.
+    """
+    kind = data.get('kind')
+    if kind == 'clone':
+        return kind, _clone_params(data)
+    if kind == 'export':
+        format = data.get('format', 'ndjson')
+        if format not in EXPORT_FORMATS:
+            raise ParseError(f"format must be one of {', '.join(EXPORT_FORMATS)}.")
+        return kind, {'format': format}
+    if kind in ('copy_files', 'delete'):
+        return kind, {}
+    raise ParseError("kind must be one of clone, copy_files, export, delete.")
+
+
+def _item_batch_response(request, checklist, category=None):
+    operations = request.data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return Response({"operations": "Provide a non-empty list of operations."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > max_batch_size():
+        return Response({"operations": f"At most {max_batch_size()} operations per batch."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    results, ok = apply_item_batch(operations, checklist, category)
+    return Response({"results": results}, status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST)
+
+
+def _move_response(viewset, instance, checklist_id, parent_id=None):
+    before, after = viewset.request.data.get('before'), viewset.request.data.get('after')
+    if before is not None and after is not None:
+        return Response({"before": "Give either before or after, not both."}, status=status.HTTP_400_BAD_REQUEST)
+    anchor = 'before' if before is not None else 'after'
+    try:
+        before, after = (int(value) if value is not None else None for value in (before, after))
+        needs_rebalance = move(instance, checklist_id, before=before, after=after, parent_id=parent_id)
+    except (TypeError, ValueError, type(instance).DoesNotExist):
+        return Response({anchor: "Must be the id of another row in the same list."}, status=status.HTTP_400_BAD_REQUEST)
+    if needs_rebalance:
+        enqueue_once('rebalance', checklist_id=checklist_id)
+    return Response(viewset.get_serializer(instance).data)
+
+
+class SparseFieldsetMixin:
+    """
+    Reads return only the fields named by `?fields=`/`?exclude=` (see
+    Fieldset); relations left out are neither prefetched nor rendered.
+    Writes always validate and return every field.
+    """
+
+    @cached_property
+    def fieldset(self):
+        if self.request.method not in SAFE_METHODS:
+            return None
+        return Fieldset.from_request(self.request, self.get_serializer_class())
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'fieldset': self.fieldset}
+
+    def prefetch(self, queryset, *lookups):
+        return queryset.prefetch_related(*prefetch_lookups(self.fieldset, *lookups))
 
 
-class ChecklistViewSet(viewsets.ModelViewSet):
+class ChecklistTreeMixin:
+    """
+    Serves list/retrieve through the flat-query tree assembler instead of
+    the nested ModelSerializer stack.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(build_checklist_trees(page, self.get_serializer_context()))
+        return Response(build_checklist_trees(queryset, self.get_serializer_context()))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        trees = build_checklist_trees(Checklist.objects.filter(pk=instance.pk), self.get_serializer_context())
+        return Response(trees[0])
+
+
+class ChecklistViewSet(SparseFieldsetMixin, ChecklistTreeMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Checklists. Requires authentication.
     Includes a 'clone' action to duplicate a checklist, 
     and a 'share' action to generate a public link for sharing.
     """
     serializer_class = ChecklistSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         # Only return checklists that belong to the authenticated user
         if self.request.user.is_authenticated:
-            return Checklist.objects.filter(owner=self.request.user).prefetch_related('categories__items')
+            queryset = Checklist.objects.filter(owner=self.request.user)
+            if self.action in ('list', 'retrieve', 'clone', 'clone_many', 'items_batch', 'share', 'revoke_share',
+                               'changes', 'export', 'jobs', 'destroy'):
+                # The tree assembler, clone engine and delete_checklist load the nested rows themselves
+                return queryset
+            return self.prefetch(queryset, 'categories__files', 'categories__items__files')
         return Checklist.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('view') != 'summary':
+            return super().list(request, *args, **kwargs)
+        # ?view=summary: checklist fields and counters only, never the item tree
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        page = page.annotate(category_count=Count('categories'))
+        return self.get_paginated_response(ChecklistSummarySerializer(page, many=True).data)
+
     def perform_create(self, serializer):
         # Assign the owner of the checklist to the authenticated user
         if self.request.user.is_authenticated:
@@ -37,29 +209,116 @@ class ChecklistViewSet(viewsets.ModelViewSet):
         else:
             raise PermissionError("You must be authenticated to create a checklist.")
 
+    def perform_destroy(self, instance):
+        delete_checklist(instance)
+
     @action(detail=True, methods=['post'])
     def clone(self, request, pk=None):
         """
         Clone an entire checklist (categories, items, and their files).
+        Pass `reset_completion: true` to clone with every item unchecked.
         """
         original = self.get_object()
+        new_checklist = clone_checklist(
+            original,
+            owner=request.user if request.user.is_authenticated else None,
+            **_clone_params(request.data),
+        )
+        trees = build_checklist_trees(Checklist.objects.filter(pk=new_checklist.pk), self.get_serializer_context())
+        return Response(trees[0], status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='clone')
+    def clone_many(self, request):
+        """
+        Clone several checklists in one request: `{"ids": [1, 2], "reset_completion": false}`.
+        """
+        ids = request.data.get('ids')
+        try:
+            # A string is iterable too: "12" must not become [1, 2]
+            ids = [int(pk) for pk in ids] if isinstance(ids, list) else None
+        except (TypeError, ValueError):
+            ids = None
+        if not ids:
+            return Response({"ids": "Provide a non-empty list of checklist ids."}, status=status.HTTP_400_BAD_REQUEST)
+        originals = {ck.pk: ck for ck in self.get_queryset().filter(pk__in=ids)}
+        missing = [pk for pk in ids if pk not in originals]
+        if missing:
+            return Response({"ids": f"Checklists not found: {missing}"}, status=status.HTTP_404_NOT_FOUND)
+
+        reset_completion = _parse_bool(request.data.get('reset_completion'))
         with transaction.atomic():
-            new_checklist = Checklist.objects.create(
-                title=request.data.get('title', f"Copy of {original.title}"),
-                description=original.description,
-                owner=request.user if request.user.is_authenticated else None
-            )
-            for cat in original.categories.all():
-                new_cat = Category.objects.create(checklist=new_checklist, name=cat.name)
-                for item in cat.items.all():
-                    new_item = Item.objects.create(category=new_cat, name=item.name, is_completed=item.is_completed)
-                    for item_file in item.files.all():
-                        ItemFile.objects.create(item=new_item, file=item_file.file)
-                for cat_file in cat.files.all():
-                    CategoryFile.objects.create(category=new_cat, file=cat_file.file)
-
-        serializer = self.get_serializer(new_checklist)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+            new_ids = [
+                clone_checklist(originals[pk], owner=request.user, reset_completion=reset_completion).pk
+                for pk in ids
+            ]
+        trees = build_checklist_trees(Checklist.objects.filter(pk__in=new_ids).order_by('id'), self.get_serializer_context())
+        return Response(trees, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
+        """
+        Delta sync: what changed after `?since=<version>` (0 or omitted for everything).
+        Pass the returned `version` as `since` next time.
+        """
+        try:
+            checklists = self.get_queryset().filter(pk=pk)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return _changes_response(request, checklists, self.get_serializer_context())
+
+    @action(detail=True, methods=['get'],
+            renderer_classes=[NDJSONExportRenderer, CSVExportRenderer, ExportRenderer])
+    def export(self, request, pk=None):
+        """
+        Stream the checklist as `?format=ndjson` (default), `csv` or `json`.
+        """
+        try:
+            checklists = self.get_queryset().filter(pk=pk)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        export = Export.for_checklists(checklists, self.get_serializer_context())
+        if export is None:
+            raise Http404("No Checklist matches the given query.")
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            export.stream(renderer.format), content_type=f"{renderer.media_type}; charset=utf-8",
+        )
+        response['Content-Disposition'] = f'attachment; filename="checklist-{export.checklist["id"]}.{renderer.format}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import',
+            parser_classes=[NDJSONParser, CSVParser, JSONParser, MultiPartParser])
+    def bulk_import(self, request):
+        """
+        Create a checklist from an export, sent as the request body
+        (application/x-ndjson, text/csv or application/json) or as a
+        multipart `file` named *.ndjson, *.csv or *.json. `?title=` overrides the title.
+        """
+        checklist = import_checklist(_import_records(request), request.user, request.query_params.get('title'))
+        summary = Checklist.objects.filter(pk=checklist.pk).annotate(category_count=Count('categories')).get()
+        return Response(ChecklistSummarySerializer(summary).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def jobs(self, request, pk=None):
+        """
+        Run a heavy operation on the checklist in the background:
+        `{"kind": "clone", "title": ..., "reset_completion": false}`, `{"kind": "copy_files"}`,
+        `{"kind": "export", "format": "ndjson"}` or `{"kind": "delete"}`.
+        Poll the returned job at /api/jobs/{id}/.
+        """
+        checklist = self.get_object()
+        kind, params = _job_params(request.data)
+        job = enqueue(kind, owner=request.user, checklist_id=checklist.pk, **params)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': f"/api/jobs/{job.pk}/"})
+
+    @action(detail=True, methods=['post'], url_path='items/batch')
+    def items_batch(self, request, pk=None):
+        """
+        Apply item create/update/delete operations across the checklist's categories
+        in one transaction. Creates and moves name the target `category` in `data`.
+        """
+        return _item_batch_response(request, self.get_object())
 
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
     def share(self, request, pk=None):
@@ -67,133 +326,412 @@ class ChecklistViewSet(viewsets.ModelViewSet):
         Generate a shareable link for the checklist.
         """
         ck = self.get_object()
-        link = ShareLink.objects.create(checklist=ck)
+        expires_at = None
+        if request.data.get('expires_in') is not None:
+            longest = getattr(settings, 'SHARE_LINK_MAX_EXPIRES_IN', 365 * 86400)
+            try:
+                expires_in = int(request.data['expires_in'])
+            except (TypeError, ValueError, OverflowError):
+                expires_in = None
+            if expires_in is None or not 0 < expires_in <= longest:
+                return Response({"expires_in": f"Must be a number of seconds, at most {longest}."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            expires_at = timezone.now() + timedelta(seconds=expires_in)
+        link = ShareLink.objects.create(checklist=ck, expires_at=expires_at)
         front = settings.FRONTEND_URL.rstrip("/")
         return Response({
-            "share_url": f"{front}/share/{link.token}/"
+            "share_url": f"{front}/share/{link.token}/",
+            "expires_at": expires_at,
         }, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['post'], url_path='share/revoke')
+    def revoke_share(self, request, pk=None):
+        """
+        Revoke a share link of this checklist: `{"token": "..."}`.
+        """
+        ck = self.get_object()
+        try:
+            link = ShareLink.objects.get(checklist=ck, token=request.data.get('token'), revoked_at__isnull=True)
+        except (ShareLink.DoesNotExist, ValueError, ValidationError):
+            return Response({"token": "Active share link not found."}, status=status.HTTP_404_NOT_FOUND)
+        link.revoked_at = timezone.now()
+        link.save(update_fields=['revoked_at'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class SharedTokenMixin:
+    """
+    Nested viewsets mounted under `/api/share/{token}/` are public for
+    `shared_methods` (None means every method) and scoped to the checklist the
+    token resolves to. Elsewhere the default authentication applies.
+    """
+    share_kwarg = 'token_token'
+    shared_methods = None
+
+    @property
+    def share_token(self):
+        return self.kwargs.get(self.share_kwarg)
+
+    def shared_checklist_id(self):
+        return resolve_share_token(self.request, self.share_token)
+
+    def get_permissions(self):
+        if self.share_token and (self.shared_methods is None or self.request.method in self.shared_methods):
+            return [AllowAny()]
+        return super().get_permissions()
+
+
+class CategoryViewSet(SharedTokenMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     CRUD operations for Categories, nested under Checklists.
+    Read-only for anonymous viewers of a shared checklist.
     """
     serializer_class = CategorySerializer
+    shared_methods = SAFE_METHODS
 
     def get_queryset(self):
-        return Category.objects.all()
+        if self.share_token:
+            queryset = Category.objects.filter(checklist_id=self.shared_checklist_id())
+        else:
+            queryset = Category.objects.filter(checklist_id=self.kwargs['checklist_pk'], checklist__owner=self.request.user)
+        return self.prefetch(queryset, 'files', 'items__files')
 
     def perform_create(self, serializer):
+        if self.share_token:
+            serializer.save(checklist_id=self.shared_checklist_id())
+            return
         checklist = get_object_or_404(Checklist, pk=self.kwargs['checklist_pk'])
         serializer.save(checklist=checklist)
 
+    @action(detail=True, methods=['post'])
+    def move(self, request, *args, **kwargs):
+        """
+        Reorder the category: `{"before": <category id>}`, `{"after": <category id>}`,
+        or `{}` for last. Only the moved category is written.
+        """
+        category = self.get_object()
+        return _move_response(self, category, category.checklist_id)
 
-class ItemViewSet(viewsets.ModelViewSet):
+
+class ItemViewSet(SharedTokenMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     CRUD operations for Items, nested under Categories and Checklists.
+    Read-only for anonymous viewers of a shared checklist.
     """
     serializer_class = ItemSerializer
+    shared_methods = SAFE_METHODS
+
+    def checklist_id(self):
+        return self.shared_checklist_id() if self.share_token else self.kwargs['checklist_pk']
 
     def get_queryset(self):
-        return Item.objects.filter(
+        # The category comes along for the signals, which need its checklist
+        return self.prefetch(Item.objects.select_related('category').filter(
             category__id=self.kwargs['category_pk'],
-            category__checklist__id=self.kwargs['checklist_pk']
-        )
+            category__checklist_id=self.checklist_id()
+        ), 'files')
 
     def perform_create(self, serializer):
-        category = get_object_or_404(Category, pk=self.kwargs['category_pk'], checklist__id=self.kwargs['checklist_pk'])
+        category = get_object_or_404(Category, pk=self.kwargs['category_pk'], checklist_id=self.checklist_id())
         serializer.save(category=category)
 
+    @action(detail=True, methods=['post'])
+    def move(self, request, *args, **kwargs):
+        """
+        Reorder the item: `{"before": <item id>}`, `{"after": <item id>}`, or `{}` for last,
+        in its category or in `"category": <id>` of the same checklist. Only the moved item is written.
+        """
+        item = self.get_object()
+        checklist_id = int(self.checklist_id())
+        category_id = request.data.get('category')
+        if category_id is not None:
+            try:
+                category_id = Category.objects.get(pk=int(category_id), checklist_id=checklist_id).pk
+            except (TypeError, ValueError, Category.DoesNotExist):
+                return Response({"category": "Category not found in this checklist."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return _move_response(self, item, checklist_id, category_id)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request, *args, **kwargs):
+        """
+        Apply a list of item create/update/delete operations to this category in one transaction.
+        """
+        category = get_object_or_404(
+            Category.objects.select_related('checklist'),
+            pk=self.kwargs['category_pk'],
+            checklist__id=self.checklist_id(),
+            checklist__owner=request.user,
+        )
+        return _item_batch_response(request, category.checklist, category)
+
+
+class DirectUploadMixin:
+    """
+    Two-step direct-to-storage uploads: `uploads/` issues a presigned URL scoped to
+    the parent category or item, and `uploads/complete/` checks the stored object
+    and creates the file row. Viewsets provide get_parent, upload_prefix and create_file.
+    """
+
+    def upload_size(self, request):
+        """
+        Bytes a request will store, for the upload byte quotas (see
+        checklist.throttling): the announced size of a direct upload, the
+        body of a multipart one. Read before the body is.
+        """
+        if self.action == 'create_upload':
+            try:
+                return max(int(request.data.get('size')), 0)
+            except (TypeError, ValueError):
+                return 0
+        if self.action == 'create':
+            try:
+                return int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                return 0
+        return 0
+
+    @action(detail=False, methods=['post'], url_path='uploads', parser_classes=[JSONParser])
+    def create_upload(self, request, *args, **kwargs):
+        parent = self.get_parent()
+        filename = request.data.get('filename')
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            size = 0
+        if not filename or size <= 0:
+            return Response({"detail": "Provide a filename and a positive size."}, status=status.HTTP_400_BAD_REQUEST)
+        if size > settings.UPLOAD_MAX_SIZE:
+            return Response({"detail": f"Files are limited to {settings.UPLOAD_MAX_SIZE} bytes."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        key = new_upload_key(self.upload_prefix(parent), filename)
+        content_type = request.data.get('content_type') or 'application/octet-stream'
+        upload = upload_backend().create_upload(key, content_type, size, request)
+        return Response({"key": key, **upload}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='uploads/complete', parser_classes=[JSONParser])
+    def complete_upload(self, request, *args, **kwargs):
+        parent = self.get_parent()
+        key = request.data.get('key')
+        if not isinstance(key, str) or not key.startswith(self.upload_prefix(parent)) or '..' in key:
+            return Response({"key": "Key does not belong to this upload target."}, status=status.HTTP_400_BAD_REQUEST)
+        upload_id = request.data.get('upload_id')
+        if upload_id is not None and not isinstance(upload_id, str):
+            return Response({"upload_id": "Must be a string."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            size = upload_backend().complete_upload(key, upload_id, request.data.get('parts'))
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if size > settings.UPLOAD_MAX_SIZE:
+            # Nothing will reference the object; the reaper deletes it
+            OrphanedFile.objects.create(key=key)
+            return Response({"detail": "Uploaded file is too large."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            register_blob(key, size)
+            instance = self.create_file(parent, key)
+        return Response(self.get_serializer(instance).data, status=status.HTTP_201_CREATED)
+
+
+class HashingUploadMixin:
+    """
+    Multipart uploads are hashed while they stream and stored by content hash.
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [HashingUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def save_with_blob(self, serializer, **kwargs):
+        """
+        Store the upload and save its row in one transaction. If the save
+        fails the blob reference is rolled back with it, and the key goes to
+        the OrphanedFile outbox so the reaper removes an object no row holds.
+        """
+        key = None
+        try:
+            with transaction.atomic():
+                key = store_blob(serializer.validated_data['file'])
+                serializer.save(file=key, **kwargs)
+        except Exception:
+            if key is not None:
+                OrphanedFile.objects.create(key=key)
+            raise
+
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Status and result of the user's background jobs.
+    """
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        return Job.objects.filter(owner=self.request.user)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except ValidationError:
+            raise Http404
+
+
+class SearchView(APIView):
+    """
+    GET /api/search/?q=...: ranked matches among the user's checklist titles,
+    category names and item names, each with its checklist/category path.
+    `type=item,category` limits the scopes, `limit` the hits (default 20, max 100).
+    """
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"q": "This parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        scopes = [scope for scope in request.query_params.get('type', '').split(',') if scope] or SCOPES
+        if not set(scopes) <= set(SCOPES):
+            return Response({"type": f"Must be a comma-separated list of {', '.join(SCOPES)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= 100:
+            return Response({"limit": "Must be between 1 and 100."}, status=status.HTTP_400_BAD_REQUEST)
+        results = search_backend().search(request.user, query, scopes, limit)
+        return Response({"query": query, "results": results})
+
+
+class LocalUploadView(APIView):
+    """
+    Receives PUT bodies for URLs issued by FileSystemUploadBackend.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    parser_classes = []
+
+    def put(self, request, token):
+        try:
+            FileSystemUploadBackend().receive(token, request.body)
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
-class CategoryFileViewSet(viewsets.ModelViewSet):
+class CategoryFileViewSet(SharedTokenMixin, HashingUploadMixin, DirectUploadMixin, viewsets.ModelViewSet):
     """
     File uploads for categories. Allows public upload via shared token.
     """
     serializer_class = CategoryFileSerializer
     parser_classes = [MultiPartParser, FormParser]
 
-    def get_permissions(self):
-        if 'token_token' in self.kwargs:
-            return [AllowAny()]
-        return super().get_permissions()
-
     def get_queryset(self):
         category_id = self.kwargs['category_pk']
-        token = self.kwargs.get('token_token')
 
-        if token:
-            share_link = get_object_or_404(ShareLink, token=token)
-            return CategoryFile.objects.filter(category__id=category_id, category__checklist=share_link.checklist)
-        return CategoryFile.objects.filter(category__id=category_id, category__checklist__owner=self.request.user)
+        files = CategoryFile.objects.select_related('category')
+        if self.share_token:
+            return files.filter(category__id=category_id, category__checklist_id=self.shared_checklist_id())
+        return files.filter(category__id=category_id, category__checklist__owner=self.request.user)
 
-    def perform_create(self, serializer):
+    def get_parent(self):
         category_id = self.kwargs['category_pk']
-        token = self.kwargs.get('token_token')
 
-        if token:
-            share_link = get_object_or_404(ShareLink, token=token)
-            category = get_object_or_404(Category, id=category_id, checklist=share_link.checklist)
-        else:
-            category = get_object_or_404(Category, id=category_id, checklist__owner=self.request.user)
+        if self.share_token:
+            return get_object_or_404(Category, id=category_id, checklist_id=self.shared_checklist_id())
+        return get_object_or_404(Category, id=category_id, checklist__owner=self.request.user)
 
-        serializer.save(category=category)
+    def perform_create(self, serializer):
+        category = self.get_parent()
+        self.save_with_blob(serializer, category=category)
+
+    def upload_prefix(self, category):
+        return f"category_files/{category.pk}/"
+
+    def create_file(self, category, key):
+        return CategoryFile.objects.create(category=category, file=key)
 
 
-class ItemFileViewSet(viewsets.ModelViewSet):
+class ItemFileViewSet(SharedTokenMixin, HashingUploadMixin, DirectUploadMixin, viewsets.ModelViewSet):
     """
     File uploads for items. Allows public upload via shared token.
     """
     serializer_class = ItemFileSerializer
     parser_classes = [MultiPartParser, FormParser]
 
-    def get_permissions(self):
-        if 'token_token' in self.kwargs:
-            return [AllowAny()]
-        return super().get_permissions()
-
     def get_queryset(self):
         category_id = self.kwargs['category_pk']
         item_id = self.kwargs['item_pk']
-        token = self.kwargs.get('token_token')
 
-        if token:
-            share_link = get_object_or_404(ShareLink, token=token)
-            return ItemFile.objects.filter(
+        files = ItemFile.objects.select_related('item__category')
+        if self.share_token:
+            return files.filter(
                 item__id=item_id,
                 item__category__id=category_id,
-                item__category__checklist=share_link.checklist
+                item__category__checklist_id=self.shared_checklist_id()
             )
-        return ItemFile.objects.filter(
+        return files.filter(
             item__id=item_id,
             item__category__id=category_id,
             item__category__checklist__owner=self.request.user
         )
 
-    def perform_create(self, serializer):
+    def get_parent(self):
         category_id = self.kwargs['category_pk']
         item_id = self.kwargs['item_pk']
-        token = self.kwargs.get('token_token')
 
-        if token:
-            share_link = get_object_or_404(ShareLink, token=token)
-            item = get_object_or_404(Item, id=item_id, category__id=category_id, category__checklist=share_link.checklist)
-        else:
-            item = get_object_or_404(Item, id=item_id, category__id=category_id, category__checklist__owner=self.request.user)
+        if self.share_token:
+            return get_object_or_404(Item, id=item_id, category__id=category_id, category__checklist_id=self.shared_checklist_id())
+        return get_object_or_404(Item, id=item_id, category__id=category_id, category__checklist__owner=self.request.user)
+
+    def perform_create(self, serializer):
+        item = self.get_parent()
+        self.save_with_blob(serializer, item=item)
 
-        serializer.save(item=item)
+    def upload_prefix(self, item):
+        return f"item_files/{item.pk}/"
 
+    def create_file(self, item, key):
+        return ItemFile.objects.create(item=item, file=key)
 
-class SharedChecklistViewSet(viewsets.ReadOnlyModelViewSet):
+
+class SharedChecklistViewSet(SharedTokenMixin, SparseFieldsetMixin, ChecklistTreeMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet to access a shared (read-only) checklist via its token.
     """
     serializer_class = ChecklistSerializer
     permission_classes = [AllowAny]
+    share_kwarg = 'token'
     lookup_field = 'token'
     lookup_url_kwarg = 'token'
 
     def get_queryset(self):
-        return Checklist.objects.filter(share_links__token=self.kwargs['token'])
+        return Checklist.objects.filter(pk=resolve_share_token(self.request, self.kwargs['token']))
 
     def get_object(self):
         return get_object_or_404(self.get_queryset())
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serve the rendered tree from the shared cache, keyed by checklist version.
+        A matching If-None-Match short-circuits to 304 without rendering; each
+        media type has its own ETag. A sparse fieldset is cut from the cached
+        tree and carries no ETag.
+        """
+        checklist_id = resolve_share_token(request, self.kwargs['token'])
+        context = {**self.get_serializer_context(), 'fieldset': None}
+        data, etag = get_shared_payload(
+            checklist_id,
+            lambda: build_checklist_trees(Checklist.objects.filter(pk=checklist_id), context)[0],
+        )
+        if self.fieldset is not None:
+            return Response(self.fieldset.prune(data))
+        headers = {'ETag': representation_etag(etag, request.accepted_media_type), 'Vary': 'Accept'}
+        if etag_matches(request, headers['ETag']):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(data, headers=headers)
+
+    @action(detail=True, methods=['get'])
+    def changes(self, request, token=None):
+        """
+        Delta sync for the shared checklist, as ChecklistViewSet.changes.
+        """
+        return _changes_response(request, self.get_queryset(), self.get_serializer_context())